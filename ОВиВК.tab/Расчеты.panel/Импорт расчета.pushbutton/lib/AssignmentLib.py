@@ -0,0 +1,185 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def get_components(candidates):
+    """
+    Делит двудольный граф кандидатов на связные компоненты.
+
+    Args:
+        candidates (list): Для каждой строки - словарь {кандидат: стоимость}.
+
+    Returns:
+        list: Компоненты - списки номеров строк. Строки без кандидатов в компоненты не входят.
+    """
+    parents = {}
+
+    def find(node):
+        root = node
+        while parents[root] != root:
+            root = parents[root]
+        while parents[node] != root:
+            parents[node], node = root, parents[node]
+        return root
+
+    def union(first, second):
+        parents.setdefault(first, first)
+        parents.setdefault(second, second)
+        first_root = find(first)
+        second_root = find(second)
+        if first_root != second_root:
+            parents[second_root] = first_root
+
+    for index, row_candidates in enumerate(candidates):
+        for candidate in row_candidates:
+            union(('row', index), ('candidate', candidate))
+
+    components = {}
+    for index, row_candidates in enumerate(candidates):
+        if row_candidates:
+            components.setdefault(find(('row', index)), []).append(index)
+    return list(components.values())
+
+
+def solve_assignment(costs):
+    """
+    Венгерский алгоритм: назначение строк столбцам с минимальной суммарной стоимостью.
+
+    Args:
+        costs (list): Матрица стоимостей n x m, n <= m.
+
+    Returns:
+        list: Номер столбца для каждой строки.
+    """
+    row_count = len(costs)
+    column_count = len(costs[0]) if costs else 0
+    infinity = float('inf')
+    # Потенциалы строк и столбцов, строка назначенная столбцу и путь увеличения. Индексы с 1, 0 - фиктивный
+    row_potentials = [0.0] * (row_count + 1)
+    column_potentials = [0.0] * (column_count + 1)
+    column_rows = [0] * (column_count + 1)
+    path = [0] * (column_count + 1)
+
+    for row in range(1, row_count + 1):
+        column_rows[0] = row
+        column = 0
+        min_values = [infinity] * (column_count + 1)
+        used = [False] * (column_count + 1)
+        while True:
+            used[column] = True
+            current_row = column_rows[column]
+            row_costs = costs[current_row - 1]
+            delta = infinity
+            next_column = 0
+            for candidate_column in range(1, column_count + 1):
+                if used[candidate_column]:
+                    continue
+                value = (row_costs[candidate_column - 1] - row_potentials[current_row]
+                         - column_potentials[candidate_column])
+                if value < min_values[candidate_column]:
+                    min_values[candidate_column] = value
+                    path[candidate_column] = column
+                if min_values[candidate_column] < delta:
+                    delta = min_values[candidate_column]
+                    next_column = candidate_column
+            for candidate_column in range(column_count + 1):
+                if used[candidate_column]:
+                    row_potentials[column_rows[candidate_column]] += delta
+                    column_potentials[candidate_column] -= delta
+                else:
+                    min_values[candidate_column] -= delta
+            column = next_column
+            if column_rows[column] == 0:
+                break
+        while column:
+            previous_column = path[column]
+            column_rows[column] = column_rows[previous_column]
+            column = previous_column
+
+    assignment = [None] * row_count
+    for column in range(1, column_count + 1):
+        if column_rows[column]:
+            assignment[column_rows[column] - 1] = column - 1
+    return assignment
+
+
+def assign_component(candidates, rows):
+    """
+    Назначает строкам компоненты кандидатов с минимальной суммарной стоимостью.
+    Сначала максимизируется количество назначений, затем минимизируется их суммарная стоимость.
+
+    Args:
+        candidates (list): Для каждой строки - словарь {кандидат: стоимость}.
+        rows (list): Номера строк компоненты.
+
+    Returns:
+        dict: {Номер строки: кандидат}. Строки, которым кандидата не хватило, не входят.
+    """
+    columns = []
+    column_indexes = {}
+    for row in rows:
+        for candidate in candidates[row]:
+            if candidate not in column_indexes:
+                column_indexes[candidate] = len(columns)
+                columns.append(candidate)
+
+    # Стоимость отсутствующего ребра больше любой суммы настоящих, поэтому оно выбирается только без выбора
+    missing_cost = sum(sum(candidates[row].values()) for row in rows) + 1.0
+    costs = []
+    for row in rows:
+        row_costs = [missing_cost] * len(columns)
+        for candidate, cost in candidates[row].items():
+            row_costs[column_indexes[candidate]] = cost
+        costs.append(row_costs)
+
+    transposed = len(rows) > len(columns)
+    if transposed:
+        costs = [list(column_costs) for column_costs in zip(*costs)]
+
+    assignment = solve_assignment(costs)
+    pairs = enumerate(assignment)
+    if transposed:
+        pairs = [(row_index, column_index) for column_index, row_index in pairs]
+
+    result = {}
+    for row_index, column_index in pairs:
+        if column_index is None:
+            continue
+        row = rows[row_index]
+        candidate = columns[column_index]
+        if candidate in candidates[row]:
+            result[row] = candidate
+    return result
+
+
+def assign_candidates(candidates, groups=None):
+    """
+    Назначает строкам кандидатов без повторов с минимальной суммарной стоимостью.
+    Задача решается отдельно для каждой связной компоненты графа кандидатов, поэтому размер матриц
+    определяется числом спорных строк в одном месте, а не их общим числом.
+
+    Args:
+        candidates (list): Для каждой строки - словарь {кандидат: стоимость}.
+        groups (list): Группа каждой строки. Группы решаются независимо: кандидат не повторяется внутри группы,
+            но может достаться строкам разных групп. Если не задано, все строки в одной группе.
+
+    Returns:
+        list: Кандидат или None для каждой строки.
+    """
+    result = [None] * len(candidates)
+    if groups is None:
+        groups = [None] * len(candidates)
+
+    group_rows = {}
+    for row, group in enumerate(groups):
+        group_rows.setdefault(group, []).append(row)
+
+    for rows in group_rows.values():
+        group_candidates = [candidates[row] for row in rows]
+        for component_rows in get_components(group_candidates):
+            if len(component_rows) == 1 and len(group_candidates[component_rows[0]]) == 1:
+                result[rows[component_rows[0]]] = list(group_candidates[component_rows[0]])[0]
+                continue
+            for row, candidate in assign_component(group_candidates, component_rows).items():
+                result[rows[row]] = candidate
+    return result
@@ -0,0 +1,340 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+from array import array
+from bisect import bisect_right
+
+
+class EquipmentGeometryTable:
+    """
+    Таблица геометрии оборудования: точка вставки и центр Bounding Box в мм хранятся в плоских массивах.
+    Строка таблицы - индекс элемента, проверки по ней идут только по числам.
+    """
+
+    def __init__(self):
+        self.elements = []
+        self.locations = array('d')
+        self.centers = array('d')
+
+    def __len__(self):
+        return len(self.elements)
+
+    def add(self, element, location, center):
+        """
+        Добавляет строку таблицы.
+
+        Args:
+            element: Элемент Revit.
+            location (tuple): Точка вставки (x, y, z), мм.
+            center (tuple): Центр Bounding Box (x, y, z), мм.
+
+        Returns:
+            int: Номер строки.
+        """
+        self.elements.append(element)
+        self.locations.extend(location)
+        self.centers.extend(center)
+        return len(self.elements) - 1
+
+    def get_location(self, row):
+        """
+        Returns:
+            tuple: Точка вставки (x, y, z), мм.
+        """
+        offset = row * 3
+        return self.locations[offset], self.locations[offset + 1], self.locations[offset + 2]
+
+    def get_center(self, row):
+        """
+        Returns:
+            tuple: Центр Bounding Box (x, y, z), мм.
+        """
+        offset = row * 3
+        return self.centers[offset], self.centers[offset + 1], self.centers[offset + 2]
+
+    def get_location_z(self, row):
+        return self.locations[row * 3 + 2]
+
+    def is_near(self, row, x, y, z, radius):
+        """
+        Проверяет, лежит ли точка вставки или центр Bounding Box не дальше radius от точки.
+
+        Args:
+            row (int): Номер строки.
+            x (float): Координата X точки, мм.
+            y (float): Координата Y точки, мм.
+            z (float): Координата Z точки, мм.
+            radius (float): Радиус, мм.
+
+        Returns:
+            bool
+        """
+        offset = row * 3
+        radius_squared = radius * radius
+        locations = self.locations
+        dx = locations[offset] - x
+        dy = locations[offset + 1] - y
+        dz = locations[offset + 2] - z
+        if dx * dx + dy * dy + dz * dz <= radius_squared:
+            return True
+        centers = self.centers
+        dx = centers[offset] - x
+        dy = centers[offset + 1] - y
+        dz = centers[offset + 2] - z
+        return dx * dx + dy * dy + dz * dz <= radius_squared
+
+    def get_distance(self, row, x, y, z):
+        """
+        Возвращает расстояние от точки до ближайшей из точки вставки и центра Bounding Box.
+
+        Args:
+            row (int): Номер строки.
+            x (float): Координата X точки, мм.
+            y (float): Координата Y точки, мм.
+            z (float): Координата Z точки, мм.
+
+        Returns:
+            float: Расстояние, мм.
+        """
+        location_x, location_y, location_z = self.get_location(row)
+        center_x, center_y, center_z = self.get_center(row)
+        return math.sqrt(min((location_x - x) ** 2 + (location_y - y) ** 2 + (location_z - z) ** 2,
+                             (center_x - x) ** 2 + (center_y - y) ** 2 + (center_z - z) ** 2))
+
+
+class GridIndex:
+    """
+    Равномерная сетка в плане: элемент кладется в ячейку каждой своей точки,
+    поиск проверяет только ячейки, которые пересекает круг поиска.
+    """
+
+    def __init__(self, cell_size):
+        """
+        Args:
+            cell_size (float): Размер ячейки сетки, мм. Лучше брать равным радиусу поиска.
+        """
+        self.cell_size = float(cell_size)
+        self.cells = {}
+
+    def _get_cell_index(self, value):
+        return int(math.floor(value / self.cell_size))
+
+    def insert(self, item, x, y):
+        """
+        Добавляет элемент в ячейку точки.
+
+        Args:
+            item: Элемент индекса.
+            x (float): Координата X точки, мм.
+            y (float): Координата Y точки, мм.
+        """
+        cell = self.cells.setdefault((self._get_cell_index(x), self._get_cell_index(y)), [])
+        if item not in cell:
+            cell.append(item)
+
+    def query(self, x, y, radius):
+        """
+        Возвращает элементы, у которых хотя бы одна точка может лежать в круге поиска.
+        Точное расстояние проверяет вызывающий код.
+
+        Args:
+            x (float): Координата X центра поиска, мм.
+            y (float): Координата Y центра поиска, мм.
+            radius (float): Радиус поиска, мм.
+
+        Returns:
+            list: Элементы без повторов в порядке добавления в ячейки.
+        """
+        result = []
+        seen = set()
+        for cell_x in range(self._get_cell_index(x - radius), self._get_cell_index(x + radius) + 1):
+            for cell_y in range(self._get_cell_index(y - radius), self._get_cell_index(y + radius) + 1):
+                for item in self.cells.get((cell_x, cell_y), ()):
+                    if item not in seen:
+                        seen.add(item)
+                        result.append(item)
+        return result
+
+
+class BandedGridIndex:
+    """
+    Набор сеток по высотным зонам: для каждой зоны своя сетка в плане с элементами, которые в нее попали.
+    """
+
+    def __init__(self, cell_size):
+        """
+        Args:
+            cell_size (float): Размер ячейки сетки, мм.
+        """
+        self.cell_size = cell_size
+        self.bands = {}
+
+    def insert(self, band, item, points):
+        """
+        Добавляет элемент в сетку зоны по всем его точкам.
+
+        Args:
+            band: Ключ высотной зоны.
+            item: Элемент индекса.
+            points (list): Точки элемента (x, y, ...), мм.
+        """
+        grid = self.bands.get(band)
+        if grid is None:
+            grid = GridIndex(self.cell_size)
+            self.bands[band] = grid
+        for point in points:
+            grid.insert(item, point[0], point[1])
+
+    def query(self, band, x, y, radius):
+        """
+        Возвращает кандидатов зоны рядом с точкой.
+
+        Args:
+            band: Ключ высотной зоны.
+            x (float): Координата X центра поиска, мм.
+            y (float): Координата Y центра поиска, мм.
+            radius (float): Радиус поиска, мм.
+
+        Returns:
+            list: Элементы без повторов.
+        """
+        grid = self.bands.get(band)
+        if grid is None:
+            return []
+        return grid.query(x, y, radius)
+
+
+class IntervalIndex:
+    """
+    Отсортированные высотные интервалы (объекты с z_min и z_max) с поиском бинарным делением.
+    Интервалы не должны пересекаться, допускается только общая граница.
+    """
+
+    def __init__(self, intervals):
+        """
+        Args:
+            intervals (list): Интервалы с атрибутами z_min и z_max.
+        """
+        self.intervals = sorted(intervals, key=lambda interval: interval.z_min)
+        self.starts = [interval.z_min for interval in self.intervals]
+
+    def find_all(self, value, tolerance=0.0):
+        """
+        Возвращает все интервалы, в которые попадает отметка.
+
+        Args:
+            value (float): Отметка, мм.
+            tolerance (float): Допуск на границах, мм.
+
+        Returns:
+            list: Интервалы снизу вверх.
+        """
+        result = []
+        index = bisect_right(self.starts, value + tolerance) - 1
+        # У непересекающихся интервалов верхние границы тоже отсортированы
+        while index >= 0 and self.intervals[index].z_max + tolerance >= value:
+            result.append(self.intervals[index])
+            index -= 1
+        result.reverse()
+        return result
+
+    def find(self, value):
+        """
+        Возвращает нижний интервал, в который попадает отметка.
+
+        Args:
+            value (float): Отметка, мм.
+
+        Returns:
+            Интервал или None.
+        """
+        intervals = self.find_all(value)
+        return intervals[0] if intervals else None
+
+
+class BandIndex:
+    """
+    Высотные зоны по зонам в плане: у каждой зоны (стояка, секции здания) своя схема уровней.
+    Точки из зоны без своей схемы или вне высотных зон своей схемы получают зоны общей схемы с ключом None.
+    """
+
+    def __init__(self, get_zone_key=None):
+        """
+        Args:
+            get_zone_key: Функция (x, y) -> ключ зоны в плане. Если не задана, схема уровней одна.
+        """
+        self.get_zone_key = get_zone_key
+        self.zones = {}
+
+    def set_bands(self, zone_key, bands):
+        """
+        Задает высотные зоны для зоны в плане.
+
+        Args:
+            zone_key: Ключ зоны в плане или None для общей схемы.
+            bands (list): Интервалы с атрибутами z_min и z_max. Зона в плане без интервалов не задается.
+        """
+        if not bands:
+            self.zones.pop(zone_key, None)
+            return
+        self.zones[zone_key] = IntervalIndex(bands)
+
+    def get_bands(self):
+        """
+        Returns:
+            list: Все высотные зоны всех зон в плане.
+        """
+        bands = []
+        for interval_index in self.zones.values():
+            bands.extend(interval_index.intervals)
+        return bands
+
+    def find_all(self, value, tolerance=0.0):
+        """
+        Возвращает высотные зоны всех зон в плане, в которые попадает отметка.
+
+        Args:
+            value (float): Отметка, мм.
+            tolerance (float): Допуск на границах, мм.
+
+        Returns:
+            list
+        """
+        bands = []
+        for interval_index in self.zones.values():
+            bands.extend(interval_index.find_all(value, tolerance))
+        return bands
+
+    def find(self, x, y, z):
+        """
+        Возвращает высотную зону точки: сначала по схеме ее зоны в плане, затем по общей схеме.
+
+        Args:
+            x (float): Координата X точки, мм.
+            y (float): Координата Y точки, мм.
+            z (float): Координата Z точки, мм.
+
+        Returns:
+            Высотная зона или None.
+        """
+        if self.get_zone_key is not None:
+            interval_index = self.zones.get(self.get_zone_key(x, y))
+            if interval_index is not None:
+                band = interval_index.find(z)
+                if band is not None:
+                    return band
+        interval_index = self.zones.get(None)
+        return interval_index.find(z) if interval_index is not None else None
+
+    def assign_bands(self, points):
+        """
+        Подбирает высотную зону для каждой точки.
+
+        Args:
+            points (list): Точки (x, y, z), мм.
+
+        Returns:
+            list: Высотная зона или None для каждой точки в порядке points.
+        """
+        return [self.find(x, y, z) for x, y, z in points]
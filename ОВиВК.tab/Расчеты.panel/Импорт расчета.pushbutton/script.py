@@ -21,6 +21,8 @@ clr.ImportExtensions(Revit.GeometryConversion)
 import System
 import JsonOperatorLib
 import DebugPlacerLib
+import SpatialIndexLib
+import AssignmentLib
 from System.Collections.Generic import *
 
 from Autodesk.Revit.DB import *
@@ -57,9 +59,15 @@ AUDYTOR_V72 = "Audytor SET 7.2"
 AUDYTOR_V73 = "Audytor SET 7.3"
 DEBUG_MODE = False
 EPSILON = 1e-9
+# Способы сопоставления, выбираются при запуске. Оптимальный распределяет спорные совпадения по минимуму
+# суммарного расстояния, по единственному данные получает только прибор, который один попал в область
+MATCHING_OPTIMAL = "Спорные совпадения по минимуму суммарного расстояния"
+MATCHING_UNIQUE = "Только единственный прибор в области"
 
 JSON_CONFIG = 'config.json'
 JSON_VERSION = 'version.json'
+JSON_MATCHING = 'matching.json'
+JSON_LEVEL_ZONE = 'level_zone.json'
 
 class RevitParamNames:
     """Класс для хранения имен параметров Revit, используемых в скрипте"""
@@ -142,7 +150,11 @@ class CylinderZ:
 
     def contains_point(self, point):
         """Проверяет, находится ли точка внутри цилиндра по Z"""
-        return self.z_min <= point.Z <= self.z_max
+        return self.contains_z(point.Z)
+
+    def contains_z(self, z):
+        """Проверяет, находится ли отметка внутри цилиндра"""
+        return self.z_min <= z <= self.z_max
 
 
 class UnitConverter:
@@ -204,7 +216,7 @@ class LevelCylinderGenerator:
     @classmethod
     def create_cylinders(cls, equipment_list):
         """Создает CylinderZ для каждого уровня оборудования."""
-        z_values = {eq.rotated_coords.Z for eq in equipment_list if eq.type_name == EQUIPMENT_TYPE_NAME}
+        z_values = {eq.rotated_point[2] for eq in equipment_list if eq.type_name == EQUIPMENT_TYPE_NAME}
         z_values = sorted(z_values)
 
         cylinders = []
@@ -216,6 +228,53 @@ class LevelCylinderGenerator:
 
         return cylinders
 
+    @classmethod
+    def create_band_index(cls, equipment_list, get_zone_key=None):
+        """
+        Создает индекс цилиндров уровней. Общая схема уровней строится по всему оборудованию,
+        а если задана функция зоны в плане - еще и своя схема для каждой зоны.
+
+        Args:
+            equipment_list (list): Элементы из Аудитора.
+            get_zone_key: Функция (x, y) -> ключ зоны в плане.
+
+        Returns:
+            SpatialIndexLib.BandIndex
+        """
+        band_index = SpatialIndexLib.BandIndex(get_zone_key)
+        band_index.set_bands(None, cls.create_cylinders(equipment_list))
+
+        if get_zone_key is not None:
+            zones = {}
+            for eq in equipment_list:
+                zones.setdefault(get_zone_key(eq.rotated_point[0], eq.rotated_point[1]), []).append(eq)
+            for zone_key, zone_equipment in zones.items():
+                # В зоне только с клапанами цилиндров нет, ее строки берут цилиндры общей схемы
+                zone_cylinders = cls.create_cylinders(zone_equipment)
+                if zone_cylinders:
+                    band_index.set_bands(zone_key, zone_cylinders)
+
+        return band_index
+
+
+def create_level_zone_key(zone_size):
+    """
+    Создает функцию зоны в плане для схем уровней: план делится на квадраты со стороной zone_size.
+
+    Args:
+        zone_size (float): Сторона зоны, мм. 0 - одна схема уровней на весь файл.
+
+    Returns:
+        Функция (x, y) -> ключ зоны или None, если зоны не нужны.
+    """
+    if not zone_size:
+        return None
+
+    def get_level_zone_key(x, y):
+        return int(math.floor(x / zone_size)), int(math.floor(y / zone_size))
+
+    return get_level_zone_key
+
 
 class BasePointHelper:
     _base_point = None
@@ -252,14 +311,17 @@ class AuditorEquipment:
     level_cylinder : list
         Список, который содержит пары Z min и Z max для каждого элемента из Аудитор
 
+    rotated_point, original_point : tuple
+        Координаты (x, y, z) в мм. XYZ из них создаются только при обращении к rotated_coords и original_coords
+
     '''
     processed = False
     level_cylinder = None
 
     def __init__(self,
                  connection_type="",
-                 rotated_coords=None,
-                 original_coords=None,
+                 rotated_point=None,
+                 original_point=None,
                  equipment_len=0,
                  code="",
                  real_power=0,
@@ -276,8 +338,8 @@ class AuditorEquipment:
         '''
         self.base_point_z = BasePointHelper.get_base_point_z(doc)
         self.connection_type = connection_type
-        self.original_coords = original_coords or XYZ.Zero
-        self.rotated_coords = rotated_coords or XYZ.Zero
+        self.original_point = original_point or (0.0, 0.0, 0.0)
+        self.rotated_point = rotated_point or (0.0, 0.0, 0.0)
         self.equipment_len = equipment_len
         self.code = code
         self.real_power = real_power
@@ -287,63 +349,51 @@ class AuditorEquipment:
         self.full_name = full_name
         self.type_name = type_name
 
-    def is_in_data_area(self, revit_equipment):
+    @property
+    def original_coords(self):
+        return XYZ(*self.original_point)
+
+    @property
+    def rotated_coords(self):
+        return XYZ(*self.rotated_point)
+
+    def is_in_data_area(self, equipment_table, row):
         '''
-        Определяет, пересекаются ли области положений элемента в ревите и в аудиторе
+        Определяет, пересекаются ли области положений элемента в ревите и в аудиторе.
+        Геометрия элемента ревита берется из таблицы, поэтому проверка идет только по числам.
         '''
-        revit_location = revit_equipment.Location.Point
-        revit_bb = revit_equipment.GetBoundingBox()
-        revit_bb_center = get_bb_center(revit_bb)
-        revit_coords = XYZ(
-            UnitConverter.to_millimeters(revit_location.X),
-            UnitConverter.to_millimeters(revit_location.Y),
-            UnitConverter.to_millimeters(revit_location.Z)
-        )
-        revit_bb_coords = XYZ(
-            UnitConverter.to_millimeters(revit_bb_center.X),
-            UnitConverter.to_millimeters(revit_bb_center.Y),
-            UnitConverter.to_millimeters(revit_bb_center.Z)
-        )
-        radius = self.level_cylinder.radius
+        location_z = equipment_table.get_location_z(row)
 
-        if ((abs(self.level_cylinder.z_min - revit_coords.Z) <= EPSILON
-             or self.level_cylinder.z_min < revit_coords.Z)
-                and (abs(revit_coords.Z - self.level_cylinder.z_max) <= EPSILON
-                     or revit_coords.Z < self.level_cylinder.z_max)):
-            distance_to_location_center = (
-                self.rotated_coords.DistanceTo(revit_coords))
-            distance_to_bb_center = (
-                self.rotated_coords.DistanceTo(revit_bb_coords))
-            distance = (
-                min(distance_to_bb_center, distance_to_location_center))
-
-            return distance <= radius
+        if ((abs(self.level_cylinder.z_min - location_z) <= EPSILON
+             or self.level_cylinder.z_min < location_z)
+                and (abs(location_z - self.level_cylinder.z_max) <= EPSILON
+                     or location_z < self.level_cylinder.z_max)):
+            x, y, z = self.rotated_point
+            return equipment_table.is_near(row, x, y, z, self.level_cylinder.radius)
 
         return False
 
-    def set_level_cylinder(self, level_cylinders):
+    def set_level_cylinder(self, level_cylinder):
         '''
         Вписывает в список свойств элемента из Аудитора минимальную и максимальную отметку проверочного цилиндра.
         При активации DEBUG_MODE создает в модели экземпляр Цилиндра по координатам элемента в Аудиторе.
         '''
-        for level_cylinder in level_cylinders:
-            if level_cylinder.contains_point(self.rotated_coords):
-                self.level_cylinder = level_cylinder
-
-                if DEBUG_MODE:
-                    comment = "{};{};{};{}".format(
-                        self.type_name,
-                        self.rotated_coords.X,
-                        self.rotated_coords.Y,
-                        self.rotated_coords.Z)
-                    debug_placer.place_symbol(
-                        self.rotated_coords.X,
-                        self.rotated_coords.Y,
-                        self.rotated_coords.Z,
-                        self.level_cylinder.z_max - self.level_cylinder.z_min,
-                        comment
-                    )
-                break
+        self.level_cylinder = level_cylinder
+
+        if DEBUG_MODE and level_cylinder is not None:
+            x, y, z = self.rotated_point
+            comment = "{};{};{};{}".format(
+                self.type_name,
+                x,
+                y,
+                z)
+            debug_placer.place_symbol(
+                x,
+                y,
+                z,
+                self.level_cylinder.z_max - self.level_cylinder.z_min,
+                comment
+            )
 
 
 class EquipmentDataCache:
@@ -479,25 +529,26 @@ class ReadingRulesForValve:
 
 
 class AuditorFileParser:
-    """Отвечает только за парсинг строк файла в объекты"""
-    @staticmethod
-    def parse_heating_device(line, z_correction, angle, audytor_version):
-        data = line.strip().split(';')
-        rr = ReadingRulesForEquipment(audytor_version)
+    """
+    Отвечает только за парсинг строк файла в объекты.
+    Индексы столбцов, поправка по Z и поворот вычисляются один раз на файл.
+    """
+    def __init__(self, z_correction, angle, audytor_version):
+        self.z_correction = z_correction
+        self.angle = angle
+        self.equipment_rules = ReadingRulesForEquipment(audytor_version)
+        self.valve_rules = ReadingRulesForValve()
+        self.millimeters_in_meter = UnitConverter.meters_to_millimeters(1.0)
+
+    def parse_heating_device(self, data):
+        rr = self.equipment_rules
 
         # Получаем оба набора координат
-        original_point, rotated_point = AuditorFileParser._parse_coordinates(
-            data=data,
-            x_idx=rr.x_index,
-            y_idx=rr.y_index,
-            z_idx=rr.z_index,
-            z_correction=z_correction,
-            angle=angle
-        )
+        original_point, rotated_point = self._parse_coordinates(data, rr)
         return AuditorEquipment(
             connection_type=data[rr.connection_type_index],
-            rotated_coords=rotated_point,
-            original_coords=original_point,
+            rotated_point=rotated_point,
+            original_point=original_point,
             equipment_len=TextParser.parse_float(
                 data[rr.equipment_len_index])*1000,
             code=data[rr.code_index],
@@ -509,48 +560,94 @@ class AuditorFileParser:
             type_name=EQUIPMENT_TYPE_NAME
         )
 
-    @staticmethod
-    def parse_valve(line, z_correction, angle, audytor_version):
-        data = line.strip().split(';')
-        rr = ReadingRulesForValve()
+    def parse_valve(self, data):
+        rr = self.valve_rules
 
         if data[rr.connection_type_index] != OUTER_VALVE_NAME:
             return None
         # Получаем оба набора координат
-        original_point, rotated_point = AuditorFileParser._parse_coordinates(
-            data=data,
-            x_idx=rr.x_index,
-            y_idx=rr.y_index,
-            z_idx=rr.z_index,
-            z_correction=z_correction,
-            angle=angle
-        )
+        original_point, rotated_point = self._parse_coordinates(data, rr)
         return AuditorEquipment(
             maker=data[rr.maker_index],
-            rotated_coords=rotated_point,
-            original_coords=original_point,
+            rotated_point=rotated_point,
+            original_point=original_point,
             setting=TextParser.parse_setting(data[rr.setting_index]),
             type_name=VALVE_TYPE_NAME
         )
 
-    @staticmethod
-    def _parse_coordinates(data, x_idx, y_idx, z_idx, z_correction, angle):
-        """Парсит и возвращает как оригинальные, так и повернутые координаты"""
-        x = (UnitConverter.meters_to_millimeters
-             (TextParser.parse_float(data[x_idx])))
-        y = (UnitConverter.meters_to_millimeters
-             (TextParser.parse_float(data[y_idx])))
-        z = (UnitConverter.meters_to_millimeters
-             (TextParser.parse_float(data[z_idx])) + z_correction)
+    def _parse_coordinates(self, data, rr):
+        """Парсит и возвращает как оригинальные, так и повернутые координаты в мм"""
+        x = TextParser.parse_float(data[rr.x_index]) * self.millimeters_in_meter
+        y = TextParser.parse_float(data[rr.y_index]) * self.millimeters_in_meter
+        z = TextParser.parse_float(data[rr.z_index]) * self.millimeters_in_meter + self.z_correction
 
         # Получаем повернутые координаты
-        original_point = XYZ(x, y, z)
-        rotated_point = rotate_point(angle, original_point)
+        original_point = (x, y, z)
+        rotated_point = rotate_point(self.angle, original_point)
 
         # Возвращаем кортеж: (оригинальные_координаты, повернутые_координаты)
         return original_point, rotated_point
 
 
+class AuditorFileReader:
+    """
+    Читает файл Аудитора одним проходом. Строки идут через конечный автомат:
+    поиск заголовка секции -> пропуск шапки таблицы -> чтение строк секции до пустой строки.
+    """
+    STATE_SEARCH = 0
+    STATE_HEADER = 1
+    STATE_ROWS = 2
+
+    def __init__(self, sections):
+        """
+        Args:
+            sections (list): Секции файла - кортежи (заголовок, смещение первой строки данных от заголовка,
+                функция разбора строки). Функция принимает список значений строки и возвращает объект или None.
+        """
+        self.sections = sections
+
+    def read(self, lines):
+        """
+        Разбирает строки файла по секциям.
+
+        Args:
+            lines: Итератор строк файла.
+
+        Returns:
+            list: Для каждой секции в порядке self.sections - список объектов, которые вернула функция разбора,
+                в порядке файла. Порядок самих секций в файле на результат не влияет.
+        """
+        results = [[] for _ in self.sections]
+        state = self.STATE_SEARCH
+        header_lines = 0
+        parse_func = None
+        section_items = None
+
+        for line in lines:
+            if state == self.STATE_SEARCH:
+                for index, (title, start_offset, section_parse_func) in enumerate(self.sections):
+                    if title in line:
+                        parse_func = section_parse_func
+                        section_items = results[index]
+                        header_lines = start_offset - 1
+                        state = self.STATE_HEADER if header_lines > 0 else self.STATE_ROWS
+                        break
+            elif state == self.STATE_HEADER:
+                header_lines -= 1
+                if header_lines <= 0:
+                    state = self.STATE_ROWS
+            else:
+                line = line.strip()
+                if not line:
+                    state = self.STATE_SEARCH
+                    continue
+                parsed_item = parse_func(line.split(';'))
+                if parsed_item is not None:
+                    section_items.append(parsed_item)
+
+        return results
+
+
 class ReportGenerator:
     @staticmethod
     def generate_all_reports(changes, not_found_equip=None, overflow_data=None):
@@ -581,24 +678,21 @@ class ReportGenerator:
         return u"\n".join(csv_lines)
 
     @staticmethod
-
-    def generate_area_overflow_report(auditor_equipment_list, revit_equipment_list):
+    def generate_area_overflow_report(conflicts):
         """
         Анализирует и возвращает данные о перекрытии областей оборудования
         Возвращает словарь {equipment_to_areas: [список координат областей]}
+
+        Args:
+            conflicts (list): Пары (AuditorEquipment, оборудование Revit в его области) для элементов из Аудитора,
+                которым не удалось однозначно подобрать оборудование.
         """
         from collections import defaultdict
 
         equipment_to_areas = defaultdict(list)
-        for auditor_equipment in auditor_equipment_list:
-            equipment_in_area = [
-                eq for eq in revit_equipment_list
-                if auditor_equipment.is_in_data_area(eq)
-            ]
-
-            if len(equipment_in_area) > 1:
-                for eq in equipment_in_area:
-                    equipment_to_areas[eq.Id].append(auditor_equipment.original_coords)
+        for auditor_equipment, equipment_in_area in conflicts:
+            for eq in equipment_in_area:
+                equipment_to_areas[eq.Id].append(auditor_equipment.original_point)
         return equipment_to_areas
 
     @staticmethod
@@ -643,9 +737,9 @@ class ReportGenerator:
 
         for equipment in not_found_equipment:
             print('Прибор х: {}, y: {}, z: {}'.format(
-                equipment.original_coords.X,
-                equipment.original_coords.Y,
-                equipment.original_coords.Z))
+                equipment.original_point[0],
+                equipment.original_point[1],
+                equipment.original_point[2]))
 
 
 def calculate_z_correction(doc):
@@ -656,31 +750,6 @@ def calculate_z_correction(doc):
     return UnitConverter.to_millimeters(z_difference)
 
 
-def find_section(lines,
-                 title,
-                 start_offset,
-                 parse_func,
-                 z_correction,
-                 angle,
-                 audytor_version):
-    result = []
-    i = 0
-    while i < len(lines):
-        if title in lines[i]:
-            i += start_offset
-
-            while i < len(lines) and lines[i].strip():
-                parsed_item = parse_func(lines[i],
-                                         z_correction,
-                                         angle,
-                                         audytor_version)
-
-                if parsed_item is not None:
-                    result.append(parsed_item)
-                i += 1
-        i += 1
-    return result
-
 def get_bb_center(revit_bb):
     '''
     Получить центр Bounding Box
@@ -704,15 +773,16 @@ def rotate_point(angle, point):
     if angle == 0:
         return point
 
+    x, y, z = point
     # Угол в радианах
     angle_radians = math.radians(angle)
     # Матрица поворота вокруг оси Z (в плоскости XY)
     cos_theta = math.cos(angle_radians)
     sin_theta = math.sin(angle_radians)
-    x_new = point.X * cos_theta - point.Y * sin_theta
-    y_new = point.X * sin_theta + point.Y * cos_theta
+    x_new = x * cos_theta - y * sin_theta
+    y_new = x * sin_theta + y * cos_theta
 
-    return XYZ(x_new, y_new, point.Z)
+    return x_new, y_new, z
 
 
 def get_elements_by_family_name(category):
@@ -774,27 +844,168 @@ def process_start_up():
     )
     operator.send_json_data(audytor_version, JSON_VERSION)
 
-    return angle, filepath, audytor_version
+    old_matching_mode = operator.get_json_data(JSON_MATCHING)
+    matching_mode = forms.ask_for_one_item(
+        [MATCHING_OPTIMAL, MATCHING_UNIQUE],
+        default=old_matching_mode if old_matching_mode == MATCHING_UNIQUE else MATCHING_OPTIMAL,
+        prompt='Выберите способ сопоставления приборов',
+        title='Импорт расчетов'
+    )
+
+    if matching_mode is None:
+        sys.exit()
+
+    operator.send_json_data(matching_mode, JSON_MATCHING)
+
+    # Для корпусов с разными отметками этажей в одном файле: у каждой зоны в плане своя схема уровней
+    level_zone_size = forms.ask_for_string(
+        default=str(operator.get_json_data(JSON_LEVEL_ZONE)),
+        prompt='Введите размер зоны в плане со своей схемой уровней в метрах (0 - одна схема на весь файл):',
+        title="Аудитор импорт"
+    )
+
+    if level_zone_size is None:
+        sys.exit()
+
+    try:
+        level_zone_size = TextParser.parse_float(level_zone_size)
+    except ValueError:
+        level_zone_size = -1
+    if level_zone_size < 0:
+        forms.alert(
+            "Необходимо ввести неотрицательное число.",
+            "Ошибка",
+            exitscript=True
+        )
+
+    operator.send_json_data(level_zone_size, JSON_LEVEL_ZONE)
+
+    return angle, filepath, audytor_version, matching_mode, UnitConverter.meters_to_millimeters(level_zone_size)
+
+
+def build_equipment_table(revit_equipment_list):
+    """
+    Один раз читает из Revit точку вставки и центр Bounding Box оборудования и переводит их в мм.
+
+    Args:
+        revit_equipment_list (list): Оборудование Revit.
+
+    Returns:
+        SpatialIndexLib.EquipmentGeometryTable
+    """
+    equipment_table = SpatialIndexLib.EquipmentGeometryTable()
+    for revit_equipment in revit_equipment_list:
+        revit_location = revit_equipment.Location.Point
+        revit_bb_center = get_bb_center(revit_equipment.GetBoundingBox())
+        equipment_table.add(
+            revit_equipment,
+            (UnitConverter.to_millimeters(revit_location.X),
+             UnitConverter.to_millimeters(revit_location.Y),
+             UnitConverter.to_millimeters(revit_location.Z)),
+            (UnitConverter.to_millimeters(revit_bb_center.X),
+             UnitConverter.to_millimeters(revit_bb_center.Y),
+             UnitConverter.to_millimeters(revit_bb_center.Z))
+        )
+    return equipment_table
+
+
+def build_equipment_index(equipment_table, band_index):
+    """
+    Раскладывает строки таблицы оборудования по цилиндрам уровней и сетке в плане.
+    Оборудование попадает в цилиндр по отметке точки вставки, в сетку - по точке вставки и центру Bounding Box.
+
+    Args:
+        equipment_table (SpatialIndexLib.EquipmentGeometryTable): Таблица геометрии оборудования.
+        band_index (SpatialIndexLib.BandIndex): Индекс цилиндров уровней CylinderZ.
+
+    Returns:
+        SpatialIndexLib.BandedGridIndex
+    """
+    cell_size = max([level_cylinder.radius for level_cylinder in band_index.get_bands()] or [1000])
+    equipment_index = SpatialIndexLib.BandedGridIndex(cell_size)
+    for row in range(len(equipment_table)):
+        location_z = equipment_table.get_location_z(row)
+        points = [equipment_table.get_location(row), equipment_table.get_center(row)]
+        for level_cylinder in band_index.find_all(location_z, EPSILON):
+            equipment_index.insert(level_cylinder, row, points)
+    return equipment_index
+
+
+def find_equipment_in_area(auditor_equipment, equipment_table, equipment_index):
+    """
+    Возвращает строки таблицы оборудования Revit в области элемента из Аудитора.
+    Точную проверку проходят только соседи по сетке из того же цилиндра.
+
+    Args:
+        auditor_equipment (AuditorEquipment): Элемент из Аудитора.
+        equipment_table (SpatialIndexLib.EquipmentGeometryTable): Таблица геометрии оборудования.
+        equipment_index (SpatialIndexLib.BandedGridIndex): Индекс строк таблицы.
+
+    Returns:
+        list: Номера строк таблицы.
+    """
+    level_cylinder = auditor_equipment.level_cylinder
+    if level_cylinder is None:
+        return []
+    x, y, z = auditor_equipment.rotated_point
+    candidates = equipment_index.query(level_cylinder, x, y, level_cylinder.radius)
+    return [row for row in candidates if auditor_equipment.is_in_data_area(equipment_table, row)]
+
+
+def assign_equipment_rows(auditor_equipment_list, rows_in_area, equipment_table):
+    """
+    Распределяет оборудование Revit между элементами из Аудитора без повторов так, чтобы данные получило
+    как можно больше приборов, а суммарное расстояние было минимальным.
+    Приборы и клапаны распределяются независимо: клапан прибора пишет настройку в тот же экземпляр,
+    что и сам прибор. Внутри типа задача решается отдельно для каждой группы элементов,
+    связанных общими кандидатами.
+
+    Args:
+        auditor_equipment_list (list): Элементы из Аудитора.
+        rows_in_area (list): Для каждого элемента из Аудитора - строки таблицы оборудования в его области.
+        equipment_table (SpatialIndexLib.EquipmentGeometryTable): Таблица геометрии оборудования.
+
+    Returns:
+        list: Строка таблицы или None для каждого элемента из Аудитора.
+    """
+    candidates = []
+    for ayditor_equipment, rows in zip(auditor_equipment_list, rows_in_area):
+        x, y, z = ayditor_equipment.rotated_point
+        candidates.append(dict((row, equipment_table.get_distance(row, x, y, z)) for row in rows))
+    return AssignmentLib.assign_candidates(
+        candidates,
+        [ayditor_equipment.type_name for ayditor_equipment in auditor_equipment_list])
 
 
 def process_audytor_revit_matching(auditor_equipment_list,
                                    revit_equipment_list,
-                                   data_cache):
+                                   band_index,
+                                   data_cache,
+                                   matching_mode):
+    equipment_table = build_equipment_table(revit_equipment_list)
+    equipment_index = build_equipment_index(equipment_table, band_index)
+
+    # Один проход по элементам Аудитора дает и совпадения, и данные для отчетов
+    rows_in_area = []
     for ayditor_equipment in auditor_equipment_list:
-        equipment_in_area = [
-            eq for eq in revit_equipment_list
-            if ayditor_equipment.is_in_data_area(eq)
-        ]
-        ayditor_equipment.processed = len(equipment_in_area) >= 1
-
-        if len(equipment_in_area) == 1:
-            data_cache.collect_data(equipment_in_area[0], ayditor_equipment)
+        rows = find_equipment_in_area(ayditor_equipment, equipment_table, equipment_index)
+        ayditor_equipment.processed = len(rows) >= 1
+        rows_in_area.append(rows)
+
+    if matching_mode == MATCHING_OPTIMAL:
+        assigned_rows = assign_equipment_rows(auditor_equipment_list, rows_in_area, equipment_table)
+    else:
+        assigned_rows = [rows[0] if len(rows) == 1 else None for rows in rows_in_area]
+
+    conflicts = []
+    for ayditor_equipment, rows, assigned_row in zip(auditor_equipment_list, rows_in_area, assigned_rows):
+        if assigned_row is not None:
+            data_cache.collect_data(equipment_table.elements[assigned_row], ayditor_equipment)
+        elif rows:
+            conflicts.append((ayditor_equipment, [equipment_table.elements[row] for row in rows]))
 
     # Генерация и вывод отчетов
-    overflow_data = ReportGenerator.generate_area_overflow_report(
-        auditor_equipment_list,
-        revit_equipment_list
-    )
+    overflow_data = ReportGenerator.generate_area_overflow_report(conflicts)
     ReportGenerator.print_area_overflow_report(overflow_data)
     not_found_equipment = (ReportGenerator.generate_not_found_report
                            (auditor_equipment_list))
@@ -805,29 +1016,20 @@ def process_audytor_revit_matching(auditor_equipment_list,
 
 
 def read_auditor_file(file_path, angle, audytor_version, doc):
+    z_correction = calculate_z_correction(doc)
+    parser = AuditorFileParser(z_correction, angle, audytor_version)
+    reader = AuditorFileReader([
+        ("Отопительные приборы CO на плане", 3, parser.parse_heating_device),
+        ("Арматура СО на плане", 3, parser.parse_valve)
+    ])
+
+    # Файл читается потоком, целиком в памяти не держится
     with codecs.open(file_path, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
+        devices, valves = reader.read(file)
 
-    z_correction = calculate_z_correction(doc)
-    equipment = find_section(
-        lines,
-        "Отопительные приборы CO на плане",
-        3,
-        AuditorFileParser.parse_heating_device,
-        z_correction,
-        angle,
-        audytor_version
-    )
-    valves = find_section(
-        lines,
-        "Арматура СО на плане",
-        3,
-        AuditorFileParser.parse_valve,
-        z_correction,
-        angle,
-        audytor_version
-    )
-    equipment.extend(valves)
+    # Приборы идут раньше арматуры при любом порядке секций в файле: прибор и его клапан попадают
+    # в один элемент Revit, а EquipmentDataCache берет данные из первой записи элемента
+    equipment = devices + valves
 
     if not equipment:
         forms.alert("Не найдено оборудование в импортируемом файле.",
@@ -842,25 +1044,30 @@ if DEBUG_MODE:
 @notification()
 @log_plugin(EXEC_PARAMS.command_name)
 def script_execute(plugin_logger):
-    angle, filepath, audytor_version = process_start_up()
+    angle, filepath, audytor_version, matching_mode, level_zone_size = process_start_up()
     ayditror_equipment_elements = read_auditor_file(filepath,
                                                     angle,
                                                     audytor_version,
                                                     doc)
     # собираем высоты цилиндров в которых будем искать данные
-    level_cylinders = (LevelCylinderGenerator.
-                       create_cylinders(ayditror_equipment_elements))
+    band_index = LevelCylinderGenerator.create_band_index(
+        ayditror_equipment_elements,
+        create_level_zone_key(level_zone_size))
+    level_cylinders = band_index.assign_bands(
+        [ayditor_equipment.rotated_point for ayditor_equipment in ayditror_equipment_elements])
 
     with revit.Transaction("BIM: Импорт приборов"):
-        for ayditor_equipment in ayditror_equipment_elements:
-            ayditor_equipment.set_level_cylinder(level_cylinders)
+        for ayditor_equipment, level_cylinder in zip(ayditror_equipment_elements, level_cylinders):
+            ayditor_equipment.set_level_cylinder(level_cylinder)
 
         equipment = get_elements_by_family_name(
             BuiltInCategory.OST_MechanicalEquipment)
         data_cache = EquipmentDataCache()
         process_audytor_revit_matching(ayditror_equipment_elements,
                                        equipment,
-                                       data_cache)
+                                       band_index,
+                                       data_cache,
+                                       matching_mode)
         changes = data_cache.get_changes()
 
         # Если есть изменения - предлагаем сохранить отчет
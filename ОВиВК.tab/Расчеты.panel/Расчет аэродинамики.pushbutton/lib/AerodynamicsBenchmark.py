@@ -0,0 +1,711 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Замеры производительности расчета аэродинамики на синтетических сетях. Работает без Revit, под CPython:
+
+    python AerodynamicsBenchmark.py --terminals 2000 --branching 3 --rect-share 0.5 --system exhaust --workers 4
+
+Там же проверяется расчет потерь на трение: точечные значения формул и сверка со снимками сетей из моделей,
+в которых сохранены потери Revit:
+
+    python AerodynamicsBenchmark.py --check-friction system_1.json system_2.json
+
+Генератор строит дерево воздуховодов из тройников, крестовин, врезок, переходов, отводов и воздухораспределителей
+в виде того же снимка сети (DuctNetworkSnapshot), который калькуляторы получают из модели.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import CalculatorClassLib
+import CoefficientRunner
+import FrictionLoss
+import ReportBuilder
+import ReportWriters
+from DuctNetworkSnapshot import *
+
+ROUND_DIAMETERS = [100, 125, 160, 200, 250, 315, 355, 400, 450, 500, 560, 630, 710, 800, 900, 1000, 1250, 1600]
+RECT_WIDTHS = [150, 200, 250, 300, 400, 500, 600, 800, 1000, 1200, 1600, 2000, 2500, 3000]
+
+# Скорость, по которой подбираются сечения, м/с
+DESIGN_VELOCITY = 4.0
+
+TEE_HALF_SIZE = 150.0
+# Длина врезки и участок воздуховода с врезкой за точкой врезки, мм
+TAP_LENGTH = 150.0
+TAP_RUN = 1000.0
+TRANSITION_LENGTH = 300.0
+ELBOW_HALF_SIZE = 150.0
+TERMINAL_DROP = 500.0
+
+# Удельные потери напора на трение для секций, Па/м
+FRICTION_LOSS = 1.0
+
+
+class SyntheticNetworkGenerator:
+    """
+    Генератор параметрических деревьев воздуховодов.
+
+    От начала сети идет магистраль. На каждом разветвлении в ответвление уходит 1/branching оставшихся
+    воздухораспределителей, остальные идут дальше по проходу. Разветвление - тройник, крестовина с двумя
+    ответвлениями или врезка в воздуховод, который идет дальше как проход. Иногда в ответвление уходит большая часть
+    воздухораспределителей, тогда критический путь поворачивает в ответвление. При уменьшении сечения на проходе
+    тройника и крестовины ставится переход, перед каждым воздухораспределителем - отвод вниз.
+    """
+
+    def __init__(self, terminals, branching=2, rect_share=0.5, system_type=SYSTEM_SUPPLY_AIR,
+                 terminal_flow=200.0, duct_length=3000.0, seed=0,
+                 cross_share=0.15, tap_share=0.15, branch_critical_share=0.3):
+        """
+        Инициализация объекта SyntheticNetworkGenerator.
+
+        Args:
+            terminals (int): Количество воздухораспределителей.
+            branching (int): Делитель ответвлений: чем больше, тем длиннее магистрали и короче ответвления.
+            rect_share (float): Доля прямоугольных ветвей от 0 до 1.
+            system_type (str): SYSTEM_SUPPLY_AIR или SYSTEM_EXHAUST_AIR.
+            terminal_flow (float): Расход одного воздухораспределителя, м3/ч.
+            duct_length (float): Длина воздуховода между фитингами, мм.
+            seed (int): Зерно генератора случайных чисел.
+            cross_share (float): Доля разветвлений крестовинами от 0 до 1.
+            tap_share (float): Доля разветвлений врезками от 0 до 1.
+            branch_critical_share (float): Доля разветвлений, где большая часть воздухораспределителей уходит
+                в ответвление.
+        """
+        if terminals < 1:
+            raise ValueError("Нужен хотя бы один воздухораспределитель")
+        if branching < 2:
+            raise ValueError("Делитель ответвлений должен быть не меньше 2")
+
+        self.terminals = terminals
+        self.branching = branching
+        self.rect_share = rect_share
+        self.system_type = system_type
+        self.terminal_flow = terminal_flow
+        self.duct_length = duct_length
+        self.cross_share = cross_share
+        self.tap_share = tap_share
+        self.branch_critical_share = branch_critical_share
+        self.random = random.Random(seed)
+
+        self.is_supply = system_type == SYSTEM_SUPPLY_AIR
+        self.elements = {}
+        self.element_order = []
+        self.catalogue = SectionCatalogue()
+        self.next_id = 1000
+        self.next_section_number = 1
+
+    def generate(self):
+        """
+        Строит сеть.
+
+        Returns:
+            DuctNetworkSnapshot
+        """
+        shape = self.__choose_shape()
+        _, critical_path, _ = self.__build_run((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), self.terminals, shape, None, [])
+
+        # Критический путь идет по направлению воздуха: на притоке от начала сети, на вытяжке - к нему
+        if not self.is_supply:
+            critical_path.reverse()
+
+        return DuctNetworkSnapshot(1,
+                                   'Синтетическая {0}'.format(self.terminals),
+                                   self.system_type,
+                                   self.elements,
+                                   self.element_order,
+                                   self.catalogue,
+                                   critical_path)
+
+    def __choose_shape(self):
+        return SHAPE_RECTANGULAR if self.random.random() < self.rect_share else SHAPE_ROUND
+
+    def __get_size(self, flow, shape):
+        required_area = flow / 3600.0 / DESIGN_VELOCITY * 1000000
+        if shape == SHAPE_ROUND:
+            for diameter in ROUND_DIAMETERS:
+                if 3.14159 * diameter * diameter / 4 >= required_area:
+                    return {'radius': diameter / 2.0}
+            return {'radius': ROUND_DIAMETERS[-1] / 2.0}
+
+        for width in RECT_WIDTHS:
+            height = max(100, width // 2)
+            if width * height >= required_area:
+                return {'width': float(width), 'height': float(height)}
+        return {'width': float(RECT_WIDTHS[-1]), 'height': float(RECT_WIDTHS[-1] // 2)}
+
+    def __new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def __add_element(self, element):
+        self.elements[element.id] = element
+        self.element_order.append(element.id)
+        return element
+
+    def __create_connector(self, owner_id, index, flow, shape, origin, upstream, angle=0.0, size_flow=None):
+        # upstream - коннектор смотрит к началу сети. На притоке воздух входит через него, на вытяжке - выходит.
+        # size_flow - расход, по которому подбирается сечение, если он отличается от расхода через коннектор
+        direction = DIRECTION_IN if upstream == self.is_supply else DIRECTION_OUT
+        size = self.__get_size(size_flow if size_flow is not None else flow, shape)
+        return ConnectorSnapshot(index, owner_id, shape, flow, direction, angle, origin,
+                                 connector_type='End', **size)
+
+    @staticmethod
+    def __connect(connector_1, connector_2):
+        if connector_1 is None or connector_2 is None:
+            return
+        connector_1.connected_id = connector_2.owner_id
+        connector_1.ref_owner_ids = [connector_2.owner_id]
+        connector_2.connected_id = connector_1.owner_id
+        connector_2.ref_owner_ids = [connector_1.owner_id]
+
+    def __add_duct(self, start, end, flow, shape, upstream_connector, section_ids, segment_lengths,
+                   section_end=None):
+        # section_end - где кончается участок воздуховода в этой секции, если воздуховод идет дальше через врезку
+        duct_id = self.__new_id()
+        start_connector = self.__create_connector(duct_id, 0, flow, shape, start, upstream=True)
+        end_connector = self.__create_connector(duct_id, 1, flow, shape, end, upstream=False)
+        self.__connect(upstream_connector, start_connector)
+        self.__add_element(ElementSnapshot(duct_id, CATEGORY_DUCT, connectors=[start_connector, end_connector]))
+        section_ids.append(duct_id)
+        segment_lengths[duct_id] = distance_between(start, section_end or end) / 1000.0
+        return end_connector
+
+    def __add_section(self, flow, element_ids, segment_lengths):
+        number = self.next_section_number
+        self.next_section_number += 1
+        pressure_drops = dict((element_id, length * FRICTION_LOSS) for element_id, length in segment_lengths.items())
+        self.catalogue.add_section(SectionData(number, flow, element_ids, segment_lengths, pressure_drops))
+        return number
+
+    def __build_run(self, start, direction, terminals, shape, upstream_connector, section_ids,
+                    segment_lengths=None):
+        """
+        Строит участок постоянного расхода от start по direction и все, что за ним.
+
+        Returns:
+            tuple: Номер секции, критический путь от этой секции (номера секций), его длина в мм.
+        """
+        flow = terminals * self.terminal_flow
+        segment_lengths = dict(segment_lengths or {})
+        section_ids = list(section_ids)
+        x, y, z = start
+        dx, dy, dz = direction
+
+        if terminals == 1:
+            corner = (x + dx * self.duct_length, y + dy * self.duct_length, z)
+            elbow_start = (corner[0] - dx * ELBOW_HALF_SIZE, corner[1] - dy * ELBOW_HALF_SIZE, z)
+            elbow_end = (corner[0], corner[1], z - ELBOW_HALF_SIZE)
+            connector = self.__add_duct(start, elbow_start, flow, shape, upstream_connector, section_ids,
+                                        segment_lengths)
+
+            elbow_id = self.__new_id()
+            elbow_in = self.__create_connector(elbow_id, 0, flow, shape, elbow_start, upstream=True, angle=90.0)
+            elbow_out = self.__create_connector(elbow_id, 1, flow, shape, elbow_end, upstream=False, angle=90.0)
+            self.__connect(connector, elbow_in)
+            self.__add_element(ElementSnapshot(elbow_id, CATEGORY_FITTING, PART_TYPE_ELBOW, corner,
+                                               [elbow_in, elbow_out]))
+            section_ids.append(elbow_id)
+
+            terminal_origin = (corner[0], corner[1], z - TERMINAL_DROP)
+            connector = self.__add_duct(elbow_end, terminal_origin, flow, shape, elbow_out, section_ids,
+                                        segment_lengths)
+
+            terminal_id = self.__new_id()
+            terminal_connector = self.__create_connector(terminal_id, 0, flow, shape, terminal_origin, upstream=True)
+            self.__connect(connector, terminal_connector)
+            self.__add_element(ElementSnapshot(terminal_id, CATEGORY_TERMINAL, location=terminal_origin,
+                                               connectors=[terminal_connector], flow=flow))
+            section_ids.append(terminal_id)
+
+            number = self.__add_section(flow, section_ids, segment_lengths)
+            return number, [number], self.duct_length + TERMINAL_DROP
+
+        junction = self.random.random()
+        if junction < self.cross_share and terminals >= 3:
+            outlets = self.__add_cross(start, direction, terminals, shape, upstream_connector, section_ids,
+                                       segment_lengths)
+        elif junction < self.cross_share + self.tap_share:
+            outlets = self.__add_tap(start, direction, terminals, shape, upstream_connector, section_ids,
+                                     segment_lengths)
+        else:
+            outlets = self.__add_tee(start, direction, terminals, shape, upstream_connector, section_ids,
+                                     segment_lengths)
+        number = self.next_section_number - 1
+
+        critical_path = None
+        critical_length = None
+        for outlet_start, outlet_direction, outlet_terminals, outlet_shape, outlet_connector, outlet_section_ids, \
+                outlet_segment_lengths, outlet_offset in outlets:
+            _, path, length = self.__build_run(outlet_start, outlet_direction, outlet_terminals, outlet_shape,
+                                               outlet_connector, outlet_section_ids, outlet_segment_lengths)
+            length += outlet_offset
+            if critical_length is None or length > critical_length:
+                critical_path = path
+                critical_length = length
+        return number, [number] + critical_path, self.duct_length + critical_length
+
+    def __split_terminals(self, terminals, branch_count):
+        """
+        Делит воздухораспределители между проходом и ответвлениями.
+
+        Returns:
+            list: Количество воздухораспределителей прохода, затем ответвлений.
+        """
+        branches = [max(1, terminals // (self.branching + branch_count - 1)) for _ in range(branch_count)]
+        shares = [terminals - sum(branches)] + branches
+        # Большая часть уходит в ответвление, и критический путь поворачивает в него
+        if self.random.random() < self.branch_critical_share and shares[0] > shares[1]:
+            shares[0], shares[1] = shares[1], shares[0]
+        return shares
+
+    def __get_junction_points(self, start, direction):
+        x, y, z = start
+        dx, dy, dz = direction
+        center = (x + dx * self.duct_length, y + dy * self.duct_length, z)
+        # Ответвление уходит перпендикулярно в горизонтальной плоскости, стороны чередуются
+        side = 1 if self.next_id % 2 else -1
+        branch_direction = (-dy * side, dx * side, 0.0)
+        return center, branch_direction
+
+    def __add_pass_transition(self, start, direction, flow, pass_flow, shape, connector, pass_section_ids):
+        """
+        Ставит переход за проходом, если на проходе уменьшается сечение.
+
+        Returns:
+            tuple: Начало прохода после перехода и его коннектор.
+        """
+        if self.__get_size(flow, shape) == self.__get_size(pass_flow, shape):
+            return start, connector
+        dx, dy, dz = direction
+        transition_end = (start[0] + dx * TRANSITION_LENGTH, start[1] + dy * TRANSITION_LENGTH, start[2])
+        transition_id = self.__new_id()
+        transition_in = self.__create_connector(transition_id, 0, pass_flow, shape, start, upstream=True,
+                                                size_flow=flow)
+        transition_out = self.__create_connector(transition_id, 1, pass_flow, shape, transition_end,
+                                                 upstream=False)
+        self.__connect(connector, transition_in)
+        location = ((start[0] + transition_end[0]) / 2, (start[1] + transition_end[1]) / 2, start[2])
+        self.__add_element(ElementSnapshot(transition_id, CATEGORY_FITTING, PART_TYPE_TRANSITION, location,
+                                           [transition_in, transition_out]))
+        pass_section_ids.append(transition_id)
+        return transition_end, transition_out
+
+    def __add_tee(self, start, direction, terminals, shape, upstream_connector, section_ids, segment_lengths):
+        """
+        Ставит тройник в конце воздуховода от start.
+
+        Returns:
+            list: Выходы разветвления - аргументы для __build_run и сдвиг начала выхода от разветвления, мм.
+        """
+        flow = terminals * self.terminal_flow
+        pass_terminals, branch_terminals = self.__split_terminals(terminals, 1)
+        branch_shape = self.__choose_shape()
+        dx, dy, dz = direction
+
+        tee_center, branch_direction = self.__get_junction_points(start, direction)
+        tee_in = (tee_center[0] - dx * TEE_HALF_SIZE, tee_center[1] - dy * TEE_HALF_SIZE, tee_center[2])
+        tee_pass = (tee_center[0] + dx * TEE_HALF_SIZE, tee_center[1] + dy * TEE_HALF_SIZE, tee_center[2])
+        tee_branch = (tee_center[0] + branch_direction[0] * TEE_HALF_SIZE,
+                      tee_center[1] + branch_direction[1] * TEE_HALF_SIZE,
+                      tee_center[2])
+
+        connector = self.__add_duct(start, tee_in, flow, shape, upstream_connector, section_ids, segment_lengths)
+
+        tee_id = self.__new_id()
+        tee_in_connector = self.__create_connector(tee_id, 0, flow, shape, tee_in, upstream=True)
+        # Проходной коннектор тройника того же сечения, что и вход, переход ставится за ним
+        tee_pass_connector = self.__create_connector(tee_id, 1, pass_terminals * self.terminal_flow, shape,
+                                                     tee_pass, upstream=False, size_flow=flow)
+        tee_branch_connector = self.__create_connector(tee_id, 2, branch_terminals * self.terminal_flow,
+                                                       branch_shape, tee_branch, upstream=False)
+        self.__connect(connector, tee_in_connector)
+        self.__add_element(ElementSnapshot(tee_id, CATEGORY_FITTING, PART_TYPE_TEE, tee_center,
+                                           [tee_in_connector, tee_pass_connector, tee_branch_connector]))
+        section_ids.append(tee_id)
+        self.__add_section(flow, section_ids, segment_lengths)
+
+        pass_section_ids = [tee_id]
+        pass_start, pass_connector = self.__add_pass_transition(tee_pass, direction, flow,
+                                                                pass_terminals * self.terminal_flow, shape,
+                                                                tee_pass_connector, pass_section_ids)
+        return [(pass_start, direction, pass_terminals, shape, pass_connector, pass_section_ids, None, 0.0),
+                (tee_branch, branch_direction, branch_terminals, branch_shape, tee_branch_connector, [tee_id], None,
+                 0.0)]
+
+    def __add_cross(self, start, direction, terminals, shape, upstream_connector, section_ids, segment_lengths):
+        """
+        Ставит крестовину с двумя ответвлениями в разные стороны в конце воздуховода от start.
+
+        Returns:
+            list: Выходы разветвления, как у __add_tee.
+        """
+        flow = terminals * self.terminal_flow
+        pass_terminals, branch_terminals_1, branch_terminals_2 = self.__split_terminals(terminals, 2)
+        branch_shape = self.__choose_shape()
+        dx, dy, dz = direction
+
+        cross_center, branch_direction = self.__get_junction_points(start, direction)
+        cross_in = (cross_center[0] - dx * TEE_HALF_SIZE, cross_center[1] - dy * TEE_HALF_SIZE, cross_center[2])
+        cross_pass = (cross_center[0] + dx * TEE_HALF_SIZE, cross_center[1] + dy * TEE_HALF_SIZE, cross_center[2])
+        branch_directions = [branch_direction, (-branch_direction[0], -branch_direction[1], 0.0)]
+        branch_points = [(cross_center[0] + branch_dx * TEE_HALF_SIZE, cross_center[1] + branch_dy * TEE_HALF_SIZE,
+                          cross_center[2])
+                         for branch_dx, branch_dy, _ in branch_directions]
+
+        connector = self.__add_duct(start, cross_in, flow, shape, upstream_connector, section_ids, segment_lengths)
+
+        cross_id = self.__new_id()
+        cross_in_connector = self.__create_connector(cross_id, 0, flow, shape, cross_in, upstream=True)
+        cross_pass_connector = self.__create_connector(cross_id, 1, pass_terminals * self.terminal_flow, shape,
+                                                       cross_pass, upstream=False, size_flow=flow)
+        branch_connectors = [self.__create_connector(cross_id, index + 2, branch_terminals * self.terminal_flow,
+                                                     branch_shape, point, upstream=False)
+                             for index, (branch_terminals, point) in enumerate(
+                                 zip([branch_terminals_1, branch_terminals_2], branch_points))]
+        self.__connect(connector, cross_in_connector)
+        self.__add_element(ElementSnapshot(cross_id, CATEGORY_FITTING, PART_TYPE_CROSS, cross_center,
+                                           [cross_in_connector, cross_pass_connector] + branch_connectors))
+        section_ids.append(cross_id)
+        self.__add_section(flow, section_ids, segment_lengths)
+
+        pass_section_ids = [cross_id]
+        pass_start, pass_connector = self.__add_pass_transition(cross_pass, direction, flow,
+                                                                pass_terminals * self.terminal_flow, shape,
+                                                                cross_pass_connector, pass_section_ids)
+        outlets = [(pass_start, direction, pass_terminals, shape, pass_connector, pass_section_ids, None, 0.0)]
+        for branch_terminals, point, branch_dir, branch_connector in zip([branch_terminals_1, branch_terminals_2],
+                                                                          branch_points, branch_directions,
+                                                                          branch_connectors):
+            outlets.append((point, branch_dir, branch_terminals, branch_shape, branch_connector, [cross_id], None,
+                            0.0))
+        return outlets
+
+    def __add_tap(self, start, direction, terminals, shape, upstream_connector, section_ids, segment_lengths):
+        """
+        Ставит врезку в воздуховод от start. Воздуховод идет дальше точки врезки на TAP_RUN и входит и в секцию
+        до врезки, и в секцию прохода, в каждую своей длиной.
+
+        Returns:
+            list: Выходы разветвления, как у __add_tee.
+        """
+        flow = terminals * self.terminal_flow
+        pass_terminals, branch_terminals = self.__split_terminals(terminals, 1)
+        branch_shape = self.__choose_shape()
+        dx, dy, dz = direction
+
+        tap_point, branch_direction = self.__get_junction_points(start, direction)
+        duct_end = (tap_point[0] + dx * TAP_RUN, tap_point[1] + dy * TAP_RUN, tap_point[2])
+        tap_end = (tap_point[0] + branch_direction[0] * TAP_LENGTH,
+                   tap_point[1] + branch_direction[1] * TAP_LENGTH,
+                   tap_point[2])
+
+        duct_end_connector = self.__add_duct(start, duct_end, flow, shape, upstream_connector, section_ids,
+                                             segment_lengths, section_end=tap_point)
+        duct = self.elements[duct_end_connector.owner_id]
+
+        tap_id = self.__new_id()
+        branch_flow = branch_terminals * self.terminal_flow
+        tap_in = self.__create_connector(tap_id, 0, branch_flow, branch_shape, tap_point, upstream=True)
+        tap_out = self.__create_connector(tap_id, 1, branch_flow, branch_shape, tap_end, upstream=False)
+        # У воздуховода врезка - коннектор типа Curve с нулевым расходом
+        duct_tap_connector = ConnectorSnapshot(len(duct.connectors), duct.id, shape, 0.0, DIRECTION_BIDIRECTIONAL,
+                                               0.0, tap_point, connector_type=CONNECTOR_TYPE_CURVE,
+                                               **self.__get_size(flow, shape))
+        duct.connectors.append(duct_tap_connector)
+        self.__connect(duct_tap_connector, tap_in)
+        self.__add_element(ElementSnapshot(tap_id, CATEGORY_FITTING, PART_TYPE_TAP, tap_point, [tap_in, tap_out]))
+        section_ids.append(tap_id)
+        self.__add_section(flow, section_ids, segment_lengths)
+
+        pass_segment_lengths = {duct.id: TAP_RUN / 1000.0}
+        return [(duct_end, direction, pass_terminals, shape, duct_end_connector, [duct.id, tap_id],
+                 pass_segment_lengths, TAP_RUN),
+                (tap_end, branch_direction, branch_terminals, branch_shape, tap_out, [tap_id], None, TAP_LENGTH)]
+
+
+class StageResult:
+    """Результат замера одного этапа."""
+
+    def __init__(self, name, seconds, items):
+        """
+        Инициализация объекта StageResult.
+
+        Args:
+            name (str): Название этапа.
+            seconds (float): Время, с.
+            items (int): Количество обработанных элементов.
+        """
+        self.name = name
+        self.seconds = seconds
+        self.items = items
+
+    @property
+    def items_per_second(self):
+        if self.seconds <= 0:
+            return float('inf')
+        return self.items / self.seconds
+
+    def to_dict(self):
+        return {'name': self.name, 'seconds': self.seconds, 'items': self.items}
+
+
+def _measure(results, name, items, action):
+    start = time.time()
+    value = action()
+    results.append(StageResult(name, time.time() - start, items))
+    return value
+
+
+def _create_report_rows(network, records):
+    rows = []
+    for number in network.critical_path_numbers:
+        section = network.sections.get_section(number)
+        for element_id in section.element_ids:
+            record = records.get(element_id)
+            name = 'Воздуховод'
+            if record is not None:
+                name = record.cross_tee_name or record.transition_elbow_name or name
+            length = section.get_segment_length(element_id)
+            pressure_drop = section.get_pressure_drop(element_id) or 0.0
+            coefficient = record.coefficient if record is not None else 0.0
+            rows.append(ReportBuilder.ReportRow(name,
+                                                length if length is not None else '-',
+                                                0.0,
+                                                section.flow,
+                                                DESIGN_VELOCITY,
+                                                coefficient,
+                                                pressure_drop + coefficient * 9.6,
+                                                str(element_id),
+                                                element_id))
+    return rows
+
+
+def run_benchmark(terminals, branching=2, rect_share=0.5, system_type=SYSTEM_SUPPLY_AIR, workers=1, seed=0):
+    """
+    Прогоняет все этапы расчета на синтетической сети.
+
+    Args:
+        terminals (int): Количество воздухораспределителей.
+        branching (int): Делитель ответвлений.
+        rect_share (float): Доля прямоугольных ветвей.
+        system_type (str): Тип системы.
+        workers (int): Количество потоков для параллельного расчета КМС. 1 - этап пропускается.
+        seed (int): Зерно генератора.
+
+    Returns:
+        list: Список StageResult.
+    """
+    results = []
+    generator = SyntheticNetworkGenerator(terminals, branching, rect_share, system_type, seed=seed)
+    network = _measure(results, 'Генерация сети', terminals, generator.generate)
+    element_count = len(network.elements)
+
+    def round_trip():
+        return DuctNetworkSnapshot.from_dict(json.loads(json.dumps(network.to_dict())))
+    _measure(results, 'Сериализация снимка', element_count, round_trip)
+
+    calculated = [element for element in network.get_network_elements()
+                  if element.category in (CATEGORY_FITTING, CATEGORY_TERMINAL)]
+
+    def calculate(worker_count):
+        def action():
+            connector_cache = CalculatorClassLib.ConnectorDataCache()
+            return CoefficientRunner.calculate_records(network, calculated, connector_cache, workers=worker_count)
+        return action
+    records = _measure(results, 'КМС, 1 поток', len(calculated), calculate(1))
+    if workers > 1:
+        _measure(results, 'КМС, потоков: {0}'.format(workers), len(calculated), calculate(workers))
+
+    records_by_id = dict((element.id, record) for element, record in zip(calculated, records))
+    # Строка отчета - элемент секции критического пути
+    row_count = sum(len(network.sections.get_section(number).element_ids) for number in network.critical_path_numbers)
+    rows = _measure(results, 'Строки отчета', row_count, lambda: _create_report_rows(network, records_by_id))
+    report = _measure(results, 'Сборка отчета', len(rows), lambda: ReportBuilder.build_report(rows))
+
+    def write_report():
+        handle, file_path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        try:
+            ReportWriters.write_csv(report, file_path, network.system_name, 1.2)
+        finally:
+            os.remove(file_path)
+    _measure(results, 'Запись CSV', report.row_count, write_report)
+
+    return results
+
+
+def format_results(results):
+    lines = ['{0:<24}{1:>12}{2:>10}{3:>14}'.format('Этап', 'Время, с', 'Элементов', 'Элементов/с')]
+    for result in results:
+        lines.append('{0:<24}{1:>12.4f}{2:>10}{3:>14.0f}'.format(result.name,
+                                                                result.seconds,
+                                                                result.items,
+                                                                result.items_per_second))
+    return '\n'.join(lines)
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """
+    Сравнивает время этапов с сохраненным замером.
+
+    Args:
+        results (list): Список StageResult.
+        baseline_path (str): Путь к JSON с прошлым замером.
+        tolerance (float): Во сколько раз этап может стать медленнее без ошибки.
+
+    Returns:
+        list: Названия этапов, которые замедлились сильнее допуска.
+    """
+    with open(baseline_path) as baseline_file:
+        baseline = dict((stage['name'], stage['seconds']) for stage in json.load(baseline_file))
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.name)
+        if previous and result.seconds > previous * tolerance:
+            regressions.append(result.name)
+    return regressions
+
+
+# Точечные значения для проверки коэффициента трения: (метод, Re, шероховатость / диаметр, λ, допуск).
+# Значения по Колбруку - диаграмма Муди, Альтшуль должен попадать в них с погрешностью формулы
+FRICTION_FACTOR_CHECKS = [
+    (FrictionLoss.METHOD_ALTSHUL, 1000.0, 0.001, 0.064, 1e-9),
+    (FrictionLoss.METHOD_COLEBROOK, 1e5, 0.0001, 0.0185, 0.01),
+    (FrictionLoss.METHOD_COLEBROOK, 1e6, 0.0, 0.0116, 0.01),
+    (FrictionLoss.METHOD_COLEBROOK, 1e5, 0.001, 0.0222, 0.01),
+    (FrictionLoss.METHOD_ALTSHUL, 1e5, 0.001, 0.0222, 0.02)
+]
+
+# Удельные потери на трение воздуховодов для проверки: (диаметр, мм; расход, м3/ч; потери, Па/м; допуск)
+FRICTION_LOSS_CHECKS = [
+    (200.0, 500.0, 1.3, 0.03)
+]
+
+
+def _check_value(name, value, expected, tolerance):
+    if abs(value - expected) > abs(expected) * tolerance:
+        return ['{0}: {1:.5g} вместо {2:.5g}'.format(name, value, expected)]
+    return []
+
+
+def check_friction_factors():
+    """
+    Сверяет коэффициенты трения и удельные потери FrictionLoss с известными значениями.
+
+    Returns:
+        list: Описания несовпадений. Пустой список - проверка пройдена.
+    """
+    failures = []
+    for method, reynolds, relative_roughness, expected, tolerance in FRICTION_FACTOR_CHECKS:
+        value = FrictionLoss.get_friction_factor(reynolds, relative_roughness, method)
+        name = 'λ {0}, Re = {1:g}, k/d = {2:g}'.format(method, reynolds, relative_roughness)
+        failures.extend(_check_value(name, value, expected, tolerance))
+
+    for diameter, flow, expected, tolerance in FRICTION_LOSS_CHECKS:
+        segment = FrictionLoss.DuctSegment(None, CATEGORY_DUCT, SHAPE_ROUND, 1.0, flow, diameter=diameter)
+        for method in [FrictionLoss.METHOD_ALTSHUL, FrictionLoss.METHOD_COLEBROOK]:
+            value = FrictionLoss.get_segment_pressure_drop(segment, FrictionLoss.DEFAULT_DENSITY, method=method)
+            name = 'R {0}, ø{1:g} мм, {2:g} м3/ч'.format(method, diameter, flow)
+            failures.extend(_check_value(name, value, expected, tolerance))
+    return failures
+
+
+def check_friction_snapshot(file_path, tolerance=0.05):
+    """
+    Сверяет потери на трение FrictionLoss по обеим формулам с потерями Revit, сохраненными в снимке сети модели.
+
+    Args:
+        file_path (str): Путь к снимку сети, сохраненному DuctNetworkSnapshot.save.
+        tolerance (float): Допустимое относительное отклонение.
+
+    Returns:
+        list: Описания расхождений. Пустой список - проверка пройдена.
+    """
+    network = DuctNetworkSnapshot.load(file_path)
+    density = network.density or FrictionLoss.DEFAULT_DENSITY
+    kinematic_viscosity = network.kinematic_viscosity or FrictionLoss.DEFAULT_KINEMATIC_VISCOSITY
+
+    checked = 0
+    for number in network.critical_path_numbers:
+        section = network.sections.get_section(number)
+        for segment in FrictionLoss.get_section_segments(network, section):
+            if section.get_pressure_drop(segment.element_id) is not None:
+                checked += 1
+    if not checked:
+        return ['{0}: в снимке нет воздуховодов с потерями Revit'.format(file_path)]
+
+    failures = []
+    for method in [FrictionLoss.METHOD_ALTSHUL, FrictionLoss.METHOD_COLEBROOK]:
+        deviations = FrictionLoss.compare_with_revit(network, density, kinematic_viscosity, method, tolerance)
+        for number, element_id, revit_pressure_drop, pressure_drop in deviations:
+            failures.append('{0}, {1}: секция {2}, воздуховод {3}: Revit {4:.3f} Па, расчет {5:.3f} Па'.format(
+                file_path, method, number, element_id, revit_pressure_drop, pressure_drop))
+    return failures
+
+
+def check_friction_loss(snapshot_paths):
+    """
+    Проверяет расчет потерь на трение: точечные значения и сверка со снимками сетей из моделей.
+
+    Args:
+        snapshot_paths (list): Пути к снимкам сетей.
+
+    Returns:
+        list: Описания несовпадений. Пустой список - проверка пройдена.
+    """
+    failures = check_friction_factors()
+    for file_path in snapshot_paths:
+        failures.extend(check_friction_snapshot(file_path))
+    return failures
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Замеры расчета аэродинамики на синтетических сетях')
+    parser.add_argument('--terminals', type=int, default=500, help='количество воздухораспределителей')
+    parser.add_argument('--branching', type=int, default=2, help='делитель ответвлений')
+    parser.add_argument('--rect-share', type=float, default=0.5, help='доля прямоугольных ветвей')
+    parser.add_argument('--system', choices=['supply', 'exhaust'], default='supply', help='тип системы')
+    parser.add_argument('--workers', type=int, default=1, help='потоков для параллельного расчета КМС')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора')
+    parser.add_argument('--save', help='сохранить замер в JSON')
+    parser.add_argument('--baseline', help='сравнить с замером из JSON')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='допустимое замедление относительно замера')
+    parser.add_argument('--check-friction', nargs='*', metavar='SNAPSHOT',
+                        help='вместо замеров проверить потери на трение по известным значениям и снимкам сетей')
+    options = parser.parse_args(arguments)
+
+    if options.check_friction is not None:
+        failures = check_friction_loss(options.check_friction)
+        for failure in failures:
+            print(failure)
+        print('Проверка потерь на трение: ' + ('ошибок: {0}'.format(len(failures)) if failures else 'пройдена'))
+        return 1 if failures else 0
+
+    system_type = SYSTEM_SUPPLY_AIR if options.system == 'supply' else SYSTEM_EXHAUST_AIR
+    results = run_benchmark(options.terminals, options.branching, options.rect_share, system_type,
+                            options.workers, options.seed)
+    print(format_results(results))
+
+    if options.save:
+        with open(options.save, 'w') as save_file:
+            json.dump([result.to_dict() for result in results], save_file)
+
+    if options.baseline:
+        regressions = compare_with_baseline(results, options.baseline, options.tolerance)
+        if regressions:
+            print('Замедлились: ' + ', '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import deque
+
+from DuctNetworkSnapshot import *
+
+
+class TerminalResult:
+    """
+    Потери от вентилятора до воздухораспределителя.
+
+    Attributes:
+        terminal_id (int): Id воздухораспределителя.
+        section_number (int): Номер секции воздухораспределителя.
+        flow (float): Расход секции воздухораспределителя, м3/ч.
+        pressure_drop (float): Суммарные потери от вентилятора, Па.
+        path (list): Номера секций от вентилятора до воздухораспределителя.
+        is_critical (bool): Лежит ли воздухораспределитель на критическом пути.
+    """
+
+    def __init__(self, terminal_id, section_number, flow, pressure_drop, path, is_critical):
+        self.terminal_id = terminal_id
+        self.section_number = section_number
+        self.flow = flow
+        self.pressure_drop = pressure_drop
+        self.path = path
+        self.is_critical = is_critical
+
+    def get_imbalance(self, reference_pressure_drop):
+        """
+        Возвращает невязку с критическим путем.
+
+        Args:
+            reference_pressure_drop (float): Потери критического пути, Па.
+
+        Returns:
+            tuple: (невязка, Па; невязка, % от потерь критического пути).
+        """
+        imbalance = reference_pressure_drop - self.pressure_drop
+        if reference_pressure_drop == 0:
+            return imbalance, 0.0
+        return imbalance, imbalance / reference_pressure_drop * 100
+
+
+def build_section_graph(network):
+    """
+    Собирает граф смежности секций: секции смежны, если у них есть общий элемент или соединенные элементы.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+
+    Returns:
+        dict: {Номер секции: множество номеров смежных секций}.
+    """
+    element_sections = {}
+    for section in network.sections.sections:
+        for element_id in section.element_ids:
+            element_sections.setdefault(element_id, set()).add(section.number)
+
+    graph = dict((section.number, set()) for section in network.sections.sections)
+    for element_id, numbers in element_sections.items():
+        neighbour_numbers = set(numbers)
+        element = network.get_element(element_id)
+        if element is not None:
+            for connector in element.connectors:
+                for owner_id in connector.ref_owner_ids:
+                    neighbour_numbers.update(element_sections.get(owner_id, ()))
+        for number in numbers:
+            graph[number].update(neighbour_numbers)
+            graph[number].discard(number)
+    return graph
+
+
+def get_root_section(network):
+    """
+    Возвращает номер секции у вентилятора: секцию критического пути с наибольшим расходом или,
+    если критического пути нет, секцию системы с наибольшим расходом.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+
+    Returns:
+        int: Номер секции или None, если секций нет.
+    """
+    numbers = network.critical_path_numbers or [section.number for section in network.sections.sections]
+    if not numbers:
+        return None
+    return max(numbers, key=lambda number: network.sections.get_section(number).flow)
+
+
+class BranchAnalysis:
+    """
+    Потери от вентилятора до каждого воздухораспределителя за один обход дерева секций.
+
+    Секции обходятся в ширину от секции у вентилятора, потери каждой секции считаются один раз и прибавляются
+    к уже посчитанной сумме родительской секции. Воздуховоды учитываются в каждой секции, в которую входят
+    (у них своя длина в каждой секции), остальные элементы - один раз, в первой по ходу обхода секции, как в отчете.
+    """
+
+    def __init__(self, network, get_element_pressure_drop):
+        """
+        Инициализация объекта BranchAnalysis.
+
+        Args:
+            network (DuctNetworkSnapshot): Снимок сети.
+            get_element_pressure_drop: Функция (section, element_id) -> потери элемента в секции, Па.
+        """
+        self.network = network
+        self.get_element_pressure_drop = get_element_pressure_drop
+        self.parents = {}
+        self.cumulative_pressure_drops = {}
+        self.section_pressure_drops = {}
+        self.passed_ids = set()
+
+    def get_section_pressure_drop(self, section):
+        """
+        Считает потери секции без учета элементов, которые уже вошли в секции выше по потоку.
+
+        Args:
+            section (SectionData): Секция.
+
+        Returns:
+            float: Потери, Па.
+        """
+        pressure_drop = 0.0
+        for element_id in section.element_ids:
+            if section.get_segment_length(element_id) is None:
+                if element_id in self.passed_ids:
+                    continue
+                self.passed_ids.add(element_id)
+            pressure_drop += self.get_element_pressure_drop(section, element_id)
+        self.section_pressure_drops[section.number] = pressure_drop
+        return pressure_drop
+
+    def traverse(self):
+        """
+        Обходит дерево секций и запоминает для каждой секции родителя и сумму потерь от вентилятора.
+        """
+        root = get_root_section(self.network)
+        if root is None:
+            return
+        graph = build_section_graph(self.network)
+        sections = self.network.sections
+
+        self.parents[root] = None
+        self.cumulative_pressure_drops[root] = self.get_section_pressure_drop(sections.get_section(root))
+        queue = deque([root])
+        while queue:
+            number = queue.popleft()
+            # Сначала секции с большим расходом, чтобы общие фитинги учитывались в магистрали
+            neighbours = sorted(graph[number], key=lambda item: -sections.get_section(item).flow)
+            for neighbour in neighbours:
+                if neighbour in self.parents:
+                    continue
+                self.parents[neighbour] = number
+                self.cumulative_pressure_drops[neighbour] = (self.cumulative_pressure_drops[number] +
+                                                             self.get_section_pressure_drop(
+                                                                 sections.get_section(neighbour)))
+                queue.append(neighbour)
+
+    def get_path(self, number):
+        """
+        Возвращает номера секций от вентилятора до заданной секции.
+
+        Args:
+            number (int): Номер секции.
+
+        Returns:
+            list
+        """
+        path = []
+        while number is not None:
+            path.append(number)
+            number = self.parents.get(number)
+        path.reverse()
+        return path
+
+    def get_terminal_results(self):
+        """
+        Возвращает потери до каждого воздухораспределителя сети.
+
+        Returns:
+            list: Список TerminalResult по убыванию потерь.
+        """
+        if not self.parents:
+            self.traverse()
+
+        critical_numbers = set(self.network.critical_path_numbers)
+        results = []
+        passed_terminal_ids = set()
+        for section in self.network.sections.sections:
+            if section.number not in self.cumulative_pressure_drops:
+                continue
+            for element_id in section.element_ids:
+                element = self.network.get_element(element_id)
+                if element is None or element.category != CATEGORY_TERMINAL or element_id in passed_terminal_ids:
+                    continue
+                passed_terminal_ids.add(element_id)
+                results.append(TerminalResult(element_id,
+                                              section.number,
+                                              section.flow,
+                                              self.cumulative_pressure_drops[section.number],
+                                              self.get_path(section.number),
+                                              section.number in critical_numbers))
+        results.sort(key=lambda result: -result.pressure_drop)
+        return results
+
+    def get_critical_pressure_drop(self):
+        """
+        Возвращает потери критического пути по этому же обходу: наибольшую сумму среди секций критического пути.
+
+        Returns:
+            float: Потери, Па.
+        """
+        if not self.parents:
+            self.traverse()
+        values = [self.cumulative_pressure_drops[number] for number in self.network.critical_path_numbers
+                  if number in self.cumulative_pressure_drops]
+        if not values:
+            return max(self.cumulative_pressure_drops.values() or [0.0])
+        return max(values)
@@ -1,36 +1,14 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import clr
-
-clr.AddReference("RevitAPI")
-clr.AddReference("RevitAPIUI")
-clr.AddReference("dosymep.Revit.dll")
-clr.AddReference("dosymep.Bim4Everyone.dll")
-import dosymep
-
-clr.ImportExtensions(dosymep.Revit)
-clr.ImportExtensions(dosymep.Bim4Everyone)
-
-import sys
-import System
-import math
-from pyrevit import forms
-from Autodesk.Revit.DB import *
-from Autodesk.Revit.UI import TaskDialog
-from Autodesk.Revit.UI.Selection import ObjectType
-from Autodesk.Revit.DB.ExternalService import *
-from Autodesk.Revit.DB.ExtensibleStorage import *
-from Autodesk.Revit.UI.Selection import ObjectType, ISelectionFilter, Selection
-from System.Collections.Generic import List
-from System import Guid
-from pyrevit import revit
-from collections import namedtuple
-from Autodesk.Revit.DB.ExternalService import *
-from Autodesk.Revit.DB.ExtensibleStorage import *
-from Autodesk.Revit.DB.Mechanical import *
-from dosymep.Bim4Everyone.Templates import ProjectParameters
-from dosymep.Bim4Everyone.SharedParams import SharedParamsConfig
+import CoefficientTables
+from DuctNetworkSnapshot import *
+
+
+class CalculationError(Exception):
+    """Ошибка расчета КМС. Сообщение показывается пользователю скриптом кнопки."""
+    pass
+
 
 class ConnectorData:
     """Класс для хранения данных о коннекторе."""
@@ -43,49 +21,27 @@ class ConnectorData:
     connected_element = None
     flow = None
 
-    def __init__(self, connector):
+    def __init__(self, connector, connected_element=None):
         """
         Инициализация объекта ConnectorData.
 
         Args:
-            connector (Connector): Объект коннектора.
+            connector (ConnectorSnapshot): Снимок коннектора.
+            connected_element (ElementSnapshot): Воздуховод, фитинг, оборудование или арматура, к которым подключен
+                коннектор.
         """
         self.connector_element = connector
-        self.shape = connector.Shape
-        self.get_connected_element()
-        self.flow = UnitUtils.ConvertFromInternalUnits(connector.Flow, UnitTypeId.CubicMetersPerHour)
-        self.direction = connector.Direction
-        self.angle = self.get_connector_angle()
-
-        if connector.Shape == ConnectorProfileType.Round:
-            self.radius = UnitUtils.ConvertFromInternalUnits(connector.Radius, UnitTypeId.Millimeters)
-            self.area = math.pi * ((self.radius / 1000) ** 2)
-        else:
-            self.height = UnitUtils.ConvertFromInternalUnits(connector.Height, UnitTypeId.Millimeters)
-            self.width = UnitUtils.ConvertFromInternalUnits(connector.Width, UnitTypeId.Millimeters)
-            self.area = self.height / 1000 * self.width / 1000
-
-    def get_connector_angle(self):
-        """
-        Вычисляет угол коннектора в градусах.
-
-        Returns:
-            float: Угол коннектора в градусах.
-        """
-        radians = self.connector_element.Angle
-        angle = radians * (180 / math.pi)
-        return angle
-
-    def get_connected_element(self):
-        """
-        Определяет элемент, к которому подключен коннектор.
-        """
-        for reference in self.connector_element.AllRefs:
-            if reference.Owner.InAnyCategory([BuiltInCategory.OST_DuctCurves,
-                                              BuiltInCategory.OST_DuctFitting,
-                                              BuiltInCategory.OST_MechanicalEquipment,
-                                              BuiltInCategory.OST_DuctAccessory]):
-                self.connected_element = reference.Owner
+        self.index = connector.index
+        self.shape = connector.shape
+        self.connected_element = connected_element
+        self.flow = connector.flow
+        self.direction = connector.direction
+        self.angle = connector.angle
+        self.origin = connector.origin
+        self.radius = connector.radius
+        self.height = connector.height
+        self.width = connector.width
+        self.area = connector.area
 
 class MulticonElementCharacteristic:
     """Класс для хранения характеристик сложных фитингов."""
@@ -111,98 +67,177 @@ class MulticonElementCharacteristic:
         self.fc = fc
         self.fp = fp
 
+class ConnectorDataCache:
+    """
+    Кэш ConnectorData по Id элемента на время расчета одной сети. Один экземпляр может быть общим для нескольких
+    калькуляторов, тогда каждый коннектор собирается ровно один раз за расчет.
+
+    Полученные из кэша списки и ConnectorData общие для всех вызовов, изменять их нельзя.
+    """
+
+    network = None
+
+    def __init__(self):
+        self.connector_data = {}
+
+    def set_network(self, network):
+        """
+        Привязывает кэш к снимку сети. Если сеть сменилась - кэш очищается.
+
+        Args:
+            network (DuctNetworkSnapshot): Снимок сети воздуховодов
+        """
+        if self.network is not network:
+            self.clear()
+        self.network = network
+
+    def clear(self):
+        """Очищает кэш."""
+        self.connector_data = {}
+
+    def get_connector_data_instances(self, element):
+        """
+        Получает экземпляры ConnectorData для элемента, собирая их только при первом обращении.
+
+        Args:
+            element (ElementSnapshot): Элемент у которого ищутся коннекторы
+        Returns:
+            Список коннекторов
+        """
+        connector_data_instances = self.connector_data.get(element.id)
+        if connector_data_instances is None:
+            connector_data_instances = [ConnectorData(connector, self.network.get_element(connector.connected_id))
+                                        for connector in element.get_connectors()]
+            self.connector_data[element.id] = connector_data_instances
+        return connector_data_instances
+
+    def warm_up(self):
+        """
+        Собирает ConnectorData для всех элементов сети сразу. После этого кэш только читается и его можно
+        использовать из нескольких потоков.
+        """
+        for element in self.network.elements.values():
+            self.get_connector_data_instances(element)
+
+
 class AerodinamicCoefficientCalculator(object):
-    """Класс для расчета аэродинамических коэффициентов."""
+    """
+    Класс для расчета аэродинамических коэффициентов. Работает только со снимком сети (DuctNetworkSnapshot),
+    к модели Revit не обращается.
+    """
 
     # GUIDы нужны для обращения в ExternalServiceRegistry, сверки с сервисом текущего элемента и его замены
     LOSS_GUID_CONST = "46245996-eebb-4536-ac17-9c1cd917d8cf"
     COEFF_GUID_CONST = "5a598293-1504-46cc-a9c0-de55c82848b9"
 
-    doc = None
-    uidoc = None
-    view = None
-    system = None
+    network = None
     system_is_supply = None
-    all_sections_in_system = None
-    section_indexes = None
-    element_names = {}
-    cross_tee_params = {}
-
-    def __init__(self, doc, uidoc, view):
-        self.doc = doc
-        self.uidoc = uidoc
-        self.view = view
-
-    def __get_all_sections_in_system(self):
+    sections = None
+    critical_path_numbers = None
+    critical_path_positions = None
+    connector_cache = None
+    lookup_tables = CoefficientTables.DEFAULT_TABLES
+    interpolate_tables = False  # Интерполировать табличные КМС вместо ступенчатого выбора
+
+    def __init__(self, connector_cache=None):
         """
-        Возвращает список всех секций, к которым относятся элементы системы MEP. В стандартном API нет возможности
-        посмотреть все номера секций, перебираем их до max_possible_sections.
+        Args:
+            connector_cache (ConnectorDataCache): Общий кэш коннекторов. Если не передан - у калькулятора будет свой.
         """
-        # Получаем все элементы системы
-        elements = self.system.DuctNetwork
+        self.connector_cache = connector_cache or ConnectorDataCache()
+        self.element_names = {}
+        self.cross_tee_params = {}
 
-        # Множество для хранения уникальных номеров секций
-        found_section_indexes = set()
-
-        # Пробуем пройтись по диапазону номеров секций
-        max_possible_sections = 500  # можно увеличить при необходимости
-        for number in range(0, max_possible_sections):
-            try:
-                section = self.system.GetSectionByIndex(number)
-            except:
-                section = None
-            # Если нужной секции уже нет в текущей системе, а вариант еще остаются - вылетит ошибка.
-            # Сразу в эксепт break включить не получится, ревит будет вылетать без отчета
-            if section is None:
-                break
-            found_section_indexes.add(number)
+    def set_network(self, network):
+        """
+        Задает снимок сети, с которым работает калькулятор. Сбрасывает все, что было запомнено по прошлой сети.
 
-        return sorted(found_section_indexes)
+        Args:
+            network (DuctNetworkSnapshot): Снимок сети воздуховодов
+        """
+        self.network = network
+        self.connector_cache.set_network(network)
+        self.system_is_supply = network.is_supply
+        self.sections = network.sections
+        self.critical_path_numbers = network.critical_path_numbers
+        self.critical_path_positions = network.get_critical_path_positions()
+        self.element_names = {}
+        self.cross_tee_params = {}
+
+    def get_element(self, element_id):
+        """
+        Возвращает элемент снимка сети по Id.
 
-    def _is_rectangular_connector(self, connector):
-        return connector.Shape == ConnectorProfileType.Rectangular
+        Args:
+            element_id (int): Id элемента
+        Returns:
+            ElementSnapshot
+        """
+        return self.network.get_element(element_id)
 
-    def _is_rectangular_connector_data(self, connector_data):
-        return connector_data.connector_element.Shape == ConnectorProfileType.Rectangular
+    def load_lookup_tables(self, file_path):
+        """
+        Загружает табличные КМС из JSON файла вместо встроенных.
 
-    def _is_rectangular_element(self, element):
-        connectors = self.get_connectors(element)
-        return connectors[0].Shape == ConnectorProfileType.Rectangular
+        Args:
+            file_path (str): Путь к файлу таблиц
+        """
+        self.lookup_tables = CoefficientTables.load_tables(file_path)
 
-    def get_critical_path(self, system):
+    def lookup_coefficient(self, table_name, *keys):
         """
-        Получает критический путь системы.
+        Ищет КМС в таблице.
 
         Args:
-            system: Система воздуховодов
+            table_name (str): Имя таблицы
+            keys: Величины для поиска, по одной на уровень таблицы
+        Returns:
+            float: КМС или None, если значение не нашлось
         """
-        self.system = system
+        return self.lookup_tables[table_name].lookup(keys, self.interpolate_tables)
 
-        path_numbers = system.GetCriticalPathSectionNumbers()
-        self.critical_path_numbers = list(path_numbers)
+    def is_on_critical_path(self, element_id):
+        """
+        Проверяет, входит ли элемент хотя бы в одну секцию критического пути.
 
-        self.system_is_supply = system.SystemType == DuctSystemType.SupplyAir
+        Args:
+            element_id: Id элемента
+        Returns:
+            True или False
+        """
+        return element_id in self.critical_path_positions
 
-        if self.system_is_supply:
-            self.critical_path_numbers.reverse()
+    def get_first_on_critical_path(self, *element_ids):
+        """
+        Определяет, какой из элементов раньше всех встречается на критическом пути по ходу движения воздуха. Если
+        элементы входят в одну и ту же секцию - побеждает переданный раньше.
 
-        self.section_indexes = self.__get_all_sections_in_system()
+        Args:
+            element_ids: Id элементов
+        Returns:
+            int: Порядковый номер элемента среди переданных или None, если ни один не лежит на критическом пути
+        """
+        first_index = None
+        first_position = None
+        for index, element_id in enumerate(element_ids):
+            position = self.critical_path_positions.get(element_id)
+            if position is not None and (first_position is None or position < first_position):
+                first_index = index
+                first_position = position
+        return first_index
 
     def is_rectangular(self, element):
         """
         Возвращает True, если элемент прямоугольный.
 
         Args:
-            element: Элемент системы воздуховодов
+            element: Элемент системы воздуховодов, его коннектор или ConnectorData
         Returns:
             True или False
         """
-        if isinstance(element, Connector):
-            return self._is_rectangular_connector(element)
-        elif isinstance(element, ConnectorData):
-            return self._is_rectangular_connector_data(element)
-        else:
-            return self._is_rectangular_element(element)
+        if isinstance(element, ElementSnapshot):
+            element = self.get_connectors(element)[0]
+        return element.shape == SHAPE_RECTANGULAR
 
     def get_element_area(self, element):
         """
@@ -213,76 +248,33 @@ class AerodinamicCoefficientCalculator(object):
         Returns:
             float: Площадь в м2
         """
-        def get_connector_area(connector):
-            area = None
-
-            if connector.Shape == ConnectorProfileType.Round:
-                radius = UnitUtils.ConvertFromInternalUnits(connector.Radius, UnitTypeId.Millimeters)
-                area = math.pi * ((radius / 1000) ** 2)
-            elif connector.Shape == ConnectorProfileType.Rectangular:
-                height = UnitUtils.ConvertFromInternalUnits(connector.Height, UnitTypeId.Millimeters)
-                width = UnitUtils.ConvertFromInternalUnits(connector.Width, UnitTypeId.Millimeters)
-                area = height / 1000 * width / 1000
-
-            return area
-
-        if isinstance(element, ConnectorData):
+        if isinstance(element, (ConnectorData, ConnectorSnapshot)):
             return element.area
 
-        if isinstance(element, Connector):
-            area = get_connector_area(element)
-            return area
-
-        else:
-            connector_areas = []
-            connectors = self.get_connectors(element)
+        connectors = self.get_connectors(element)
 
-            # Фильтруем только HVAC-коннекторы
-            hvac_connectors = [conn for conn in connectors if conn.Domain == Domain.DomainHvac]
+        # Фильтруем только HVAC-коннекторы
+        hvac_connectors = [conn for conn in connectors if conn.is_hvac]
 
-            if not hvac_connectors:
-                forms.alert(
-                    "Не удалось определить площадь одного из элементов. ID: " + str(element.Id),
-                    "Ошибка",
-                    exitscript=True
-                )
+        if not hvac_connectors:
+            raise CalculationError("Не удалось определить площадь одного из элементов. ID: " + str(element.id))
 
-            connector_areas = [get_connector_area(conn) for conn in hvac_connectors]
-            min_area = min(connector_areas)
-            return min_area
+        connector_areas = [conn.area for conn in hvac_connectors]
+        min_area = min(connector_areas)
+        return min_area
 
     def get_connectors(self, element):
         """
         Получает коннекторы элемента. Если элемент воздуховод получит только его коннекторы, врезки будут игнорироваться.
         """
-        connectors = []
-
-        if isinstance(element, FamilyInstance) and element.MEPModel.ConnectorManager is not None:
-            connectors.extend(element.MEPModel.ConnectorManager.Connectors)
-
-        if element.InAnyCategory([BuiltInCategory.OST_DuctCurves,
-                                  BuiltInCategory.OST_PipeCurves,
-                                  BuiltInCategory.OST_FlexDuctCurves]) and \
-                isinstance(element, MEPCurve) and element.ConnectorManager is not None:
-
-            # Если это воздуховод — фильтруем только не Curve-коннекторы. Это завязано на врезки которые тоже падают в список
-            # но с нулевым расходом и двунаправленным потоком
-            if element.Category.IsId(BuiltInCategory.OST_DuctCurves):
-                for conn in element.ConnectorManager.Connectors:
-                    if conn.ConnectorType != ConnectorType.Curve:
-                        connectors.append(conn)
-            else:
-                # Для других категорий (трубы и гибкие воздуховоды) — добавляем все
-                connectors.extend(element.ConnectorManager.Connectors)
-
-        return connectors
+        return element.get_connectors()
 
     def remember_element_name(self, element, base_name, connector_data_elements, length=None, angle=None):
         """
         Сохраняет название элемента с учетом его размеров и угла.
 
         Args:
-            element (Element): Элемент.
+            element (ElementSnapshot): Элемент.
             base_name (str): Базовое название.
             connector_data_elements (list): Данные коннекторов.
             length (float, optional): Длина.
@@ -316,22 +308,18 @@ class AerodinamicCoefficientCalculator(object):
             base_name += ' {0}°'.format(angle_value)
 
 
-        self.element_names[element.Id] = base_name + ' ' + size
+        self.element_names[element.id] = base_name + ' ' + size
 
     def get_connector_data_instances(self, element):
         """
         Получает экземпляры ConnectorData для элемента.
 
         Args:
-            element: Element у которого ищутся коннекторы
+            element: Элемент у которого ищутся коннекторы
         Returns:
-            Список коннекторов
+            Список коннекторов. Список общий для всех вызовов в рамках расчета сети, изменять его нельзя.
         """
-        connectors = self.get_connectors(element)
-        connector_data_instances = []
-        for connector in connectors:
-            connector_data_instances.append(ConnectorData(connector))
-        return connector_data_instances
+        return self.connector_cache.get_connector_data_instances(element)
 
     def find_input_output_connector(self, element):
         """
@@ -346,14 +334,14 @@ class AerodinamicCoefficientCalculator(object):
         connector_data_instances = self.get_connector_data_instances(element)
 
         # Для поиска входа-выхода нужны два коннектора, у решеток он один
-        if element.Category.IsId(BuiltInCategory.OST_DuctTerminal):
+        if element.category == CATEGORY_TERMINAL:
             return connector_data_instances[0], connector_data_instances[0]
 
         input_connector = None  # Первый на пути следования воздуха коннектор
         output_connector = None  # Второй на пути следования воздуха коннектор
 
-        if element.Category.IsId(BuiltInCategory.OST_DuctCurves):
-            if self.system.SystemType == DuctSystemType.SupplyAir:
+        if element.category == CATEGORY_DUCT:
+            if self.system_is_supply:
                 input_connector = max(connector_data_instances, key=lambda c: c.flow)
                 output_connector = min(connector_data_instances, key=lambda c: c.flow)
             else:
@@ -362,59 +350,64 @@ class AerodinamicCoefficientCalculator(object):
 
             return input_connector, output_connector
 
-        # Поиск по критическому пути в системе
-        passed_elements = []
-        for number in self.critical_path_numbers:
-            section = self.system.GetSectionByNumber(number)
-            elements_ids = section.GetElementIds()
-
-            for connector_data in connector_data_instances:
-                if connector_data.connected_element is None:
-                    continue
-
-                if (connector_data.connected_element.Id in elements_ids and
-                        connector_data.connected_element.Id not in passed_elements):
-                    passed_elements.append(connector_data.connected_element.Id)
-
-                    if input_connector is None and connector_data.direction == FlowDirectionType.In:
-                        input_connector = connector_data
-                    else:
-                        output_connector = connector_data
-
-            if input_connector is not None and output_connector is not None:
-                break  # Нет смысла продолжать перебор сегментов, если нужный тройник уже обработан
+        # Поиск по критическому пути в системе. Коннекторы перебираются в порядке появления подключенных к ним
+        # элементов на критическом пути, при равенстве - в порядке коннекторов. Каждый подключенный элемент
+        # учитывается один раз
+        candidates = []
+        for order, connector_data in enumerate(connector_data_instances):
+            if connector_data.connected_element is None:
+                continue
+            position = self.critical_path_positions.get(connector_data.connected_element.id)
+            if position is not None:
+                candidates.append((position, order, connector_data))
+        candidates.sort(key=lambda candidate: candidate[:2])
+
+        passed_elements = set()
+        current_position = None
+        for position, order, connector_data in candidates:
+            if position != current_position:
+                if input_connector is not None and output_connector is not None:
+                    break  # Нет смысла продолжать перебор сегментов, если нужный тройник уже обработан
+                current_position = position
+
+            if connector_data.connected_element.id in passed_elements:
+                continue
+            passed_elements.add(connector_data.connected_element.id)
+
+            if input_connector is None and connector_data.direction == DIRECTION_IN:
+                input_connector = connector_data
+            else:
+                output_connector = connector_data
 
         # Для элементов которые не найдены на критическом пути все равно нужно проверить КМС. Проверяем ориентировочно,
         # по направлением коннекторов
+        is_exhaust_or_return = self.network.system_type in [SYSTEM_EXHAUST_AIR, SYSTEM_RETURN_AIR]
         flow_connectors = []  # Коннекторы, которые участвуют в поиске max flow
         if input_connector is None or output_connector is None:
             for connector_data in connector_data_instances:
-                if self.system.SystemType == DuctSystemType.SupplyAir:
-                    if connector_data.direction == FlowDirectionType.In:
+                if self.system_is_supply:
+                    if connector_data.direction == DIRECTION_IN:
                         input_connector = connector_data
                     else:
                         # Добавляем все Out, чтоб потом выбрать с максимальным расходом
                         flow_connectors.append(connector_data)
 
-                if self.system.SystemType == DuctSystemType.ExhaustAir or self.system.SystemType == DuctSystemType.ReturnAir:
-                    if connector_data.direction == FlowDirectionType.Out:
+                if is_exhaust_or_return:
+                    if connector_data.direction == DIRECTION_OUT:
                         output_connector = connector_data
                     else:
                         # Добавляем все In, чтоб потом выбрать с максимальным расходом
                         flow_connectors.append(connector_data)
 
             # Если мы ищем output для SupplyAir, выбираем коннектор с максимальным flow
-            if self.system.SystemType == DuctSystemType.SupplyAir:
+            if self.system_is_supply:
                 output_connector = max(flow_connectors, key=lambda c: c.flow)
             # Если мы ищем input для ExhaustAir/ReturnAir, выбираем коннектор с максимальным flow
-            elif self.system.SystemType in [DuctSystemType.ExhaustAir, DuctSystemType.ReturnAir]:
+            elif is_exhaust_or_return:
                 input_connector = max(flow_connectors, key=lambda c: c.flow)
 
         if input_connector is None or output_connector is None:
-            forms.alert(
-                "Не найден вход-выход в элемент. " + str(element.Id),
-                "Ошибка",
-                exitscript=True)
+            raise CalculationError("Не найден вход-выход в элемент. " + str(element.id))
 
         return input_connector, output_connector
 
@@ -431,20 +424,9 @@ class AerodinamicCoefficientCalculator(object):
 
         flows = []
 
-        if element.Category.IsId(BuiltInCategory.OST_DuctTerminal) and return_terminal_flow:
-            flow = element.GetParamValue(BuiltInParameter.RBS_DUCT_FLOW_PARAM)
-            flow = UnitUtils.ConvertFromInternalUnits(flow, UnitTypeId.CubicMetersPerHour)
-            return [flow]
-
-        for section_index in self.section_indexes:
-            section = self.system.GetSectionByIndex(section_index)
-            section_elements = section.GetElementIds()
+        if element.category == CATEGORY_TERMINAL and return_terminal_flow:
+            return [element.flow]
 
-            if element.Id in section_elements:
-                flow = UnitUtils.ConvertFromInternalUnits(section.Flow, UnitTypeId.CubicMetersPerHour)
-                flows.append(flow)
+        flows.extend(self.sections.get_element_flows(element.id))
 
         return flows
-
-
-
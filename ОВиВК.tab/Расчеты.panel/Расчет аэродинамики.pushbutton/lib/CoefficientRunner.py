@@ -0,0 +1,219 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+import CrossTeeCalculator
+import TransitionElbowCalculator
+from DuctNetworkSnapshot import *
+
+
+class CoefficientRecord:
+    """Результат расчета КМС элемента со всем, что нужно для отчета."""
+
+    def __init__(self,
+                 coefficient,
+                 transition_elbow_name=None,
+                 cross_tee_name=None,
+                 characteristic=None,
+                 terminal_flow=None,
+                 terminal_size=None,
+                 tap_partner_id=None):
+        """
+        Инициализация объекта CoefficientRecord.
+
+        Args:
+            coefficient (float): КМС.
+            transition_elbow_name (str): Название из калькулятора переходов и отводов.
+            cross_tee_name (str): Название из калькулятора тройников и крестовин.
+            characteristic (MulticonElementCharacteristic): Характеристики тройника или крестовины.
+            terminal_flow (float): Расход в воздуховоде у бокового отверстия.
+            terminal_size (float): Площадь воздуховода у бокового отверстия.
+            tap_partner_id (int): Id врезки-партнера, переданной в фильтр парных врезок.
+        """
+        self.coefficient = coefficient
+        self.transition_elbow_name = transition_elbow_name
+        self.cross_tee_name = cross_tee_name
+        self.characteristic = characteristic
+        self.terminal_flow = terminal_flow
+        self.terminal_size = terminal_size
+        self.tap_partner_id = tap_partner_id
+
+
+class CoefficientRunner:
+    """
+    Пара калькуляторов, которая считает КМС элементов одной сети. У каждого потока свой экземпляр, потому что
+    калькуляторы запоминают промежуточные данные по элементам.
+    """
+
+    def __init__(self, cross_tee_calculator, transition_elbow_calculator):
+        """
+        Инициализация объекта CoefficientRunner.
+
+        Args:
+            cross_tee_calculator (CrossTeeCoefficientCalculator): Калькулятор тройников и крестовин.
+            transition_elbow_calculator (TransitionElbowCoefficientCalculator): Калькулятор переходов и отводов.
+        """
+        self.cross_tee_calculator = cross_tee_calculator
+        self.transition_elbow_calculator = transition_elbow_calculator
+
+    @classmethod
+    def create(cls, network, connector_cache, template=None):
+        """
+        Создает пару новых калькуляторов для сети.
+
+        Args:
+            network (DuctNetworkSnapshot): Снимок сети.
+            connector_cache (ConnectorDataCache): Общий кэш коннекторов, заранее заполненный для сети.
+            template (CoefficientRunner): Пара, с которой копируются таблицы КМС и режим интерполяции.
+        Returns:
+            CoefficientRunner
+        """
+        runner = cls(CrossTeeCalculator.CrossTeeCoefficientCalculator(connector_cache),
+                     TransitionElbowCalculator.TransitionElbowCoefficientCalculator(connector_cache))
+        if template is not None:
+            for calculator, template_calculator in [
+                    (runner.cross_tee_calculator, template.cross_tee_calculator),
+                    (runner.transition_elbow_calculator, template.transition_elbow_calculator)]:
+                calculator.lookup_tables = template_calculator.lookup_tables
+                calculator.interpolate_tables = template_calculator.interpolate_tables
+
+        runner.cross_tee_calculator.set_network(network)
+        runner.transition_elbow_calculator.set_network(network)
+        return runner
+
+    def calculate(self, element):
+        """
+        Высчитывает локальный коэффициент для фитинга.
+
+        Args:
+            element (ElementSnapshot): Фитинг или воздухораспределитель из снимка сети.
+
+        Returns:
+            float: Локальный коэффициент.
+        """
+        cross_tee_calculator = self.cross_tee_calculator
+        transition_elbow_calculator = self.transition_elbow_calculator
+
+        if element.category == CATEGORY_TERMINAL:
+            return cross_tee_calculator.get_side_hole_coefficient(element)
+
+        part_type = element.part_type
+        if part_type == PART_TYPE_ELBOW:
+            local_section_coefficient = transition_elbow_calculator.get_elbow_coefficient(element)
+        elif part_type == PART_TYPE_TRANSITION:
+            local_section_coefficient = transition_elbow_calculator.get_transition_coefficient(element)
+        elif part_type == PART_TYPE_TEE:
+            local_section_coefficient = cross_tee_calculator.get_tee_coefficient(element)
+        elif part_type == PART_TYPE_TAP:
+            has_partner = cross_tee_calculator.get_tap_partner_if_exists(element)
+
+            if has_partner:
+                fitting_2, duct_element = has_partner
+
+                if transition_elbow_calculator.is_tap_elbow(element) or \
+                        transition_elbow_calculator.is_tap_elbow(fitting_2):
+                    local_section_coefficient = cross_tee_calculator.get_double_tap_tee_coefficient(element,
+                                                                                                    fitting_2,
+                                                                                                    duct_element)
+                else:
+                    local_section_coefficient = cross_tee_calculator.get_tap_cross_coefficient(element,
+                                                                                               fitting_2,
+                                                                                               duct_element)
+            elif transition_elbow_calculator.is_tap_elbow(element):
+                local_section_coefficient = transition_elbow_calculator.get_tap_elbow_coefficient(element)
+            else:
+                local_section_coefficient = cross_tee_calculator.get_tap_tee_coefficient(element)
+        elif part_type == PART_TYPE_CROSS:
+            local_section_coefficient = cross_tee_calculator.get_cross_coefficient(element)
+        else:
+            local_section_coefficient = 0
+
+        return local_section_coefficient
+
+    def create_record(self, element, coefficient):
+        """
+        Собирает результат расчета элемента из состояния калькуляторов.
+
+        Args:
+            element (ElementSnapshot): Фитинг или воздухораспределитель из снимка сети.
+            coefficient (float): Рассчитанный КМС.
+
+        Returns:
+            CoefficientRecord
+        """
+        cross_tee_calculator = self.cross_tee_calculator
+        return CoefficientRecord(
+            coefficient,
+            transition_elbow_name=self.transition_elbow_calculator.element_names.get(element.id),
+            cross_tee_name=cross_tee_calculator.element_names.get(element.id),
+            characteristic=cross_tee_calculator.cross_tee_params.get(element.id),
+            terminal_flow=cross_tee_calculator.duct_terminals_flows.get(element.id),
+            terminal_size=cross_tee_calculator.duct_terminals_sizes.get(element.id),
+            tap_partner_id=cross_tee_calculator.tap_partners.get(element.id))
+
+    def calculate_record(self, element):
+        """
+        Высчитывает КМС элемента и возвращает его вместе с данными для отчета.
+
+        Args:
+            element (ElementSnapshot): Фитинг или воздухораспределитель из снимка сети.
+
+        Returns:
+            CoefficientRecord
+        """
+        return self.create_record(element, self.calculate(element))
+
+
+def calculate_records(network, elements, connector_cache, template=None, workers=1):
+    """
+    Считает КМС элементов. При workers > 1 элементы делятся на равные части и считаются в отдельных потоках,
+    у каждого потока своя пара калькуляторов. Кэш коннекторов заполняется заранее и дальше только читается.
+
+    Результаты зависят только от снимка сети, поэтому совпадают с последовательным расчетом. Зависящий от
+    порядка фильтр парных врезок восстанавливается потом по записям в исходном порядке.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+        elements (list): Элементы снимка, КМС которых нужно посчитать.
+        connector_cache (ConnectorDataCache): Общий кэш коннекторов.
+        template (CoefficientRunner): Пара, с которой копируются таблицы КМС и режим интерполяции.
+        workers (int): Количество потоков. 1 - последовательный расчет в текущем потоке.
+
+    Returns:
+        list: CoefficientRecord в порядке elements.
+    """
+    connector_cache.set_network(network)
+    connector_cache.warm_up()
+    network.get_critical_path_positions()
+
+    workers = max(1, min(workers, len(elements)))
+    if workers == 1:
+        runner = CoefficientRunner.create(network, connector_cache, template)
+        return [runner.calculate_record(element) for element in elements]
+
+    records = [None] * len(elements)
+    errors = []
+    chunk_size = (len(elements) + workers - 1) // workers
+
+    def calculate_chunk(start):
+        runner = CoefficientRunner.create(network, connector_cache, template)
+        for index in range(start, min(start + chunk_size, len(elements))):
+            try:
+                records[index] = runner.calculate_record(elements[index])
+            except Exception as error:
+                errors.append((index, error))
+                return
+
+    threads = [threading.Thread(target=calculate_chunk, args=(start,))
+               for start in range(0, len(elements), chunk_size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Отдаем ту же ошибку, что и последовательный расчет - по первому в порядке элементу
+    if errors:
+        raise min(errors, key=lambda item: item[0])[1]
+
+    return records
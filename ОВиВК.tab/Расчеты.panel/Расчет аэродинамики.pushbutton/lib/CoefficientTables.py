@@ -0,0 +1,177 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+import codecs
+import json
+
+INFINITY = float('inf')
+
+
+class StepTable(object):
+    """
+    Ступенчатая таблица КМС. Значение берется из первой строки, граница которой не меньше искомой величины.
+    Значением строки может быть число или вложенная таблица по следующей величине.
+
+    Если во вложенной таблице значение не нашлось, поиск продолжается со следующей строки, если не нашлось
+    ни в одной строке - возвращается default.
+    """
+
+    def __init__(self, limits, values, default=None):
+        """
+        Инициализация объекта StepTable.
+
+        Args:
+            limits (list): Верхние границы строк по возрастанию.
+            values (list): Значения строк - числа или StepTable.
+            default: Значение, если величина больше всех границ или не является числом.
+        """
+        if len(limits) != len(values):
+            raise ValueError("Количество границ и значений таблицы не совпадает")
+        if any(limits[i] > limits[i + 1] for i in range(len(limits) - 1)):
+            raise ValueError("Границы таблицы должны идти по возрастанию")
+
+        self.limits = list(limits)
+        self.values = list(values)
+        self.default = default
+
+    def lookup(self, keys, interpolate=False):
+        """
+        Ищет значение в таблице.
+
+        Args:
+            keys (tuple): Искомые величины, по одной на каждый уровень вложенности.
+            interpolate (bool): Линейно интерполировать между соседними границами вместо ступенчатого выбора.
+                Последняя строка с бесконечной границей не интерполируется.
+        Returns:
+            float: Значение или None
+        """
+        key = keys[0]
+        rest = keys[1:]
+
+        # NaN не попадает ни в одну строку
+        if key != key:
+            return self.__resolve(self.default, rest, interpolate)
+
+        index = bisect.bisect_left(self.limits, key)
+        for row in range(index, len(self.limits)):
+            value = self.__resolve(self.values[row], rest, interpolate)
+            if value is None:
+                continue
+
+            if interpolate and row == index and row > 0 and self.limits[row] != INFINITY:
+                previous = self.__resolve(self.values[row - 1], rest, interpolate)
+                if previous is not None:
+                    low, high = self.limits[row - 1], self.limits[row]
+                    value = previous + (value - previous) * (key - low) / float(high - low)
+            return value
+
+        return self.__resolve(self.default, rest, interpolate)
+
+    @staticmethod
+    def __resolve(value, rest, interpolate):
+        if isinstance(value, StepTable):
+            return value.lookup(rest, interpolate)
+        return value
+
+    def to_dict(self):
+        def convert(value):
+            if isinstance(value, StepTable):
+                return value.to_dict()
+            return value
+
+        return {
+            'limits': ['inf' if limit == INFINITY else limit for limit in self.limits],
+            'values': [convert(value) for value in self.values],
+            'default': convert(self.default)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        def convert(value):
+            if isinstance(value, dict):
+                return cls.from_dict(value)
+            return value
+
+        limits = [INFINITY if limit == 'inf' else float(limit) for limit in data['limits']]
+        return cls(limits,
+                   [convert(value) for value in data['values']],
+                   convert(data.get('default')))
+
+
+def build_table(rows, default=None):
+    """
+    Собирает таблицу из списка пар (граница, значение). Значение может быть списком пар - тогда из него
+    собирается вложенная таблица.
+
+    Args:
+        rows (list): Пары (граница, значение).
+        default: Значение, если величина больше всех границ.
+    Returns:
+        StepTable
+    """
+    limits = []
+    values = []
+    for limit, value in rows:
+        limits.append(limit)
+        values.append(build_table(value) if isinstance(value, list) else value)
+    return StepTable(limits, values, default)
+
+
+# Конфузор: по отношению длины к диаметру, затем по углу сужения
+CONFUSER_TABLE = build_table([
+    (0.1, [(10, 0.41), (20, 0.34), (30, 0.27), (180, 0.24)]),
+    (0.15, [(10, 0.39), (20, 0.29), (30, 0.22), (180, 0.18)]),
+    (INFINITY, [(10, 0.29), (20, 0.20), (30, 0.15), (180, 0.13)])
+])
+
+# Диффузор круглый: по отношению площадей, затем по углу расширения
+DIFFUSER_ROUND_TABLE = build_table([
+    (0.2, list(zip([16, 24, 30, 180], [0.19, 0.32, 0.43, 0.61]))),
+    (0.25, list(zip([16, 24, 30, 180], [0.17, 0.28, 0.37, 0.49]))),
+    (0.4, list(zip([16, 24, 30, 180], [0.12, 0.19, 0.25, 0.35]))),
+    (INFINITY, list(zip([16, 24, 30, 180], [0.07, 0.1, 0.12, 0.17])))
+])
+
+# Диффузор прямоугольный: по отношению площадей, затем по углу расширения
+DIFFUSER_RECT_TABLE = build_table([
+    (0.2, list(zip([20, 24, 32, 180], [0.31, 0.4, 0.59, 0.69]))),
+    (0.25, list(zip([20, 24, 32, 180], [0.27, 0.35, 0.52, 0.61]))),
+    (0.4, list(zip([20, 24, 32, 180], [0.18, 0.23, 0.34, 0.4]))),
+    (INFINITY, list(zip([20, 24, 32, 180], [0.09, 0.11, 0.16, 0.19])))
+])
+
+# Боковое отверстие: по отношению площадей отверстия и воздуховода, затем по отношению расходов.
+# Все, что больше 0.4 по площади (и не число), попадает в последнюю строку
+SIDE_HOLE_TABLE = build_table([
+    (0.1, [(0.1, 0.1), (0.2, -0.1), (0.3, -0.8), (0.4, -2.6), (INFINITY, -6.6)]),
+    (0.2, [(0.1, 0.1), (0.2, 0.2), (0.3, -0.01), (0.4, -0.6), (INFINITY, -2.1)]),
+    (0.4, [(0.1, 0.2), (0.2, 0.3), (0.3, 0.3), (0.4, 0.2), (INFINITY, -0.2)])
+], default=build_table([(0.1, 0.2), (0.2, 0.3), (0.3, 0.4), (0.4, 0.4), (INFINITY, 0.3)]))
+
+DEFAULT_TABLES = {
+    'confuser': CONFUSER_TABLE,
+    'diffuser_round': DIFFUSER_ROUND_TABLE,
+    'diffuser_rect': DIFFUSER_RECT_TABLE,
+    'side_hole': SIDE_HOLE_TABLE
+}
+
+
+def load_tables(file_path):
+    """
+    Загружает таблицы КМС из JSON файла. Таблицы, которых нет в файле, берутся по умолчанию.
+
+    Args:
+        file_path (str): Путь к файлу вида {"confuser": {"limits": [...], "values": [...], "default": ...}, ...}
+    Returns:
+        dict: {Имя таблицы: StepTable}
+    """
+    with codecs.open(file_path, 'r', encoding='utf-8') as json_file:
+        data = json.load(json_file)
+
+    tables = dict(DEFAULT_TABLES)
+    for name, table_data in data.items():
+        if name not in DEFAULT_TABLES:
+            raise ValueError("Неизвестная таблица КМС: " + name)
+        tables[name] = StepTable.from_dict(table_data)
+    return tables
@@ -1,72 +1,72 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import clr
-
-clr.AddReference("RevitAPI")
-clr.AddReference("RevitAPIUI")
-clr.AddReference("dosymep.Revit.dll")
-clr.AddReference("dosymep.Bim4Everyone.dll")
-import dosymep
-import CalculatorClassLib
-
-clr.ImportExtensions(dosymep.Revit)
-clr.ImportExtensions(dosymep.Bim4Everyone)
-
-import sys
-import System
 import math
-from pyrevit import forms
-from Autodesk.Revit.DB import *
-from Autodesk.Revit.UI import TaskDialog
-from Autodesk.Revit.UI.Selection import ObjectType
-from Autodesk.Revit.DB.ExternalService import *
-from Autodesk.Revit.DB.ExtensibleStorage import *
-from Autodesk.Revit.UI.Selection import ObjectType, ISelectionFilter, Selection
-from System.Collections.Generic import List
-from System import Guid
-from pyrevit import revit
-from collections import namedtuple
-from Autodesk.Revit.DB.ExternalService import *
-from Autodesk.Revit.DB.ExtensibleStorage import *
-from Autodesk.Revit.DB.Mechanical import *
-from dosymep.Bim4Everyone.Templates import ProjectParameters
-from dosymep.Bim4Everyone.SharedParams import SharedParamsConfig
-
+import CalculatorClassLib
+import CrossTeeFormulas
+from DuctNetworkSnapshot import *
 
 
 class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCalculator):
-    TEE_SUPPLY_PASS_NAME = 'Тройник на проход нагнетание круглый/прямоугольный'
-    TEE_SUPPLY_BRANCH_ROUND_NAME = 'Тройник нагнетание ответвление круглый'
-    TEE_SUPPLY_BRANCH_RECT_NAME = 'Тройник нагнетание ответвление прямоугольный'
-    TEE_SUPPLY_SEPARATION_NAME = 'Тройник симметричный разделение потока нагнетание'
-    TEE_EXHAUST_PASS_ROUND_NAME = 'Тройник всасывание на проход круглый'
-    TEE_EXHAUST_PASS_RECT_NAME = 'Тройник всасывание на проход прямоугольный'
-    TEE_EXHAUST_BRANCH_ROUND_NAME = 'Тройник всасывание ответвление круглый'
-    TEE_EXHAUST_BRANCH_RECT_NAME = 'Тройник всасывание ответвление прямоугольный'
-    TEE_EXHAUST_MERGER_NAME = 'Тройник симметричный слияние'
+    TEE_SUPPLY_PASS_NAME = CrossTeeFormulas.TEE_SUPPLY_PASS_NAME
+    TEE_SUPPLY_BRANCH_ROUND_NAME = CrossTeeFormulas.TEE_SUPPLY_BRANCH_ROUND_NAME
+    TEE_SUPPLY_BRANCH_RECT_NAME = CrossTeeFormulas.TEE_SUPPLY_BRANCH_RECT_NAME
+    TEE_SUPPLY_SEPARATION_NAME = CrossTeeFormulas.TEE_SUPPLY_SEPARATION_NAME
+    TEE_EXHAUST_PASS_ROUND_NAME = CrossTeeFormulas.TEE_EXHAUST_PASS_ROUND_NAME
+    TEE_EXHAUST_PASS_RECT_NAME = CrossTeeFormulas.TEE_EXHAUST_PASS_RECT_NAME
+    TEE_EXHAUST_BRANCH_ROUND_NAME = CrossTeeFormulas.TEE_EXHAUST_BRANCH_ROUND_NAME
+    TEE_EXHAUST_BRANCH_RECT_NAME = CrossTeeFormulas.TEE_EXHAUST_BRANCH_RECT_NAME
+    TEE_EXHAUST_MERGER_NAME = CrossTeeFormulas.TEE_EXHAUST_MERGER_NAME
 
 
-    CROSS_SUPPLY_PASS_RECT_NAME = 'Крестовина на нагнетании проход прямоугольная'
-    CROSS_SUPPLY_BRANCH_RECT_NAME = 'Крестовина на нагнетании ответвление прямоугольная'
+    CROSS_SUPPLY_PASS_RECT_NAME = CrossTeeFormulas.CROSS_SUPPLY_PASS_RECT_NAME
+    CROSS_SUPPLY_BRANCH_RECT_NAME = CrossTeeFormulas.CROSS_SUPPLY_BRANCH_RECT_NAME
 
-    CROSS_SUPPLY_PASS_ROUND_NAME = 'Крестовина на нагнетании проход круглая'
-    CROSS_SUPPLY_BRANCH_ROUND_NAME = 'Крестовина на нагнетании ответвление круглая'
+    CROSS_SUPPLY_PASS_ROUND_NAME = CrossTeeFormulas.CROSS_SUPPLY_PASS_ROUND_NAME
+    CROSS_SUPPLY_BRANCH_ROUND_NAME = CrossTeeFormulas.CROSS_SUPPLY_BRANCH_ROUND_NAME
 
-    CROSS_EXHAUST_PASS_RECT_NAME = 'Крестовина на всасывании проход прямоугольная'
-    CROSS_EXHAUST_PASS_ROUND_NAME = 'Крестовина на всасывании проход круглая'
+    CROSS_EXHAUST_PASS_RECT_NAME = CrossTeeFormulas.CROSS_EXHAUST_PASS_RECT_NAME
+    CROSS_EXHAUST_PASS_ROUND_NAME = CrossTeeFormulas.CROSS_EXHAUST_PASS_ROUND_NAME
 
-    CROSS_EXHAUST_BRANCH_RECT_NAME = 'Крестовина на всасывании ответвление прямоугольная'
-    CROSS_EXHAUST_BRANCH_ROUND_NAME = 'Крестовина на всасывании ответвление круглая'
+    CROSS_EXHAUST_BRANCH_RECT_NAME = CrossTeeFormulas.CROSS_EXHAUST_BRANCH_RECT_NAME
+    CROSS_EXHAUST_BRANCH_ROUND_NAME = CrossTeeFormulas.CROSS_EXHAUST_BRANCH_ROUND_NAME
 
     HOLE_NAME = 'Боковое отверстие '
     START_TERMINAL_NAME = 'Воздухораспределитель '
     END_TERMINAL_NAME_SUPPLY = 'Воздухозабор '
     END_TERMINAL_NAME_EXHAUST = 'Выброс '
 
-    tap_crosses_filtered = []
-    duct_terminals_flows = {}
-    duct_terminals_sizes = {}
+    tap_crosses_filtered = None
+    tap_partners = None
+    duct_terminals_flows = None
+    duct_terminals_sizes = None
+
+    def set_network(self, network):
+        """
+        Задает снимок сети и сбрасывает отфильтрованные пары врезок и данные боковых отверстий прошлой сети.
+
+        Args:
+            network (DuctNetworkSnapshot): Снимок сети воздуховодов
+        """
+        super(CrossTeeCoefficientCalculator, self).set_network(network)
+        self.tap_crosses_filtered = []
+        self.tap_partners = {}
+        self.duct_terminals_flows = {}
+        self.duct_terminals_sizes = {}
+
+    def filter_tap_pair(self, element_1_id, element_2_id):
+        """
+        Исключает из отчета вторую врезку пары, если ни одна из врезок пары еще не исключена.
+        Результат зависит от порядка обработки врезок, поэтому при переносе КМС, посчитанных в других потоках,
+        метод нужно вызвать в том же порядке.
+
+        Args:
+            element_1_id (int): Id рассчитываемой врезки
+            element_2_id (int): Id врезки-партнера
+        """
+        self.tap_partners[element_1_id] = element_2_id
+        if element_1_id not in self.tap_crosses_filtered and element_2_id not in self.tap_crosses_filtered:
+            self.tap_crosses_filtered.append(element_2_id)
 
     def __calculate_coefficient(self, tee_type_name, Lo, Lp, Lc, fp, fo, fc):
         """
@@ -84,92 +84,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
         Returns:
             float: Коэффициент тройника.
         """
-        fp_normed = fp / fc  # Нормированная площадь прохода
-        fo_normed = fo / fc  # Нормированная площадь ответвления
-        Lo_normed = Lo / Lc  # Нормированный расход в ответвлении
-        Lp_normed = Lp / Lc  # Нормированный расход в проходе
-
-        vo_normed = Lo_normed / fo_normed
-        vp_normed = Lp_normed / fp_normed
-        fn_sqrt = math.sqrt(fp_normed)
-
-        if tee_type_name in [self.TEE_SUPPLY_PASS_NAME,
-                             self.CROSS_SUPPLY_PASS_RECT_NAME,
-                             self.CROSS_SUPPLY_PASS_ROUND_NAME]:
-            return (0.45 * (fp_normed / (1 - Lo_normed)) ** 2 + (0.6 - 1.7 * fp_normed) * (fp_normed / (1 - Lo_normed))
-                    - (0.25 - 0.9 * fp_normed ** 2) + 0.19 * ((1 - Lo_normed) / fp_normed))
-
-        if tee_type_name in [self.TEE_SUPPLY_BRANCH_ROUND_NAME,
-                             self.CROSS_SUPPLY_BRANCH_ROUND_NAME]:
-            return ((fo_normed / Lo_normed) ** 2
-                    - 0.58 * (fo_normed / Lo_normed) + 0.54
-                    + 0.025 * (Lo_normed / fo_normed))
-
-        if tee_type_name in [self.TEE_SUPPLY_BRANCH_RECT_NAME,
-                             self.CROSS_SUPPLY_BRANCH_RECT_NAME]:
-            return ((fo_normed / Lo_normed) ** 2
-                    - 0.42 * (fo_normed / Lo_normed) + 0.81
-                    - 0.06 * (Lo_normed / fo_normed))
-
-        if tee_type_name == self.TEE_SUPPLY_SEPARATION_NAME:
-            return 1 + 0.3 * ((Lo_normed / fo_normed) ** 2)
-
-        if tee_type_name in [self.TEE_EXHAUST_PASS_ROUND_NAME,
-                             self.CROSS_EXHAUST_PASS_ROUND_NAME]:
-            return (((1 - fn_sqrt) + 0.5 * Lo_normed + 0.05) *
-                    ((1.7 + (1 / (2 * fo_normed) - 1) * Lo_normed - math.sqrt((fp_normed + fo_normed) * Lo_normed))
-                     * ((fp_normed / (1 - Lo_normed)) ** 2)))
-
-        if tee_type_name in [self.TEE_EXHAUST_PASS_RECT_NAME,
-                             self.CROSS_EXHAUST_PASS_RECT_NAME]:
-            return (((1 - fn_sqrt) + 0.5 * Lo_normed + 0.05) *
-                    (1.5 + (1 / (2 * fo_normed) - 1) * Lo_normed - math.sqrt((fp_normed + fo_normed) * Lo_normed))
-                    * ((fp_normed / (1 - Lo_normed)) ** 2))
-
-        if tee_type_name in [self.TEE_EXHAUST_BRANCH_ROUND_NAME,
-                             self.CROSS_EXHAUST_BRANCH_ROUND_NAME]:
-            return ((-0.7 - 6.05 * (1 - fp_normed) ** 3) * (fo_normed / Lo_normed) ** 2
-                    + (1.32 + 3.23 * (1 - fp_normed) ** 2) * (fo_normed / Lo_normed)
-                    + (0.5 + 0.42 * fp_normed) - 0.167 * (Lo_normed / fo_normed))
-
-        if tee_type_name in [self.TEE_EXHAUST_BRANCH_RECT_NAME,
-                             self.CROSS_EXHAUST_BRANCH_RECT_NAME]:
-            return (
-                    (fo_normed / Lo_normed) ** 2) * (4.1 * ((fp_normed / fo_normed) ** 1.25) *
-                                                     (Lo_normed ** 1.5) *
-                                                     ((fp_normed + fo_normed) ** (
-                                                             (0.3 / Lo_normed) * math.sqrt(fo_normed / fp_normed) - 2))
-                                                     - 0.5 * (fp_normed / fo_normed)
-                                                     )
-
-        if tee_type_name == self.TEE_EXHAUST_MERGER_NAME:
-            if fo_normed <= 0.35:
-                result = (
-                        1 * (
-                        1 + (1 / fo_normed) ** 2 +
-                        3 * (1 / fo_normed) ** 2 * (Lo_normed ** 2 - Lo_normed)
-                )
-                )
-            else:
-                if Lo_normed <= 0.4:
-                    result = (
-                            0.9 * (1 - Lo_normed) *
-                            (
-                                    1 + (1 / fo_normed) ** 2 +
-                                    3 * (1 / fo_normed) ** 2 * (Lo_normed ** 2 - Lo_normed)
-                            )
-                    )
-                else:
-                    result = (
-                            0.55 *
-                            (
-                                    1 + (1 / fo_normed) ** 2 +
-                                    3 * (1 / fo_normed) ** 2 * (Lo_normed ** 2 - Lo_normed)
-                            )
-                    )
-            return result
-
-        return None  # Если тип тройника не найден
+        return CrossTeeFormulas.calculate_coefficient(tee_type_name, Lo, Lp, Lc, fo, fp, fc)
 
     def __get_angle_between_connectors(self, element, connector_1, connector_2):
         """
@@ -183,23 +98,23 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             float: Угол в градусах
         """
         # Получаем координаты центров соединений
-        input_origin = connector_1.connector_element.Origin
-        output_origin = connector_2.connector_element.Origin
+        input_origin = connector_1.origin
+        output_origin = connector_2.origin
 
         # Получаем координату точки вставки тройника
-        location = element.Location.Point
+        location = element.location
 
         # Создаем векторы направлений от точки вставки тройника
-        vec_input_location = input_origin - location
-        vec_output_location = output_origin - location
+        vec_input_location = vector_between(location, input_origin)
+        vec_output_location = vector_between(location, output_origin)
 
         # Функция вычисления угла между векторами
         def calculate_angle(vec1, vec2):
-            dot_product = vec1.DotProduct(vec2)
-            norm1 = vec1.GetLength()
-            norm2 = vec2.GetLength()
+            dot = dot_product(vec1, vec2)
+            norm1 = vector_length(vec1)
+            norm2 = vector_length(vec2)
 
-            cosine = dot_product / (norm1 * norm2)
+            cosine = dot / (norm1 * norm2)
             # Защита от выхода за границы из-за округления
             cosine = max(-1.0, min(1.0, cosine))
 
@@ -227,9 +142,9 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
         """
 
         def angle_between_vectors(v1, v2):
-            dot = v1.DotProduct(v2)
-            len1 = v1.GetLength()
-            len2 = v2.GetLength()
+            dot = dot_product(v1, v2)
+            len1 = vector_length(v1)
+            len2 = vector_length(v2)
             if len1 == 0 or len2 == 0:
                 return None
             cos_theta = dot / (len1 * len2)
@@ -241,9 +156,9 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             if len(duct_connectors) != 2:
                 return None  # Нужно ровно 2 точки
 
-            base_vec = duct_connectors[1].Origin - duct_connectors[0].Origin
+            base_vec = vector_between(duct_connectors[0].origin, duct_connectors[1].origin)
 
-            vec = con_xyz - tap_xyz
+            vec = vector_between(tap_xyz, con_xyz)
             angle_rad = angle_between_vectors(vec, base_vec)
             if angle_rad is None:
                 return None
@@ -257,7 +172,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
         input_element = input_connector.connected_element
         output_element = output_connector.connected_element
 
-        if self.system.SystemType == DuctSystemType.SupplyAir:
+        if self.system_is_supply:
             tap_to_duct_connector = input_connector
             duct_element = input_element
         else:
@@ -265,20 +180,20 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             duct_element = output_element
 
         duct_connectors = self.get_connectors(duct_element)
-        tap_xyz = tap_to_duct_connector.connector_element.Origin
+        tap_xyz = tap_to_duct_connector.origin
 
-        for connector in duct_element.ConnectorManager.Connectors:
-            con_xyz = connector.Origin
-            connector_set = connector.AllRefs
+        # Перебираем все коннекторы воздуховода, включая врезки
+        for connector in duct_element.connectors:
+            con_xyz = connector.origin
             skip_connector = False  # флаг
 
             owner = None
-            for ref_connector in connector_set:
-                if ref_connector.Owner.Id == element.Id:
+            for ref_owner_id in connector.ref_owner_ids:
+                if ref_owner_id == element.id:
                     skip_connector = True
                     break  # прерываем внутренний цикл
 
-                owner = ref_connector.Owner
+                owner = self.get_element(ref_owner_id)
 
             if skip_connector:
                 continue  # переходим к следующему connector
@@ -336,7 +251,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             output_element_2 = output_connector_2.connected_element
 
 
-            if self.system.SystemType != DuctSystemType.SupplyAir:
+            if not self.system_is_supply:
                 duct = output_element_1
                 branch_duct_1 = input_element_1
                 branch_duct_2 = input_element_2
@@ -360,17 +275,9 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             Lp = 0 # Для подобных тройников проход не имеет значения, это всегда разветвление или слияние
 
 
-            branch_1_critical = False
-            branch_2_critical = False
-            for number in self.critical_path_numbers:
-                section = self.system.GetSectionByNumber(number)
-                elements_ids = section.GetElementIds()
-                if branch_duct_1.Id in elements_ids:
-                    branch_1_critical = True
-                    break
-                if branch_duct_2.Id in elements_ids:
-                    branch_2_critical = True
-                    break
+            first_critical = self.get_first_on_critical_path(branch_duct_1.id, branch_duct_2.id)
+            branch_1_critical = first_critical == 0
+            branch_2_critical = first_critical == 1
 
             if self.system_is_supply:
                 result_name = self.TEE_SUPPLY_SEPARATION_NAME
@@ -396,12 +303,11 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
         connector_data_instances_duct = self.get_connector_data_instances(duct)
 
 
-        if element_1.Id not in self.tap_crosses_filtered and element_2.Id not in self.tap_crosses_filtered:
-            self.tap_crosses_filtered.append(element_2.Id)
+        self.filter_tap_pair(element_1.id, element_2.id)
 
         double_tap_tee_name, Lc, Lp, Lo, fc, fp, fo = get_double_tap_tee_variables()
 
-        self.cross_tee_params[element_1.Id] =  CalculatorClassLib.MulticonElementCharacteristic(Lo,
+        self.cross_tee_params[element_1.id] =  CalculatorClassLib.MulticonElementCharacteristic(Lo,
                                                                                                 Lc,
                                                                                                 Lp,
                                                                                                 fo,
@@ -462,12 +368,12 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             input_element_2 = input_connector_2.connected_element
             output_element_2 = output_connector_2.connected_element
 
-            is_supply_air = self.system.SystemType == DuctSystemType.SupplyAir
+            is_supply_air = self.system_is_supply
 
             duct = input_element_1 if is_supply_air else output_element_1
 
             def get_branch_duct(element, input_element, output_element):
-                if element.Category.IsId(BuiltInCategory.OST_DuctTerminal):
+                if element.category == CATEGORY_TERMINAL:
                     return element
                 return output_element if is_supply_air else input_element
 
@@ -489,21 +395,10 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             Lc = max(filtered_flows) if filtered_flows else None
             Lp = min(filtered_flows) if filtered_flows else None
 
-            duct_critical = False
-            branch_1_critical = False
-            branch_2_critical = False
-            for number in self.critical_path_numbers:
-                section = self.system.GetSectionByNumber(number)
-                elements_ids = section.GetElementIds()
-                if duct.Id in elements_ids:
-                    duct_critical = True
-                    break
-                if branch_duct_1.Id in elements_ids:
-                    branch_1_critical = True
-                    break
-                if branch_duct_2.Id in elements_ids:
-                    branch_2_critical = True
-                    break
+            first_critical = self.get_first_on_critical_path(duct.id, branch_duct_1.id, branch_duct_2.id)
+            duct_critical = first_critical == 0
+            branch_1_critical = first_critical == 1
+            branch_2_critical = first_critical == 2
 
             is_rectangular = self.is_rectangular(duct_connectors[0])
 
@@ -554,8 +449,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
 
             return result_name, Lc, Lp, Lo_result, fc, fp, fo_result
 
-        if element_1.Id not in self.tap_crosses_filtered and element_2.Id not in self.tap_crosses_filtered:
-            self.tap_crosses_filtered.append(element_2.Id)
+        self.filter_tap_pair(element_1.id, element_2.id)
 
         connector_data_instances_1 = self.get_connector_data_instances(element_1)
         connector_data_instances_2 = self.get_connector_data_instances(element_2)
@@ -563,7 +457,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
 
         tap_cross_name, Lc, Lp, Lo, fc, fp, fo = get_tap_cross_variables()
 
-        self.cross_tee_params[element_1.Id] = CalculatorClassLib.MulticonElementCharacteristic(Lo,
+        self.cross_tee_params[element_1.id] = CalculatorClassLib.MulticonElementCharacteristic(Lo,
                                                                                                Lc,
                                                                                                Lp,
                                                                                                fo,
@@ -612,9 +506,9 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
                 None
             )
             # Определяем branch_connector как оставшийся коннектор
-            excluded_ids = {body_connector.connector_element.Id, pass_connector.connector_element.Id}
+            excluded_ids = {body_connector.index, pass_connector.index}
             # Отбираем все коннекторы, не входящие в excluded_ids
-            branch_connectors = [cd for cd in connector_data_instances if cd.connector_element.Id not in excluded_ids]
+            branch_connectors = [cd for cd in connector_data_instances if cd.index not in excluded_ids]
 
             branch_connector_1 = branch_connectors[0] if len(branch_connectors) > 0 else None
             branch_connector_2 = branch_connectors[1] if len(branch_connectors) > 1 else None
@@ -627,7 +521,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             fp = pass_connector.area
 
             if self.system_is_supply:
-                if pass_connector.connector_element.Id == output_connector.connector_element.Id:
+                if pass_connector.index == output_connector.index:
                     if self.is_rectangular(input_connector):
                         cross_name = self.CROSS_SUPPLY_PASS_RECT_NAME
                     else:
@@ -637,7 +531,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
                     Lo = main_branch.flow
                     fo = main_branch.area
 
-                if branch_connector_1.connector_element.Id == output_connector.connector_element.Id:
+                if branch_connector_1.index == output_connector.index:
                     if self.is_rectangular(input_connector):
                         cross_name = self.CROSS_EXHAUST_BRANCH_RECT_NAME
                     else:
@@ -646,7 +540,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
                     Lo = branch_connector_1.flow
                     fo = branch_connector_1.area
 
-                if branch_connector_2.connector_element.Id == output_connector.connector_element.Id:
+                if branch_connector_2.index == output_connector.index:
                     if self.is_rectangular(input_connector):
                         cross_name = self.CROSS_EXHAUST_BRANCH_RECT_NAME
                     else:
@@ -656,7 +550,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
                     fo = branch_connector_2.area
 
             else:
-                if pass_connector.connector_element.Id == input_connector.connector_element.Id:
+                if pass_connector.index == input_connector.index:
                     if self.is_rectangular(input_connector):
                         cross_name = self.CROSS_EXHAUST_PASS_RECT_NAME
                     else:
@@ -666,7 +560,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
                     Lo = main_branch.flow
                     fo = main_branch.area
 
-                if branch_connector_1.connector_element.Id == input_connector.connector_element.Id:
+                if branch_connector_1.index == input_connector.index:
                     if self.is_rectangular(input_connector):
                         cross_name = self.CROSS_EXHAUST_BRANCH_RECT_NAME
                     else:
@@ -674,7 +568,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
 
                     Lo = branch_connector_1.flow
                     fo = branch_connector_1.area
-                if branch_connector_2.connector_element.Id == input_connector.connector_element.Id:
+                if branch_connector_2.index == input_connector.index:
                     if self.is_rectangular(input_connector):
                         cross_name = self.CROSS_EXHAUST_BRANCH_RECT_NAME
                     else:
@@ -689,7 +583,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
 
         cross_name, Lc, Lp, Lo, fc, fp, fo = get_cross_variables()
 
-        self.cross_tee_params[element.Id] = CalculatorClassLib.MulticonElementCharacteristic(Lo, Lc, Lp, fo, fc, fp, cross_name)
+        self.cross_tee_params[element.id] = CalculatorClassLib.MulticonElementCharacteristic(Lo, Lc, Lp, fo, fc, fp, cross_name)
         self.remember_element_name(element, cross_name, connector_data_instances)
         return self.__calculate_coefficient(cross_name, Lo, Lp, Lc, fp, fo, fc)
 
@@ -778,10 +672,10 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             Lo, fo = branch_connector.flow, branch_connector.area
 
             if tee_name is None:
-                output_id = output_connector.connector_element.Id
-                input_id = input_connector.connector_element.Id
-                pass_id = pass_connector.connector_element.Id
-                branch_id = branch_connector.connector_element.Id
+                output_id = output_connector.index
+                input_id = input_connector.index
+                pass_id = pass_connector.index
+                branch_id = branch_connector.index
                 is_rect = self.is_rectangular(input_connector)
 
                 if is_supply:
@@ -801,7 +695,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
 
         tee_name, Lc, Lp, Lo, fc, fp, fo = get_tee_variables()
 
-        self.cross_tee_params[element.Id] = CalculatorClassLib.MulticonElementCharacteristic(Lo, Lc, Lp, fo, fc, fp, tee_name)
+        self.cross_tee_params[element.id] = CalculatorClassLib.MulticonElementCharacteristic(Lo, Lc, Lp, fo, fc, fp, tee_name)
 
         self.remember_element_name(element, tee_name, connector_data_instances)
 
@@ -846,7 +740,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             input_element = input_connector_1.connected_element
             output_element = output_connector_1.connected_element
 
-            if self.system.SystemType != DuctSystemType.SupplyAir:
+            if not self.system_is_supply:
                 duct = output_element
                 branch_duct = input_element
 
@@ -867,18 +761,9 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             Lc = max(filtered_flows) if filtered_flows else None
             Lp = min(filtered_flows) if filtered_flows else None
 
-            duct_critical = False
-            branch_critical = False
-
-            for number in self.critical_path_numbers:
-                section = self.system.GetSectionByNumber(number)
-                elements_ids = section.GetElementIds()
-                if duct.Id in elements_ids:
-                    duct_critical = True
-                    break
-                if branch_duct.Id in elements_ids:
-                    branch_critical = True
-                    break
+            first_critical = self.get_first_on_critical_path(duct.id, branch_duct.id)
+            duct_critical = first_critical == 0
+            branch_critical = first_critical == 1
 
             is_rectangular = self.is_rectangular(duct_connectors[0])
 
@@ -926,7 +811,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
 
         connector_data_instances_duct = self.get_connector_data_instances(duct)
 
-        self.cross_tee_params[element.Id] = CalculatorClassLib.MulticonElementCharacteristic(Lo, Lc, Lp, fo, fc, fp,
+        self.cross_tee_params[element.id] = CalculatorClassLib.MulticonElementCharacteristic(Lo, Lc, Lp, fo, fc, fp,
                                                                                              tap_tee_name)
 
         self.remember_element_name(element, tap_tee_name, [connector_data_instances[0],
@@ -957,30 +842,21 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
         def is_open_end_exists(last_section_ids):
             """ Проверяем существует ли открытый коннектор воздуховода на последней секции """
             for last_element_id in last_section_ids:
-                el = self.doc.GetElement(last_element_id)
-                if el.Category.IsId(BuiltInCategory.OST_DuctCurves):
-                    if any(not conn.IsConnected for conn in self.get_connectors(el)):
+                el = self.get_element(last_element_id)
+                if el.category == CATEGORY_DUCT:
+                    if any(not conn.is_connected for conn in self.get_connectors(el)):
                         return True
             return False
 
 
-        element_id = terminal.Id
-
-        terminal_critical = False
-        for number in self.critical_path_numbers:
-            section = self.system.GetSectionByNumber(number)
-            elements_ids = section.GetElementIds()
-            if element_id in elements_ids:
-                terminal_critical = True
-
-        first_section = self.system.GetSectionByNumber(self.critical_path_numbers[0])
-        last_section = self.system.GetSectionByNumber(self.critical_path_numbers[-1])
+        element_id = terminal.id
 
+        terminal_critical = self.is_on_critical_path(element_id)
 
-        first_elements_ids = first_section.GetElementIds()
-        last_elements_ids = last_section.GetElementIds()
+        first_elements_ids = self.sections.get_element_ids(self.critical_path_numbers[0])
+        last_elements_ids = self.sections.get_element_ids(self.critical_path_numbers[-1])
 
-        local_coefficient = terminal.GetParamValueOrDefault(SharedParamsConfig.Instance.VISLocalResistanceCoef, 0.0)
+        local_coefficient = terminal.local_coefficient
 
         connector_element = self.get_connectors(terminal)[0]
 
@@ -988,7 +864,7 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
         # частью критического пути - не рассматриваем его и возвращаем КМС
         if element_id in first_elements_ids or not terminal_critical:
             # элемент есть в первом сечении
-            self.element_names[terminal.Id] =  self.START_TERMINAL_NAME
+            self.element_names[terminal.id] =  self.START_TERMINAL_NAME
             return local_coefficient
 
         # Если терминал на последнем участке и не существует открытого конца - это выброс
@@ -1000,51 +876,31 @@ class CrossTeeCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCal
             else:
                 name = self.END_TERMINAL_NAME_EXHAUST
 
-            self.element_names[terminal.Id] = name
+            self.element_names[terminal.id] = name
             return local_coefficient
 
-        self.element_names[terminal.Id] = self.HOLE_NAME
+        self.element_names[terminal.id] = self.HOLE_NAME
 
         duct = None
-        for reference in connector_element.AllRefs:
-            if reference.Owner.Category.IsId(BuiltInCategory.OST_DuctCurves):
-                duct = reference.Owner
+        for ref_owner_id in connector_element.ref_owner_ids:
+            ref_owner = self.get_element(ref_owner_id)
+            if ref_owner is not None and ref_owner.category == CATEGORY_DUCT:
+                duct = ref_owner
 
         duct_area = self.get_element_area(duct)
         terminal_area = self.get_element_area(terminal)
 
         duct_flow = max(self.get_element_sections_flows(terminal, return_terminal_flow=False))
 
-        terminal_flow = terminal.GetParamValue(BuiltInParameter.RBS_DUCT_FLOW_PARAM)
-        terminal_flow = UnitUtils.ConvertFromInternalUnits(terminal_flow, UnitTypeId.CubicMetersPerHour)
+        terminal_flow = terminal.flow
 
 
 
         area_criteria = terminal_area / duct_area
         flow_criteria = terminal_flow / duct_flow
 
-        table = [
-            # area_criteria <= 0.1
-            [(0.1, 0.1), (0.2, -0.1), (0.3, -0.8), (0.4, -2.6), (float('inf'), -6.6)],
-            # area_criteria <= 0.2
-            [(0.1, 0.1), (0.2, 0.2), (0.3, -0.01), (0.4, -0.6), (float('inf'), -2.1)],
-            # area_criteria <= 0.4
-            [(0.1, 0.2), (0.2, 0.3), (0.3, 0.3), (0.4, 0.2), (float('inf'), -0.2)],
-            # area_criteria > 0.4
-            [(0.1, 0.2), (0.2, 0.3), (0.3, 0.4), (0.4, 0.4), (float('inf'), 0.3)],
-        ]
-
-        if area_criteria <= 0.1:
-            row = table[0]
-        elif area_criteria <= 0.2:
-            row = table[1]
-        elif area_criteria <= 0.4:
-            row = table[2]
-        else:
-            row = table[3]
-
-        for limit, local_coefficient in row:
-            if flow_criteria <= limit:
-                self.duct_terminals_flows[terminal.Id] = duct_flow
-                self.duct_terminals_sizes[terminal.Id] = duct_area
-                return local_coefficient
\ No newline at end of file
+        local_coefficient = self.lookup_coefficient('side_hole', area_criteria, flow_criteria)
+        if local_coefficient is not None:
+            self.duct_terminals_flows[terminal.id] = duct_flow
+            self.duct_terminals_sizes[terminal.id] = duct_area
+            return local_coefficient
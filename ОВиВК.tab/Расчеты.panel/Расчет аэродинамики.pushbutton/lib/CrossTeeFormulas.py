@@ -0,0 +1,206 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+# NumPy под IronPython недоступен, там пакетный расчет идет чистым Python
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TEE_SUPPLY_PASS_NAME = 'Тройник на проход нагнетание круглый/прямоугольный'
+TEE_SUPPLY_BRANCH_ROUND_NAME = 'Тройник нагнетание ответвление круглый'
+TEE_SUPPLY_BRANCH_RECT_NAME = 'Тройник нагнетание ответвление прямоугольный'
+TEE_SUPPLY_SEPARATION_NAME = 'Тройник симметричный разделение потока нагнетание'
+TEE_EXHAUST_PASS_ROUND_NAME = 'Тройник всасывание на проход круглый'
+TEE_EXHAUST_PASS_RECT_NAME = 'Тройник всасывание на проход прямоугольный'
+TEE_EXHAUST_BRANCH_ROUND_NAME = 'Тройник всасывание ответвление круглый'
+TEE_EXHAUST_BRANCH_RECT_NAME = 'Тройник всасывание ответвление прямоугольный'
+TEE_EXHAUST_MERGER_NAME = 'Тройник симметричный слияние'
+
+CROSS_SUPPLY_PASS_RECT_NAME = 'Крестовина на нагнетании проход прямоугольная'
+CROSS_SUPPLY_BRANCH_RECT_NAME = 'Крестовина на нагнетании ответвление прямоугольная'
+CROSS_SUPPLY_PASS_ROUND_NAME = 'Крестовина на нагнетании проход круглая'
+CROSS_SUPPLY_BRANCH_ROUND_NAME = 'Крестовина на нагнетании ответвление круглая'
+CROSS_EXHAUST_PASS_RECT_NAME = 'Крестовина на всасывании проход прямоугольная'
+CROSS_EXHAUST_PASS_ROUND_NAME = 'Крестовина на всасывании проход круглая'
+CROSS_EXHAUST_BRANCH_RECT_NAME = 'Крестовина на всасывании ответвление прямоугольная'
+CROSS_EXHAUST_BRANCH_ROUND_NAME = 'Крестовина на всасывании ответвление круглая'
+
+
+# Формулы принимают нормированные площади прохода и ответвления и нормированный расход в ответвлении.
+# Функции извлечения корня и выбора по условию передаются снаружи, чтобы одна и та же формула работала
+# и с числами, и с массивами NumPy.
+
+def _supply_pass(fp, fo, lo, sqrt, where):
+    return (0.45 * (fp / (1 - lo)) ** 2 + (0.6 - 1.7 * fp) * (fp / (1 - lo))
+            - (0.25 - 0.9 * fp ** 2) + 0.19 * ((1 - lo) / fp))
+
+
+def _supply_branch_round(fp, fo, lo, sqrt, where):
+    return ((fo / lo) ** 2
+            - 0.58 * (fo / lo) + 0.54
+            + 0.025 * (lo / fo))
+
+
+def _supply_branch_rect(fp, fo, lo, sqrt, where):
+    return ((fo / lo) ** 2
+            - 0.42 * (fo / lo) + 0.81
+            - 0.06 * (lo / fo))
+
+
+def _supply_separation(fp, fo, lo, sqrt, where):
+    return 1 + 0.3 * ((lo / fo) ** 2)
+
+
+def _exhaust_pass_round(fp, fo, lo, sqrt, where):
+    return (((1 - sqrt(fp)) + 0.5 * lo + 0.05) *
+            ((1.7 + (1 / (2 * fo) - 1) * lo - sqrt((fp + fo) * lo))
+             * ((fp / (1 - lo)) ** 2)))
+
+
+def _exhaust_pass_rect(fp, fo, lo, sqrt, where):
+    return (((1 - sqrt(fp)) + 0.5 * lo + 0.05) *
+            (1.5 + (1 / (2 * fo) - 1) * lo - sqrt((fp + fo) * lo))
+            * ((fp / (1 - lo)) ** 2))
+
+
+def _exhaust_branch_round(fp, fo, lo, sqrt, where):
+    return ((-0.7 - 6.05 * (1 - fp) ** 3) * (fo / lo) ** 2
+            + (1.32 + 3.23 * (1 - fp) ** 2) * (fo / lo)
+            + (0.5 + 0.42 * fp) - 0.167 * (lo / fo))
+
+
+def _exhaust_branch_rect(fp, fo, lo, sqrt, where):
+    return ((fo / lo) ** 2) * (4.1 * ((fp / fo) ** 1.25) * (lo ** 1.5) *
+                               ((fp + fo) ** ((0.3 / lo) * sqrt(fo / fp) - 2))
+                               - 0.5 * (fp / fo))
+
+
+def _exhaust_merger(fp, fo, lo, sqrt, where):
+    base = 1 + (1 / fo) ** 2 + 3 * (1 / fo) ** 2 * (lo ** 2 - lo)
+    return where(fo <= 0.35, base, where(lo <= 0.4, 0.9 * (1 - lo) * base, 0.55 * base))
+
+
+FORMULAS = {
+    TEE_SUPPLY_PASS_NAME: _supply_pass,
+    CROSS_SUPPLY_PASS_RECT_NAME: _supply_pass,
+    CROSS_SUPPLY_PASS_ROUND_NAME: _supply_pass,
+    TEE_SUPPLY_BRANCH_ROUND_NAME: _supply_branch_round,
+    CROSS_SUPPLY_BRANCH_ROUND_NAME: _supply_branch_round,
+    TEE_SUPPLY_BRANCH_RECT_NAME: _supply_branch_rect,
+    CROSS_SUPPLY_BRANCH_RECT_NAME: _supply_branch_rect,
+    TEE_SUPPLY_SEPARATION_NAME: _supply_separation,
+    TEE_EXHAUST_PASS_ROUND_NAME: _exhaust_pass_round,
+    CROSS_EXHAUST_PASS_ROUND_NAME: _exhaust_pass_round,
+    TEE_EXHAUST_PASS_RECT_NAME: _exhaust_pass_rect,
+    CROSS_EXHAUST_PASS_RECT_NAME: _exhaust_pass_rect,
+    TEE_EXHAUST_BRANCH_ROUND_NAME: _exhaust_branch_round,
+    CROSS_EXHAUST_BRANCH_ROUND_NAME: _exhaust_branch_round,
+    TEE_EXHAUST_BRANCH_RECT_NAME: _exhaust_branch_rect,
+    CROSS_EXHAUST_BRANCH_RECT_NAME: _exhaust_branch_rect,
+    TEE_EXHAUST_MERGER_NAME: _exhaust_merger
+}
+
+
+def _scalar_where(condition, if_true, if_false):
+    return if_true if condition else if_false
+
+
+def calculate_coefficient(tee_type_name, Lo, Lp, Lc, fo, fp, fc):
+    """
+    Расчет КМС одного тройника или крестовины.
+
+    Args:
+        tee_type_name (str): Название типа тройника-крестовины.
+        Lo (float): Расход в ответвлении.
+        Lp (float): Расход в проходе.
+        Lc (float): Расход в основном потоке.
+        fo (float): Площадь ответвления.
+        fp (float): Площадь прохода.
+        fc (float): Площадь основного потока.
+
+    Returns:
+        float: КМС или None, если тип тройника не найден.
+    """
+    formula = FORMULAS.get(tee_type_name)
+    if formula is None:
+        return None
+
+    return formula(fp / fc, fo / fc, Lo / Lc, math.sqrt, _scalar_where)
+
+
+def _calculate_pure(formula, fp, fo, lo):
+    results = []
+    for fp_normed, fo_normed, lo_normed in zip(fp, fo, lo):
+        try:
+            value = formula(fp_normed, fo_normed, lo_normed, math.sqrt, _scalar_where)
+        except (ZeroDivisionError, ValueError, OverflowError):
+            value = None
+        # Под CPython 3 дробная степень отрицательного числа дает комплексное число вместо ошибки
+        results.append(None if isinstance(value, complex) else value)
+    return results
+
+
+def _calculate_numpy(formula, fp, fo, lo):
+    with numpy.errstate(all='ignore'):
+        values = numpy.asarray(formula(numpy.asarray(fp, dtype=float),
+                                       numpy.asarray(fo, dtype=float),
+                                       numpy.asarray(lo, dtype=float),
+                                       numpy.sqrt,
+                                       numpy.where), dtype=float)
+    finite = numpy.isfinite(values)
+    return [value if is_finite else None for value, is_finite in zip(values.tolist(), finite.tolist())]
+
+
+def calculate_coefficients(tee_type_names, Lo, Lp, Lc, fo, fp, fc, use_numpy=True):
+    """
+    Пакетный расчет КМС тройников и крестовин. Строки группируются по формуле, каждая формула считается
+    одним проходом: массивами NumPy, если он установлен, иначе циклом на чистом Python.
+
+    Args:
+        tee_type_names (list): Названия типов тройников-крестовин.
+        Lo (list): Расходы в ответвлениях.
+        Lp (list): Расходы в проходах.
+        Lc (list): Расходы в основном потоке.
+        fo (list): Площади ответвлений.
+        fp (list): Площади проходов.
+        fc (list): Площади основного потока.
+        use_numpy (bool): Разрешить использование NumPy.
+
+    Returns:
+        list: КМС в порядке входных строк. None - для неизвестного типа или если формула не определена на
+        входных данных (нулевые площади и расходы, полный расход в ответвлении и т.п.).
+    """
+    count = len(tee_type_names)
+    if not (len(Lo) == len(Lp) == len(Lc) == len(fo) == len(fp) == len(fc) == count):
+        raise ValueError("Длины входных массивов не совпадают")
+
+    calculate = _calculate_numpy if (use_numpy and numpy is not None) else _calculate_pure
+
+    rows_by_formula = {}
+    for index, tee_type_name in enumerate(tee_type_names):
+        formula = FORMULAS.get(tee_type_name)
+        if formula is not None:
+            rows_by_formula.setdefault(formula, []).append(index)
+
+    results = [None] * count
+    for formula, rows in rows_by_formula.items():
+        fp_normed = []
+        fo_normed = []
+        lo_normed = []
+        valid_rows = []
+        for index in rows:
+            if fc[index] == 0 or Lc[index] == 0:
+                continue
+            fp_normed.append(float(fp[index]) / fc[index])
+            fo_normed.append(float(fo[index]) / fc[index])
+            lo_normed.append(float(Lo[index]) / Lc[index])
+            valid_rows.append(index)
+
+        for index, value in zip(valid_rows, calculate(formula, fp_normed, fo_normed, lo_normed)):
+            results[index] = value
+
+    return results
+
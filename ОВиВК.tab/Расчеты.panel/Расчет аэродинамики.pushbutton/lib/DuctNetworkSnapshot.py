@@ -0,0 +1,472 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import codecs
+import json
+import math
+
+# Модуль не должен зависеть от Revit API: снимок сети используется калькуляторами и может быть загружен из файла
+# вне Revit (регрессионные прогоны и замеры производительности).
+
+CATEGORY_DUCT = 'DuctCurves'
+CATEGORY_FLEX_DUCT = 'FlexDuctCurves'
+CATEGORY_PIPE = 'PipeCurves'
+CATEGORY_FITTING = 'DuctFitting'
+CATEGORY_ACCESSORY = 'DuctAccessory'
+CATEGORY_TERMINAL = 'DuctTerminal'
+CATEGORY_EQUIPMENT = 'MechanicalEquipment'
+CATEGORY_OTHER = 'Other'
+
+PART_TYPE_ELBOW = 'Elbow'
+PART_TYPE_TRANSITION = 'Transition'
+PART_TYPE_TEE = 'Tee'
+PART_TYPE_TAP = 'TapAdjustable'
+PART_TYPE_CROSS = 'Cross'
+PART_TYPE_CAP = 'Cap'
+PART_TYPE_UNION = 'Union'
+
+SHAPE_ROUND = 'Round'
+SHAPE_RECTANGULAR = 'Rectangular'
+SHAPE_OVAL = 'Oval'
+
+DIRECTION_IN = 'In'
+DIRECTION_OUT = 'Out'
+DIRECTION_BIDIRECTIONAL = 'Bidirectional'
+
+CONNECTOR_TYPE_CURVE = 'Curve'
+
+SYSTEM_SUPPLY_AIR = 'SupplyAir'
+SYSTEM_EXHAUST_AIR = 'ExhaustAir'
+SYSTEM_RETURN_AIR = 'ReturnAir'
+
+
+def vector_between(start, end):
+    """
+    Возвращает вектор из точки start в точку end.
+
+    Args:
+        start (tuple): Координаты начала (x, y, z).
+        end (tuple): Координаты конца (x, y, z).
+    Returns:
+        tuple: Вектор (x, y, z)
+    """
+    return end[0] - start[0], end[1] - start[1], end[2] - start[2]
+
+
+def dot_product(vector_1, vector_2):
+    """Скалярное произведение двух векторов."""
+    return vector_1[0] * vector_2[0] + vector_1[1] * vector_2[1] + vector_1[2] * vector_2[2]
+
+
+def vector_length(vector):
+    """Длина вектора."""
+    return math.sqrt(dot_product(vector, vector))
+
+
+def distance_between(point_1, point_2):
+    """Расстояние между двумя точками."""
+    return vector_length(vector_between(point_1, point_2))
+
+
+class ConnectorSnapshot:
+    """Класс для хранения данных о коннекторе, снятых с модели один раз."""
+
+    def __init__(self,
+                 index,
+                 owner_id,
+                 shape,
+                 flow,
+                 direction,
+                 angle,
+                 origin,
+                 radius=None,
+                 width=None,
+                 height=None,
+                 connected_id=None,
+                 ref_owner_ids=None,
+                 is_connected=True,
+                 is_hvac=True,
+                 connector_type=None):
+        """
+        Инициализация объекта ConnectorSnapshot.
+
+        Args:
+            index (int): Номер коннектора в пределах элемента-владельца.
+            owner_id (int): Id элемента-владельца.
+            shape (str): Форма коннектора (SHAPE_*).
+            flow (float): Расход, м3/ч.
+            direction (str): Направление потока (DIRECTION_*).
+            angle (float): Угол коннектора, градусы.
+            origin (tuple): Координаты коннектора, мм.
+            radius (float): Радиус, мм. Только для круглых коннекторов.
+            width (float): Ширина, мм. Только для некруглых коннекторов.
+            height (float): Высота, мм. Только для некруглых коннекторов.
+            connected_id (int): Id воздуховода, фитинга, оборудования или арматуры, к которым подключен коннектор.
+            ref_owner_ids (list): Id владельцев всех подключенных коннекторов в порядке Revit.
+            is_connected (bool): Подключен ли коннектор.
+            is_hvac (bool): Относится ли коннектор к домену HVAC.
+            connector_type (str): Тип коннектора в Revit (End, Curve и т.д.).
+        """
+        self.index = index
+        self.owner_id = owner_id
+        self.shape = shape
+        self.flow = flow
+        self.direction = direction
+        self.angle = angle
+        self.origin = tuple(origin)
+        self.radius = radius
+        self.width = width
+        self.height = height
+        self.connected_id = connected_id
+        self.ref_owner_ids = list(ref_owner_ids or [])
+        self.is_connected = is_connected
+        self.is_hvac = is_hvac
+        self.connector_type = connector_type
+
+        if shape == SHAPE_ROUND and radius is not None:
+            self.area = math.pi * ((radius / 1000) ** 2)
+        elif width is not None and height is not None:
+            self.area = height / 1000 * width / 1000
+        else:
+            self.area = None
+
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'owner_id': self.owner_id,
+            'shape': self.shape,
+            'flow': self.flow,
+            'direction': self.direction,
+            'angle': self.angle,
+            'origin': list(self.origin),
+            'radius': self.radius,
+            'width': self.width,
+            'height': self.height,
+            'connected_id': self.connected_id,
+            'ref_owner_ids': self.ref_owner_ids,
+            'is_connected': self.is_connected,
+            'is_hvac': self.is_hvac,
+            'connector_type': self.connector_type
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class ElementSnapshot:
+    """Класс для хранения данных об элементе сети, снятых с модели один раз."""
+
+    def __init__(self,
+                 element_id,
+                 category,
+                 part_type=None,
+                 location=None,
+                 connectors=None,
+                 flow=None,
+                 local_coefficient=0.0,
+                 rounding=150.0,
+                 roughness=None):
+        """
+        Инициализация объекта ElementSnapshot.
+
+        Args:
+            element_id (int): Id элемента.
+            category (str): Категория элемента (CATEGORY_*).
+            part_type (str): PartType фитинга (PART_TYPE_*) или None.
+            location (tuple): Точка вставки, мм, или None.
+            connectors (list): Все коннекторы элемента из ConnectorManager в порядке Revit.
+            flow (float): Расход воздухораспределителя, м3/ч.
+            local_coefficient (float): КМС, заданный в параметре элемента.
+            rounding (float): Закругление отвода, мм.
+            roughness (float): Эквивалентная шероховатость типа воздуховода, мм, или None.
+        """
+        self.id = element_id
+        self.category = category
+        self.part_type = part_type
+        self.location = tuple(location) if location is not None else None
+        self.connectors = connectors or []
+        self.flow = flow
+        self.local_coefficient = local_coefficient
+        self.rounding = rounding
+        self.roughness = roughness
+
+    def get_connectors(self):
+        """
+        Возвращает коннекторы элемента. Если элемент воздуховод получит только его коннекторы, врезки будут
+        игнорироваться.
+        """
+        # Врезки тоже попадают в список коннекторов воздуховода, но с нулевым расходом и двунаправленным потоком
+        if self.category == CATEGORY_DUCT:
+            return [c for c in self.connectors if c.connector_type != CONNECTOR_TYPE_CURVE]
+        return list(self.connectors)
+
+    def is_category(self, *categories):
+        """Проверяет, относится ли элемент к одной из категорий."""
+        return self.category in categories
+
+    def to_dict(self):
+        return {
+            'element_id': self.id,
+            'category': self.category,
+            'part_type': self.part_type,
+            'location': list(self.location) if self.location is not None else None,
+            'connectors': [c.to_dict() for c in self.connectors],
+            'flow': self.flow,
+            'local_coefficient': self.local_coefficient,
+            'rounding': self.rounding,
+            'roughness': self.roughness
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['connectors'] = [ConnectorSnapshot.from_dict(c) for c in data.get('connectors', [])]
+        return cls(**data)
+
+
+class SectionData:
+    """Класс для хранения данных о секции системы."""
+
+    def __init__(self, number, flow, element_ids, segment_lengths=None, pressure_drops=None):
+        """
+        Инициализация объекта SectionData.
+
+        Args:
+            number (int): Номер секции.
+            flow (float): Расход секции, м3/ч.
+            element_ids (list): Id элементов секции в порядке, который отдает Revit.
+            segment_lengths (dict): Длины линейных элементов секции, м.
+            pressure_drops (dict): Потери давления на линейных элементах секции, Па.
+        """
+        self.number = number
+        self.flow = flow
+        self.element_ids = list(element_ids)
+        self.element_ids_set = set(self.element_ids)
+        self.segment_lengths = segment_lengths or {}
+        self.pressure_drops = pressure_drops or {}
+
+    def get_segment_length(self, element_id):
+        """
+        Возвращает длину участка элемента в метрах или None, если элемент не является линейным.
+        """
+        return self.segment_lengths.get(element_id)
+
+    def get_pressure_drop(self, element_id):
+        """
+        Возвращает потери давления на линейном элементе в паскалях или None.
+        """
+        return self.pressure_drops.get(element_id)
+
+    def to_dict(self):
+        # Ключи JSON всегда строки, поэтому словари по Id сохраняем списками пар
+        return {
+            'number': self.number,
+            'flow': self.flow,
+            'element_ids': self.element_ids,
+            'segment_lengths': sorted(self.segment_lengths.items()),
+            'pressure_drops': sorted(self.pressure_drops.items())
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['number'],
+                   data['flow'],
+                   data['element_ids'],
+                   dict((key, value) for key, value in data.get('segment_lengths', [])),
+                   dict((key, value) for key, value in data.get('pressure_drops', [])))
+
+
+class SectionCatalogue:
+    """
+    Каталог секций системы. Хранит все, что нужно калькуляторам и отчету: номера, расходы, элементы,
+    длины участков и потери давления на линейных элементах.
+    """
+
+    def __init__(self, sections=None):
+        """
+        Инициализация объекта SectionCatalogue.
+
+        Args:
+            sections (list): Секции (SectionData) в порядке индексов Revit.
+        """
+        self.sections = []
+        self.sections_by_number = {}
+        self.element_sections_flows = {}
+
+        for section_data in sections or []:
+            self.add_section(section_data)
+
+    def add_section(self, section_data):
+        """
+        Добавляет секцию в каталог.
+
+        Args:
+            section_data (SectionData): Секция
+        """
+        self.sections.append(section_data)
+        self.sections_by_number[section_data.number] = section_data
+
+        for element_id in section_data.element_ids:
+            self.element_sections_flows.setdefault(element_id, []).append(section_data.flow)
+
+    def get_section(self, number):
+        """
+        Возвращает секцию по ее номеру.
+
+        Args:
+            number: Номер секции
+        Returns:
+            SectionData
+        """
+        return self.sections_by_number[number]
+
+    def get_element_ids(self, number):
+        """
+        Возвращает множество Id элементов секции или пустое множество, если секции нет.
+
+        Args:
+            number: Номер секции
+        Returns:
+            set
+        """
+        section_data = self.sections_by_number.get(number)
+        if section_data is None:
+            return set()
+        return section_data.element_ids_set
+
+    def get_element_flows(self, element_id):
+        """
+        Возвращает расходы всех секций, в которые входит элемент, в порядке индексов секций.
+
+        Args:
+            element_id: Id элемента
+        Returns:
+            list: Расходы, м3/ч
+        """
+        return list(self.element_sections_flows.get(element_id, []))
+
+
+class DuctNetworkSnapshot:
+    """
+    Снимок сети воздуховодов: элементы, коннекторы, секции и критический путь в виде обычных объектов Python.
+    """
+
+    def __init__(self, system_id, system_name, system_type, elements, element_order, sections, critical_path_numbers,
+                 density=None, kinematic_viscosity=None):
+        """
+        Инициализация объекта DuctNetworkSnapshot.
+
+        Args:
+            system_id (int): Id системы.
+            system_name (str): Имя системы.
+            system_type (str): Тип системы (SYSTEM_*).
+            elements (dict): Элементы сети и подключенные к ним элементы, {Id: ElementSnapshot}.
+            element_order (list): Id элементов сети в порядке DuctNetwork.
+            sections (SectionCatalogue): Каталог секций.
+            critical_path_numbers (list): Номера секций критического пути по ходу движения воздуха.
+            density (float): Плотность воздуха, кг/м3, с которой Revit считал потери секций, или None.
+            kinematic_viscosity (float): Кинематическая вязкость воздуха, м2/с, или None.
+        """
+        self.system_id = system_id
+        self.system_name = system_name
+        self.system_type = system_type
+        self.elements = elements
+        self.element_order = list(element_order)
+        self.sections = sections
+        self.critical_path_numbers = list(critical_path_numbers)
+        self.density = density
+        self.kinematic_viscosity = kinematic_viscosity
+        self._critical_path_positions = None
+
+    @property
+    def is_supply(self):
+        return self.system_type == SYSTEM_SUPPLY_AIR
+
+    def get_element(self, element_id):
+        """
+        Возвращает элемент снимка по Id или None.
+
+        Args:
+            element_id (int): Id элемента
+        Returns:
+            ElementSnapshot
+        """
+        if element_id is None:
+            return None
+        return self.elements.get(element_id)
+
+    def get_critical_path_positions(self):
+        """
+        Возвращает порядковые номера элементов на критическом пути: {Id элемента: индекс первой секции критического
+        пути, в которую входит элемент}. Элементы вне критического пути в словарь не попадают.
+
+        Returns:
+            dict
+        """
+        if self._critical_path_positions is None:
+            positions = {}
+            for position, number in enumerate(self.critical_path_numbers):
+                for element_id in self.sections.get_element_ids(number):
+                    positions.setdefault(element_id, position)
+            self._critical_path_positions = positions
+        return self._critical_path_positions
+
+    def get_network_elements(self):
+        """Возвращает элементы сети в порядке DuctNetwork."""
+        return [self.elements[element_id] for element_id in self.element_order]
+
+    def to_dict(self):
+        return {
+            'system_id': self.system_id,
+            'system_name': self.system_name,
+            'system_type': self.system_type,
+            'elements': [element.to_dict() for element in self.elements.values()],
+            'element_order': self.element_order,
+            'sections': [section.to_dict() for section in self.sections.sections],
+            'critical_path_numbers': self.critical_path_numbers,
+            'density': self.density,
+            'kinematic_viscosity': self.kinematic_viscosity
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        elements = {}
+        for element_data in data['elements']:
+            element = ElementSnapshot.from_dict(element_data)
+            elements[element.id] = element
+
+        sections = SectionCatalogue([SectionData.from_dict(section) for section in data['sections']])
+
+        return cls(data['system_id'],
+                   data['system_name'],
+                   data['system_type'],
+                   elements,
+                   data['element_order'],
+                   sections,
+                   data['critical_path_numbers'],
+                   data.get('density'),
+                   data.get('kinematic_viscosity'))
+
+    def save(self, file_path):
+        """
+        Сохраняет снимок в JSON файл.
+
+        Args:
+            file_path (str): Путь к файлу
+        """
+        with codecs.open(file_path, 'w', encoding='utf-8') as json_file:
+            json.dump(self.to_dict(), json_file)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Загружает снимок из JSON файла.
+
+        Args:
+            file_path (str): Путь к файлу
+        Returns:
+            DuctNetworkSnapshot
+        """
+        with codecs.open(file_path, 'r', encoding='utf-8') as json_file:
+            return cls.from_dict(json.load(json_file))
@@ -0,0 +1,273 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+from DuctNetworkSnapshot import *
+
+METHOD_ALTSHUL = 'Altshul'
+METHOD_COLEBROOK = 'Colebrook'
+
+# Эквивалентная шероховатость по умолчанию, мм, если у типа воздуховода она не задана
+DEFAULT_ROUGHNESS = {
+    CATEGORY_DUCT: 0.1,  # Оцинкованная сталь
+    CATEGORY_FLEX_DUCT: 0.9  # Гибкий гофрированный воздуховод
+}
+
+# Плотность и кинематическая вязкость воздуха при 20 °C, кг/м3 и м2/с
+DEFAULT_DENSITY = 1.2
+DEFAULT_KINEMATIC_VISCOSITY = 15.06e-6
+
+# Ниже этого числа Рейнольдса течение ламинарное и λ = 64 / Re
+LAMINAR_REYNOLDS = 2300
+
+COLEBROOK_ITERATIONS = 20
+COLEBROOK_TOLERANCE = 1e-10
+
+
+class DuctSegment:
+    """
+    Участок воздуховода, по которому считаются потери на трение.
+
+    Attributes:
+        element_id (int): Id воздуховода.
+        category (str): Категория воздуховода (CATEGORY_DUCT или CATEGORY_FLEX_DUCT).
+        shape (str): Форма сечения (SHAPE_*).
+        diameter (float): Диаметр, мм. Только для круглых.
+        width (float): Ширина, мм. Только для прямоугольных.
+        height (float): Высота, мм. Только для прямоугольных.
+        length (float): Длина, м.
+        flow (float): Расход, м3/ч.
+        roughness (float): Эквивалентная шероховатость, мм.
+    """
+
+    def __init__(self, element_id, category, shape, length, flow, roughness=None,
+                 diameter=None, width=None, height=None):
+        self.element_id = element_id
+        self.category = category
+        self.shape = shape
+        self.length = length
+        self.flow = flow
+        self.roughness = roughness if roughness is not None else DEFAULT_ROUGHNESS.get(category, 0.1)
+        self.diameter = diameter
+        self.width = width
+        self.height = height
+
+    @property
+    def area(self):
+        """Площадь сечения, м2."""
+        if self.shape == SHAPE_ROUND:
+            return math.pi * (self.diameter / 1000.0) ** 2 / 4
+        return self.width / 1000.0 * self.height / 1000.0
+
+    @property
+    def hydraulic_diameter(self):
+        """Гидравлический диаметр, м."""
+        if self.shape == SHAPE_ROUND:
+            return self.diameter / 1000.0
+        width = self.width / 1000.0
+        height = self.height / 1000.0
+        return 2 * width * height / (width + height)
+
+    @property
+    def velocity(self):
+        """Скорость воздуха, м/с."""
+        return self.flow / 3600.0 / self.area
+
+
+def get_altshul_friction_factor(reynolds, relative_roughness):
+    """
+    Коэффициент сопротивления трения по формуле Альтшуля.
+
+    Args:
+        reynolds (float): Число Рейнольдса.
+        relative_roughness (float): Отношение шероховатости к гидравлическому диаметру.
+
+    Returns:
+        float
+    """
+    return 0.11 * (relative_roughness + 68.0 / reynolds) ** 0.25
+
+
+def get_colebrook_friction_factor(reynolds, relative_roughness):
+    """
+    Коэффициент сопротивления трения по формуле Колбрука. Решается простой итерацией от значения по Альтшулю,
+    которое уже близко к ответу, поэтому хватает нескольких шагов.
+
+    Args:
+        reynolds (float): Число Рейнольдса.
+        relative_roughness (float): Отношение шероховатости к гидравлическому диаметру.
+
+    Returns:
+        float
+    """
+    inverse_root = 1.0 / math.sqrt(get_altshul_friction_factor(reynolds, relative_roughness))
+    for _ in range(COLEBROOK_ITERATIONS):
+        next_inverse_root = -2.0 * math.log10(relative_roughness / 3.7 + 2.51 * inverse_root / reynolds)
+        if abs(next_inverse_root - inverse_root) < COLEBROOK_TOLERANCE:
+            inverse_root = next_inverse_root
+            break
+        inverse_root = next_inverse_root
+    return 1.0 / inverse_root ** 2
+
+
+FRICTION_FACTORS = {
+    METHOD_ALTSHUL: get_altshul_friction_factor,
+    METHOD_COLEBROOK: get_colebrook_friction_factor
+}
+
+
+def get_friction_factor(reynolds, relative_roughness, method=METHOD_ALTSHUL):
+    """
+    Коэффициент сопротивления трения λ.
+
+    Args:
+        reynolds (float): Число Рейнольдса.
+        relative_roughness (float): Отношение шероховатости к гидравлическому диаметру.
+        method (str): METHOD_ALTSHUL или METHOD_COLEBROOK.
+
+    Returns:
+        float
+    """
+    if reynolds <= 0:
+        return 0.0
+    if reynolds < LAMINAR_REYNOLDS:
+        return 64.0 / reynolds
+    return FRICTION_FACTORS[method](reynolds, relative_roughness)
+
+
+def get_segment_pressure_drop(segment, density, kinematic_viscosity=DEFAULT_KINEMATIC_VISCOSITY,
+                              method=METHOD_ALTSHUL):
+    """
+    Потери давления на трение по длине участка: λ / dh * ρv² / 2 * l.
+
+    Args:
+        segment (DuctSegment): Участок воздуховода.
+        density (float): Плотность воздуха, кг/м3.
+        kinematic_viscosity (float): Кинематическая вязкость воздуха, м2/с.
+        method (str): METHOD_ALTSHUL или METHOD_COLEBROOK.
+
+    Returns:
+        float: Потери давления, Па.
+    """
+    if not segment.length or not segment.flow:
+        return 0.0
+    hydraulic_diameter = segment.hydraulic_diameter
+    velocity = abs(segment.velocity)
+    reynolds = velocity * hydraulic_diameter / kinematic_viscosity
+    friction_factor = get_friction_factor(reynolds, segment.roughness / 1000.0 / hydraulic_diameter, method)
+    return friction_factor / hydraulic_diameter * density * velocity ** 2 / 2 * segment.length
+
+
+def calculate_pressure_drops(segments, density, kinematic_viscosity=DEFAULT_KINEMATIC_VISCOSITY,
+                             method=METHOD_ALTSHUL):
+    """
+    Считает потери на трение для набора участков.
+
+    Args:
+        segments (list): Список DuctSegment.
+        density (float): Плотность воздуха, кг/м3.
+        kinematic_viscosity (float): Кинематическая вязкость воздуха, м2/с.
+        method (str): METHOD_ALTSHUL или METHOD_COLEBROOK.
+
+    Returns:
+        list: Потери давления, Па, в порядке segments.
+    """
+    return [get_segment_pressure_drop(segment, density, kinematic_viscosity, method) for segment in segments]
+
+
+def create_segment(element, length, flow):
+    """
+    Собирает участок воздуховода по снимку элемента. Размер берется с торцевого коннектора воздуховода.
+
+    Args:
+        element (ElementSnapshot): Воздуховод или гибкий воздуховод.
+        length (float): Длина участка, м.
+        flow (float): Расход участка, м3/ч.
+
+    Returns:
+        DuctSegment или None, если у элемента нет подходящего коннектора.
+    """
+    for connector in element.get_connectors():
+        if connector.shape == SHAPE_ROUND and connector.radius:
+            return DuctSegment(element.id, element.category, SHAPE_ROUND, length, flow, element.roughness,
+                               diameter=connector.radius * 2)
+        if connector.shape == SHAPE_RECTANGULAR and connector.width and connector.height:
+            return DuctSegment(element.id, element.category, SHAPE_RECTANGULAR, length, flow, element.roughness,
+                               width=connector.width, height=connector.height)
+    return None
+
+
+def get_section_segments(network, section):
+    """
+    Собирает участки воздуховодов секции. Длина берется из секции: один воздуховод с врезками может входить
+    в несколько секций разной длиной.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+        section (SectionData): Секция сети.
+
+    Returns:
+        list: Список DuctSegment.
+    """
+    segments = []
+    for element_id in section.element_ids:
+        length = section.get_segment_length(element_id)
+        if length is None:
+            continue
+        element = network.get_element(element_id)
+        if element is None or not element.is_category(CATEGORY_DUCT, CATEGORY_FLEX_DUCT):
+            continue
+        segment = create_segment(element, length, section.flow)
+        if segment is not None:
+            segments.append(segment)
+    return segments
+
+
+def calculate_section_pressure_drops(network, section, density, kinematic_viscosity=DEFAULT_KINEMATIC_VISCOSITY,
+                                     method=METHOD_ALTSHUL):
+    """
+    Считает потери на трение воздуховодов секции без обращения к Revit.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+        section (SectionData): Секция сети.
+        density (float): Плотность воздуха, кг/м3.
+        kinematic_viscosity (float): Кинематическая вязкость воздуха, м2/с.
+        method (str): METHOD_ALTSHUL или METHOD_COLEBROOK.
+
+    Returns:
+        dict: {Id воздуховода: потери давления, Па}.
+    """
+    segments = get_section_segments(network, section)
+    pressure_drops = calculate_pressure_drops(segments, density, kinematic_viscosity, method)
+    return dict((segment.element_id, pressure_drop) for segment, pressure_drop in zip(segments, pressure_drops))
+
+
+def compare_with_revit(network, density, kinematic_viscosity=DEFAULT_KINEMATIC_VISCOSITY,
+                       method=METHOD_ALTSHUL, tolerance=0.05):
+    """
+    Сверяет потери на трение с потерями, которые посчитал Revit и которые сохранены в снимке сети.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+        density (float): Плотность воздуха, кг/м3.
+        kinematic_viscosity (float): Кинематическая вязкость воздуха, м2/с.
+        method (str): METHOD_ALTSHUL или METHOD_COLEBROOK.
+        tolerance (float): Допустимое относительное отклонение.
+
+    Returns:
+        list: Расхождения сверх допуска - кортежи (номер секции, Id воздуховода, потери Revit, потери расчета).
+    """
+    deviations = []
+    for number in network.critical_path_numbers:
+        section = network.sections.get_section(number)
+        calculated = calculate_section_pressure_drops(network, section, density, kinematic_viscosity, method)
+        for element_id, pressure_drop in calculated.items():
+            revit_pressure_drop = section.get_pressure_drop(element_id)
+            if revit_pressure_drop is None:
+                continue
+            reference = max(abs(revit_pressure_drop), 1e-9)
+            if abs(pressure_drop - revit_pressure_drop) / reference > tolerance:
+                deviations.append((number, element_id, revit_pressure_drop, pressure_drop))
+    return deviations
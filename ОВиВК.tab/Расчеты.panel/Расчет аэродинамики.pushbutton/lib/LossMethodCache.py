@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import clr
+
+clr.AddReference("RevitAPI")
+
+from System import AppDomain, Array
+from System.Collections.Generic import Dictionary
+
+# Ключ данных домена приложения. Версия меняется, если меняется состав хранимой записи
+STORAGE_KEY = "Bim4Everyone.HVAC.LossMethodServers.v1"
+
+
+def _get_storage():
+    """
+    Возвращает словарь кэша из данных домена приложения. Домен живет, пока запущен Revit, поэтому кэш общий
+    для всех запусков скриптов в сессии. В нем лежат только объекты .NET - классы Python у каждого запуска свои.
+
+    Returns:
+        Dictionary: {Ключ: массив [имя, Id сервера, сервер, схема, поле коэффициента]}.
+    """
+    storage = AppDomain.CurrentDomain.GetData(STORAGE_KEY)
+    if storage is None:
+        storage = Dictionary[str, object]()
+        AppDomain.CurrentDomain.SetData(STORAGE_KEY, storage)
+    return storage
+
+
+def _get_key(service_id, server_guid):
+    return '{0}|{1}'.format(service_id.Guid, server_guid).lower()
+
+
+def _is_valid(entry):
+    schema = entry[3]
+    field = entry[4]
+    try:
+        return schema.IsValidObject and field.IsValidObject
+    except Exception:
+        return False
+
+
+def get(service_id, server_guid):
+    """
+    Возвращает сохраненные данные сервера метода расчета.
+
+    Args:
+        service_id (ExternalServiceId): Идентификатор сервиса.
+        server_guid (str): Идентификатор сервера.
+
+    Returns:
+        tuple: (имя, Id сервера, сервер, схема, поле коэффициента) или None, если сервер еще не искали
+            или его данные больше недействительны.
+    """
+    storage = _get_storage()
+    key = _get_key(service_id, server_guid)
+    if not storage.ContainsKey(key):
+        return None
+    entry = storage[key]
+    if not _is_valid(entry):
+        storage.Remove(key)
+        return None
+    return tuple(entry)
+
+
+def put(service_id, name, server_id, server, schema, coefficient_field):
+    """
+    Сохраняет данные найденного сервера метода расчета.
+
+    Args:
+        service_id (ExternalServiceId): Идентификатор сервиса.
+        name (str): Название метода расчета.
+        server_id (Guid): Идентификатор сервера.
+        server (IExternalServer): Объект сервера.
+        schema (Schema): Схема данных сервера.
+        coefficient_field (Field): Поле коэффициента в схеме данных.
+    """
+    entry = Array[object]([name, server_id, server, schema, coefficient_field])
+    _get_storage()[_get_key(service_id, server_id)] = entry
+
+
+def clear():
+    """Очищает кэш, например после переустановки серверов."""
+    _get_storage().Clear()
@@ -0,0 +1,319 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import clr
+
+clr.AddReference("RevitAPI")
+clr.AddReference("dosymep.Revit.dll")
+clr.AddReference("dosymep.Bim4Everyone.dll")
+import dosymep
+
+clr.ImportExtensions(dosymep.Revit)
+clr.ImportExtensions(dosymep.Bim4Everyone)
+
+import math
+from DuctNetworkSnapshot import *
+from Autodesk.Revit.DB import *
+from Autodesk.Revit.DB.Mechanical import *
+from dosymep.Bim4Everyone.SharedParams import SharedParamsConfig
+
+# Категории, которые различают калькуляторы. Остальные (включая саму систему) попадают в CATEGORY_OTHER
+CATEGORIES = [
+    (BuiltInCategory.OST_DuctCurves, CATEGORY_DUCT),
+    (BuiltInCategory.OST_FlexDuctCurves, CATEGORY_FLEX_DUCT),
+    (BuiltInCategory.OST_PipeCurves, CATEGORY_PIPE),
+    (BuiltInCategory.OST_DuctFitting, CATEGORY_FITTING),
+    (BuiltInCategory.OST_DuctAccessory, CATEGORY_ACCESSORY),
+    (BuiltInCategory.OST_DuctTerminal, CATEGORY_TERMINAL),
+    (BuiltInCategory.OST_MechanicalEquipment, CATEGORY_EQUIPMENT)
+]
+
+# Категории элементов, которые считаются подключенными к коннектору при поиске входа-выхода
+CONNECTED_CATEGORIES = [BuiltInCategory.OST_DuctCurves,
+                        BuiltInCategory.OST_DuctFitting,
+                        BuiltInCategory.OST_MechanicalEquipment,
+                        BuiltInCategory.OST_DuctAccessory]
+
+
+def get_all_connectors(element):
+    """
+    Получает все коннекторы элемента из ConnectorManager, включая врезки в воздуховод.
+
+    Args:
+        element: Элемент Revit
+    Returns:
+        list: Коннекторы
+    """
+    if isinstance(element, FamilyInstance) and element.MEPModel is not None \
+            and element.MEPModel.ConnectorManager is not None:
+        return list(element.MEPModel.ConnectorManager.Connectors)
+
+    if element.InAnyCategory([BuiltInCategory.OST_DuctCurves,
+                              BuiltInCategory.OST_PipeCurves,
+                              BuiltInCategory.OST_FlexDuctCurves]) and \
+            isinstance(element, MEPCurve) and element.ConnectorManager is not None:
+        return list(element.ConnectorManager.Connectors)
+
+    return []
+
+
+def get_connectors(element):
+    """
+    Получает коннекторы элемента. Если элемент воздуховод получит только его коннекторы, врезки будут игнорироваться.
+    """
+    connectors = get_all_connectors(element)
+
+    # Врезки тоже попадают в список коннекторов воздуховода, но с нулевым расходом и двунаправленным потоком
+    if element.Category.IsId(BuiltInCategory.OST_DuctCurves):
+        return [conn for conn in connectors if conn.ConnectorType != ConnectorType.Curve]
+    return connectors
+
+
+def get_category(element):
+    """
+    Возвращает категорию элемента для снимка сети.
+
+    Args:
+        element: Элемент Revit
+    Returns:
+        str: CATEGORY_*
+    """
+    if element.Category is None:
+        return CATEGORY_OTHER
+
+    for built_in_category, category in CATEGORIES:
+        if element.Category.IsId(built_in_category):
+            return category
+    return CATEGORY_OTHER
+
+
+def get_system_type(system):
+    """
+    Возвращает тип системы для снимка сети.
+
+    Args:
+        system: Система воздуховодов
+    Returns:
+        str: SYSTEM_*
+    """
+    if system.SystemType == DuctSystemType.SupplyAir:
+        return SYSTEM_SUPPLY_AIR
+    if system.SystemType == DuctSystemType.ExhaustAir:
+        return SYSTEM_EXHAUST_AIR
+    if system.SystemType == DuctSystemType.ReturnAir:
+        return SYSTEM_RETURN_AIR
+    return str(system.SystemType)
+
+
+def convert_point(point):
+    """
+    Переводит точку из внутренних единиц в кортеж координат в мм.
+    """
+    return (UnitUtils.ConvertFromInternalUnits(point.X, UnitTypeId.Millimeters),
+            UnitUtils.ConvertFromInternalUnits(point.Y, UnitTypeId.Millimeters),
+            UnitUtils.ConvertFromInternalUnits(point.Z, UnitTypeId.Millimeters))
+
+
+def create_connector_snapshot(connector, owner_id):
+    """
+    Снимает данные коннектора.
+
+    Args:
+        connector: Коннектор Revit
+        owner_id (int): Id элемента-владельца
+    Returns:
+        ConnectorSnapshot
+    """
+    radius = None
+    width = None
+    height = None
+    if connector.Shape == ConnectorProfileType.Round:
+        shape = SHAPE_ROUND
+        radius = UnitUtils.ConvertFromInternalUnits(connector.Radius, UnitTypeId.Millimeters)
+    else:
+        shape = SHAPE_RECTANGULAR if connector.Shape == ConnectorProfileType.Rectangular else SHAPE_OVAL
+        height = UnitUtils.ConvertFromInternalUnits(connector.Height, UnitTypeId.Millimeters)
+        width = UnitUtils.ConvertFromInternalUnits(connector.Width, UnitTypeId.Millimeters)
+
+    is_hvac = connector.Domain == Domain.DomainHvac
+
+    # Врезки воздуховода и коннекторы других доменов могут не отдавать расход, направление или угол
+    try:
+        flow = UnitUtils.ConvertFromInternalUnits(connector.Flow, UnitTypeId.CubicMetersPerHour)
+    except Exception:
+        flow = 0.0
+
+    try:
+        if connector.Direction == FlowDirectionType.In:
+            direction = DIRECTION_IN
+        elif connector.Direction == FlowDirectionType.Out:
+            direction = DIRECTION_OUT
+        else:
+            direction = DIRECTION_BIDIRECTIONAL
+    except Exception:
+        direction = DIRECTION_BIDIRECTIONAL
+
+    try:
+        angle = connector.Angle * (180 / math.pi)
+    except Exception:
+        angle = 0.0
+
+    connected_id = None
+    ref_owner_ids = []
+    for reference in connector.AllRefs:
+        ref_owner_ids.append(reference.Owner.Id.IntegerValue)
+        if reference.Owner.InAnyCategory(CONNECTED_CATEGORIES):
+            connected_id = reference.Owner.Id.IntegerValue
+
+    return ConnectorSnapshot(connector.Id,
+                             owner_id,
+                             shape,
+                             flow,
+                             direction,
+                             angle,
+                             convert_point(connector.Origin),
+                             radius=radius,
+                             width=width,
+                             height=height,
+                             connected_id=connected_id,
+                             ref_owner_ids=ref_owner_ids,
+                             is_connected=connector.IsConnected,
+                             is_hvac=is_hvac,
+                             connector_type=str(connector.ConnectorType))
+
+
+def create_element_snapshot(element):
+    """
+    Снимает данные элемента сети.
+
+    Args:
+        element: Элемент Revit
+    Returns:
+        ElementSnapshot
+    """
+    element_id = element.Id.IntegerValue
+    category = get_category(element)
+
+    part_type = None
+    if category == CATEGORY_FITTING and element.MEPModel is not None:
+        part_type = str(element.MEPModel.PartType)
+
+    location = None
+    if isinstance(element.Location, LocationPoint):
+        location = convert_point(element.Location.Point)
+
+    flow = None
+    local_coefficient = 0.0
+    if category == CATEGORY_TERMINAL:
+        flow = element.GetParamValue(BuiltInParameter.RBS_DUCT_FLOW_PARAM)
+        flow = UnitUtils.ConvertFromInternalUnits(flow, UnitTypeId.CubicMetersPerHour)
+        local_coefficient = element.GetParamValueOrDefault(SharedParamsConfig.Instance.VISLocalResistanceCoef, 0.0)
+
+    rounding = 150.0
+    if part_type == PART_TYPE_ELBOW:
+        # В стандартных семействах шаблона этот параметр есть. Для других вычислить почти невозможно, принимаем по ГОСТ
+        rounding = element.GetElementType().GetParamValueOrDefault('Закругление', 150.0)
+        if rounding != 150:
+            rounding = UnitUtils.ConvertFromInternalUnits(rounding, UnitTypeId.Millimeters)
+
+    roughness = None
+    if category in (CATEGORY_DUCT, CATEGORY_FLEX_DUCT):
+        curve_type = element.Document.GetElement(element.GetTypeId())
+        if isinstance(curve_type, MEPCurveType):
+            roughness = UnitUtils.ConvertFromInternalUnits(curve_type.Roughness, UnitTypeId.Millimeters)
+
+    connectors = [create_connector_snapshot(connector, element_id) for connector in get_all_connectors(element)]
+
+    return ElementSnapshot(element_id,
+                           category,
+                           part_type=part_type,
+                           location=location,
+                           connectors=connectors,
+                           flow=flow,
+                           local_coefficient=local_coefficient,
+                           rounding=rounding,
+                           roughness=roughness)
+
+
+def create_section_catalogue(system, curve_ids):
+    """
+    Собирает каталог секций за один проход по системе.
+
+    Args:
+        system: Система воздуховодов
+        curve_ids (set): Id линейных элементов сети
+    Returns:
+        SectionCatalogue
+    """
+    catalogue = SectionCatalogue()
+
+    for index in range(system.SectionsCount):
+        section = system.GetSectionByIndex(index)
+        flow = UnitUtils.ConvertFromInternalUnits(section.Flow, UnitTypeId.CubicMetersPerHour)
+
+        element_ids = []
+        segment_lengths = {}
+        pressure_drops = {}
+        for revit_id in section.GetElementIds():
+            element_id = revit_id.IntegerValue
+            element_ids.append(element_id)
+
+            # Длины и потери давления Revit отдает только для линейных элементов, для остальных бросает исключение
+            if element_id not in curve_ids:
+                continue
+            try:
+                length = section.GetSegmentLength(revit_id)
+                pressure_drop = section.GetPressureDrop(revit_id)
+            except Exception:
+                continue
+            segment_lengths[element_id] = UnitUtils.ConvertFromInternalUnits(length, UnitTypeId.Meters)
+            pressure_drops[element_id] = UnitUtils.ConvertFromInternalUnits(pressure_drop, UnitTypeId.Pascals)
+
+        catalogue.add_section(SectionData(section.Number, flow, element_ids, segment_lengths, pressure_drops))
+
+    return catalogue
+
+
+def build_network_snapshot(system):
+    """
+    Снимает сеть воздуховодов системы: элементы, коннекторы, секции и критический путь.
+
+    Args:
+        system: Система воздуховодов
+    Returns:
+        DuctNetworkSnapshot
+    """
+    doc = system.Document
+    elements = {}
+    element_order = []
+    curve_ids = set()
+
+    for element in system.DuctNetwork:
+        element_snapshot = create_element_snapshot(element)
+        elements[element_snapshot.id] = element_snapshot
+        element_order.append(element_snapshot.id)
+        if isinstance(element, MEPCurve):
+            curve_ids.add(element_snapshot.id)
+
+    # Коннекторы могут ссылаться на элементы вне DuctNetwork (в том числе на саму систему). Снимаем их без
+    # дальнейшего обхода, чтобы калькуляторы всегда находили элемент по Id
+    referenced_ids = set()
+    for element_snapshot in elements.values():
+        for connector in element_snapshot.connectors:
+            referenced_ids.update(connector.ref_owner_ids)
+    for element_id in referenced_ids:
+        if element_id not in elements:
+            elements[element_id] = create_element_snapshot(doc.GetElement(ElementId(element_id)))
+
+    critical_path_numbers = list(system.GetCriticalPathSectionNumbers())
+    system_type = get_system_type(system)
+    if system_type == SYSTEM_SUPPLY_AIR:
+        critical_path_numbers.reverse()
+
+    return DuctNetworkSnapshot(system.Id.IntegerValue,
+                               system.GetParamValue(BuiltInParameter.RBS_SYSTEM_NAME_PARAM),
+                               system_type,
+                               elements,
+                               element_order,
+                               create_section_catalogue(system, curve_ids),
+                               critical_path_numbers)
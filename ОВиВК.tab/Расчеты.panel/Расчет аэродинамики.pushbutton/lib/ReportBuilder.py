@@ -0,0 +1,217 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Строки с расходами, отличающимися не больше чем на столько м3/ч, попадают в один участок
+FLOW_TOLERANCE = 5
+
+DUCT_NAME_MARKER = 'Воздуховод'
+TOTAL_NAME = 'Итого, Па'
+TOTAL_RESERVE_NAME = 'Итого, Па + 15%'
+TOTAL_RESERVE_FACTOR = 1.15
+
+
+class ReportRow:
+    """
+    Строка отчета по элементу сети.
+
+    Attributes:
+        name (str): Наименование элемента.
+        length (float): Длина, м.п. или '-' для элементов без длины.
+        size (float): Площадь сечения, м2.
+        flow (float): Расход, м3/ч.
+        velocity (float): Скорость, м/с.
+        coefficient (float): КМС.
+        pressure_drop (float): Потери напора элемента, Па.
+        element_links (list): Ссылки на элементы. У объединенных воздуховодов их несколько.
+        element_ids (list): Id элементов для выгрузки в файл.
+        flow_value (float): Расход числом, для сортировки и группировки.
+        pressure_drop_value (float): Потери напора числом, для сумм.
+        section_number (int): Номер участка, задается при сборке отчета.
+        total_pressure_drop (float): Суммарные потери напора, задаются при сборке отчета.
+    """
+
+    def __init__(self, name, length, size, flow, velocity, coefficient, pressure_drop, element_link, element_id=None):
+        """
+        Инициализация объекта ReportRow.
+
+        Args:
+            name (str): Наименование элемента.
+            length (float): Длина, м.п. или '-'.
+            size (float): Площадь сечения, м2.
+            flow (float): Расход, м3/ч.
+            velocity (float): Скорость, м/с.
+            coefficient (float): КМС.
+            pressure_drop (float): Потери напора элемента, Па.
+            element_link (str): Ссылка на элемент.
+            element_id (int): Id элемента.
+        """
+        self.name = name
+        self.length = length
+        self.size = size
+        # Значения выводятся как переданы, в числа они переводятся только для сортировки и сумм
+        self.flow = flow
+        self.velocity = velocity
+        self.coefficient = coefficient
+        self.pressure_drop = pressure_drop
+        self.element_links = [element_link]
+        self.element_ids = [element_id]
+        self.section_number = 0
+        self.total_pressure_drop = 0.0
+
+    @property
+    def flow_value(self):
+        return float(self.flow)
+
+    @property
+    def pressure_drop_value(self):
+        return float(self.pressure_drop)
+
+    @property
+    def is_duct(self):
+        return DUCT_NAME_MARKER in self.name
+
+    def merge(self, row):
+        """
+        Присоединяет к строке воздуховода следующий воздуховод того же участка и сечения.
+
+        Args:
+            row (ReportRow): Присоединяемая строка.
+        """
+        self.length = _to_number(self.length) + _to_number(row.length)
+        self.pressure_drop = self.pressure_drop_value + row.pressure_drop_value
+        self.total_pressure_drop = max(self.total_pressure_drop, row.total_pressure_drop)
+        self.element_links.extend(row.element_links)
+        self.element_ids.extend(row.element_ids)
+
+    def to_list(self, use_links=True):
+        """
+        Возвращает строку в виде списка значений по колонкам отчета.
+
+        Args:
+            use_links (bool): Выводить ссылки на элементы, иначе - их Id.
+        """
+        elements = self.element_links if use_links else self.element_ids
+        return [self.section_number,
+                self.name,
+                self.length,
+                self.size,
+                self.flow,
+                self.velocity,
+                self.coefficient,
+                self.pressure_drop,
+                str(self.total_pressure_drop),
+                ",".join(str(element) for element in elements)]
+
+
+def _to_number(value):
+    if isinstance(value, (int, float)):
+        return value
+    return 0.0
+
+
+class ReportSection:
+    """Участок отчета: строки с близким расходом."""
+
+    def __init__(self, number, flow):
+        """
+        Инициализация объекта ReportSection.
+
+        Args:
+            number (int): Номер участка.
+            flow (float): Расход первой строки участка, от него отсчитывается допуск.
+        """
+        self.number = number
+        self.flow = flow
+        self.rows = []
+
+    @property
+    def title(self):
+        return 'Участок №' + str(self.number)
+
+
+class SystemReport:
+    """Отчет по системе: участки по возрастанию расхода и итоговые потери."""
+
+    def __init__(self, sections):
+        """
+        Инициализация объекта SystemReport.
+
+        Args:
+            sections (list): Список ReportSection.
+        """
+        self.sections = sections
+
+    @property
+    def row_count(self):
+        return sum(len(section.rows) for section in self.sections)
+
+    @property
+    def total_pressure_drop(self):
+        for section in reversed(self.sections):
+            if section.rows:
+                return section.rows[-1].total_pressure_drop
+        return 0.0
+
+    def get_total_rows(self):
+        """Возвращает строки "Итого" и "Итого + 15%"."""
+        total = self.total_pressure_drop
+        return [[""] + [TOTAL_NAME] + [""] * 6 + [str(round(total, 2))] + [""],
+                [""] + [TOTAL_RESERVE_NAME] + [""] * 6 + [str(round(total * TOTAL_RESERVE_FACTOR, 2))] + [""]]
+
+    def to_table(self):
+        """
+        Возвращает отчет в виде таблицы: заголовок участка, строки участка, в конце строки итогов.
+
+        Returns:
+            list: Список строк-списков.
+        """
+        table = []
+        for section in self.sections:
+            table.append([section.title])
+            table.extend(row.to_list() for row in section.rows)
+        if not self.sections:
+            table.append([ReportSection(1, 0.0).title])
+        table.extend(self.get_total_rows())
+        return table
+
+
+def build_report(rows):
+    """
+    Собирает отчет за один проход по строкам, отсортированным по расходу:
+    - строка попадает в текущий участок, если ее расход отличается от первого расхода участка не больше чем на
+      FLOW_TOLERANCE. Расходы участков растут и отличаются больше допуска, поэтому сравнивать нужно только
+      с последним участком;
+    - суммарные потери считаются нарастающим итогом;
+    - воздуховоды одного сечения внутри участка объединяются в первую строку с этим сечением.
+
+    Args:
+        rows (list): Список ReportRow в порядке обхода сети.
+
+    Returns:
+        SystemReport
+    """
+    sections = []
+    section = None
+    ducts_by_size = {}
+    cumulative_pressure_drop = 0.0
+
+    for row in sorted(rows, key=lambda report_row: report_row.flow_value):
+        cumulative_pressure_drop += row.pressure_drop_value
+        row.total_pressure_drop = cumulative_pressure_drop
+
+        if section is None or row.flow_value - section.flow > FLOW_TOLERANCE:
+            section = ReportSection(len(sections) + 1, row.flow_value)
+            sections.append(section)
+            ducts_by_size = {}
+        row.section_number = section.number
+
+        if row.is_duct:
+            base_row = ducts_by_size.get(row.size)
+            if base_row is not None:
+                base_row.merge(row)
+                continue
+            ducts_by_size[row.size] = row
+
+        section.rows.append(row)
+
+    return SystemReport(sections)
@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import codecs
+
+import ReportBuilder
+
+REPORT_COLUMNS = [
+    "Номер участка",
+    "Наименование элемента",
+    "Длина, м.п.",
+    "Размер, м2",
+    "Расход, м3/ч",
+    "Скорость, м/с",
+    "КМС",
+    "Потери напора элемента, Па",
+    "Суммарные потери напора, Па",
+    "Id элемента"
+]
+
+SUMMARY_COLUMNS = [
+    "Система",
+    "Плотность воздушной среды, кг/м3",
+    "Участков",
+    "Элементов",
+    "Итого, Па",
+    "Итого, Па + 15%"
+]
+
+# Сколько строк файла накапливается перед записью на диск
+CHUNK_SIZE = 500
+
+CSV_DELIMITER = ';'
+
+# Окно вывода pyRevit работает на движке IE, который не знает <details>. Поэтому таблица участка
+# скрывается стилем, а заголовок переключает ее обработчиком onclick
+SECTION_TOGGLE_SCRIPT = ("var table = this.nextSibling; "
+                         "while (table.nodeType != 1) { table = table.nextSibling; } "
+                         "table.style.display = table.style.display ? '' : 'none';")
+
+
+def get_summary_row(report, system_name, density):
+    """
+    Возвращает строку сводки по системе.
+
+    Args:
+        report (SystemReport): Отчет по системе.
+        system_name (str): Имя системы.
+        density (float): Плотность воздушной среды.
+
+    Returns:
+        list
+    """
+    total = report.total_pressure_drop
+    return [system_name,
+            density,
+            len(report.sections),
+            report.row_count,
+            round(total, 2),
+            round(total * ReportBuilder.TOTAL_RESERVE_FACTOR, 2)]
+
+
+def _escape_html(value):
+    return str(value).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _get_html_cells(values, cell_tag='td'):
+    return ''.join('<{0}>{1}</{0}>'.format(cell_tag, _escape_html(value)) for value in values)
+
+
+def _get_html_row(values, cell_tag='td'):
+    return '<tr>' + _get_html_cells(values, cell_tag) + '</tr>'
+
+
+def get_summary_html(report, system_name, density):
+    """
+    Возвращает таблицу сводки по системе в HTML.
+
+    Args:
+        report (SystemReport): Отчет по системе.
+        system_name (str): Имя системы.
+        density (float): Плотность воздушной среды.
+
+    Returns:
+        str
+    """
+    return ('<table>' +
+            _get_html_row(SUMMARY_COLUMNS, 'th') +
+            _get_html_row(get_summary_row(report, system_name, density)) +
+            '</table>')
+
+
+def get_section_html(section, use_links=True):
+    """
+    Возвращает участок отчета в виде заголовка и свернутой таблицы. Щелчок по заголовку разворачивает таблицу.
+
+    Args:
+        section (ReportSection): Участок отчета.
+        use_links (bool): Выводить ссылки на элементы (для окна вывода pyRevit), иначе - Id элементов.
+
+    Returns:
+        str
+    """
+    pressure_drop = sum(row.pressure_drop_value for row in section.rows)
+    title = '{0} - элементов: {1}, потери напора: {2} Па'.format(section.title,
+                                                                 len(section.rows),
+                                                                 round(pressure_drop, 2))
+    lines = ['<div style="cursor: pointer; font-weight: bold;" onclick="' + SECTION_TOGGLE_SCRIPT + '">' +
+             '&#9656; ' + _escape_html(title) + '</div><table style="display: none;">',
+             _get_html_row(REPORT_COLUMNS, 'th')]
+    for row in section.rows:
+        values = row.to_list(use_links)
+        if use_links:
+            # Ссылки на элементы - готовый HTML, их не экранируем
+            lines.append('<tr>' + _get_html_cells(values[:-1]) + '<td>' + values[-1] + '</td></tr>')
+        else:
+            lines.append(_get_html_row(values))
+    lines.append('</table>')
+    return ''.join(lines)
+
+
+def get_total_html(report):
+    """
+    Возвращает строки "Итого" отчета в HTML.
+
+    Args:
+        report (SystemReport): Отчет по системе.
+
+    Returns:
+        str
+    """
+    return '<table>' + ''.join(_get_html_row(row) for row in report.get_total_rows()) + '</table>'
+
+
+def _format_csv_value(value):
+    text = str(value)
+    if any(symbol in text for symbol in (CSV_DELIMITER, '"', '\n')):
+        text = '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _get_csv_line(values):
+    return CSV_DELIMITER.join(_format_csv_value(value) for value in values) + '\n'
+
+
+def iter_csv_lines(report, system_name, density):
+    """
+    Построчно формирует отчет в CSV: сначала сводка, затем строки участков и итоги.
+    Вместо ссылок выводятся Id элементов, чтобы файлы разных расчетов можно было сравнивать.
+
+    Args:
+        report (SystemReport): Отчет по системе.
+        system_name (str): Имя системы.
+        density (float): Плотность воздушной среды.
+    """
+    yield _get_csv_line(SUMMARY_COLUMNS)
+    yield _get_csv_line(get_summary_row(report, system_name, density))
+    yield '\n'
+    yield _get_csv_line(REPORT_COLUMNS)
+    for section in report.sections:
+        yield _get_csv_line([section.title])
+        for row in section.rows:
+            yield _get_csv_line(row.to_list(use_links=False))
+    for row in report.get_total_rows():
+        yield _get_csv_line(row)
+
+
+def iter_html_chunks(report, system_name, density):
+    """
+    Поблочно формирует отчет в HTML: сводка, затем по сворачиваемому блоку на участок и итоги.
+
+    Args:
+        report (SystemReport): Отчет по системе.
+        system_name (str): Имя системы.
+        density (float): Плотность воздушной среды.
+    """
+    yield ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>' + _escape_html(system_name) +
+           '</title></head><body>')
+    yield '<h3>Отчет о расчете аэродинамики системы ' + _escape_html(system_name) + '</h3>'
+    yield get_summary_html(report, system_name, density)
+    for section in report.sections:
+        yield get_section_html(section, use_links=False)
+    yield get_total_html(report)
+    yield '</body></html>'
+
+
+def write_chunks(file_path, chunks, chunk_size=CHUNK_SIZE):
+    """
+    Записывает текст в файл порциями по chunk_size частей, не собирая весь отчет в памяти.
+
+    Args:
+        file_path (str): Путь к файлу.
+        chunks: Итератор частей текста.
+        chunk_size (int): Количество частей в одной записи.
+    """
+    with codecs.open(file_path, 'w', encoding='utf-8') as report_file:
+        buffer = []
+        for chunk in chunks:
+            buffer.append(chunk)
+            if len(buffer) >= chunk_size:
+                report_file.write(''.join(buffer))
+                buffer = []
+        if buffer:
+            report_file.write(''.join(buffer))
+
+
+def write_csv(report, file_path, system_name, density):
+    """
+    Сохраняет отчет в CSV.
+
+    Args:
+        report (SystemReport): Отчет по системе.
+        file_path (str): Путь к файлу.
+        system_name (str): Имя системы.
+        density (float): Плотность воздушной среды.
+    """
+    write_chunks(file_path, iter_csv_lines(report, system_name, density))
+
+
+def write_html(report, file_path, system_name, density):
+    """
+    Сохраняет отчет в HTML.
+
+    Args:
+        report (SystemReport): Отчет по системе.
+        file_path (str): Путь к файлу.
+        system_name (str): Имя системы.
+        density (float): Плотность воздушной среды.
+    """
+    write_chunks(file_path, iter_html_chunks(report, system_name, density))
+
+
+WRITERS = {
+    'csv': write_csv,
+    'html': write_html
+}
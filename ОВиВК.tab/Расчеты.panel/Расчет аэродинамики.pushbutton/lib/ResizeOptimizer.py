@@ -0,0 +1,574 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+import CrossTeeFormulas
+import FrictionLoss
+from DuctNetworkSnapshot import *
+from TransitionElbowCalculator import get_rect_elbow_coefficient
+
+# Диапазон скоростей, в котором подбираются размеры, м/с
+MIN_VELOCITY = 1.0
+MAX_VELOCITY = 10.0
+# Максимальное отношение сторон прямоугольного сечения
+MAX_ASPECT_RATIO = 4.0
+# Сколько ближайших по площади к текущему размеров рассматривается для участка
+MAX_CANDIDATES = 12
+# Допустимое относительное расхождение пересчитанного КМС фитинга с рассчитанным для текущего размера
+COEFFICIENT_TOLERANCE = 1e-3
+
+# Тройники и крестовины, потери которых считаются по скорости в проходе, у остальных - по скорости в ответвлении
+PASS_NAMES = (CrossTeeFormulas.TEE_SUPPLY_PASS_NAME,
+              CrossTeeFormulas.TEE_EXHAUST_PASS_ROUND_NAME,
+              CrossTeeFormulas.TEE_EXHAUST_PASS_RECT_NAME,
+              CrossTeeFormulas.CROSS_SUPPLY_PASS_RECT_NAME,
+              CrossTeeFormulas.CROSS_EXHAUST_PASS_RECT_NAME,
+              CrossTeeFormulas.CROSS_SUPPLY_PASS_ROUND_NAME,
+              CrossTeeFormulas.CROSS_EXHAUST_PASS_ROUND_NAME)
+
+
+class SizeOption:
+    """
+    Вариант сечения воздуховода.
+
+    Attributes:
+        shape (str): Форма сечения (SHAPE_*).
+        diameter (float): Диаметр, мм. Только для круглых.
+        width (float): Ширина, мм. Только для прямоугольных.
+        height (float): Высота, мм. Только для прямоугольных.
+    """
+
+    def __init__(self, shape, diameter=None, width=None, height=None):
+        self.shape = shape
+        self.diameter = diameter
+        self.width = width
+        self.height = height
+
+    @property
+    def area(self):
+        """Площадь сечения, м2."""
+        if self.shape == SHAPE_ROUND:
+            return math.pi * (self.diameter / 1000.0) ** 2 / 4
+        return self.width / 1000.0 * self.height / 1000.0
+
+    @property
+    def perimeter(self):
+        """Периметр сечения, м."""
+        if self.shape == SHAPE_ROUND:
+            return math.pi * self.diameter / 1000.0
+        return 2 * (self.width + self.height) / 1000.0
+
+    @property
+    def radius(self):
+        """Радиус, мм. Только для круглых."""
+        if self.shape == SHAPE_ROUND:
+            return self.diameter / 2.0
+        return None
+
+    @property
+    def name(self):
+        if self.shape == SHAPE_ROUND:
+            return 'ø{0:g}'.format(self.diameter)
+        return '{0:g}x{1:g}'.format(self.width, self.height)
+
+    @classmethod
+    def from_segment(cls, segment):
+        return cls(segment.shape, segment.diameter, segment.width, segment.height)
+
+
+class FittingModel:
+    """
+    Фитинг участка с постоянным КМС. Потери считаются по скорости в сечении участка.
+
+    Attributes:
+        element_id (int): Id фитинга.
+        coefficient (float): КМС при текущем размере участка.
+        flow (float): Расход, по которому считается скорость, м3/ч.
+    """
+
+    def __init__(self, element_id, coefficient, flow):
+        self.element_id = element_id
+        self.coefficient = coefficient
+        self.flow = flow
+
+    def get_coefficients(self, sizes):
+        """
+        Args:
+            sizes (list): Размеры участка, SizeOption.
+
+        Returns:
+            list: КМС для каждого размера или None, если формула не определена при этом размере.
+        """
+        return [self.coefficient] * len(sizes)
+
+    def get_current_coefficient(self):
+        """
+        Returns:
+            float: КМС, пересчитанный по исходным величинам фитинга без смены размеров.
+        """
+        return self.coefficient
+
+    def get_reference_areas(self, sizes):
+        """
+        Args:
+            sizes (list): Размеры участка, SizeOption.
+
+        Returns:
+            list: Площадь, по которой считается скорость, м2, для каждого размера.
+        """
+        return [size.area for size in sizes]
+
+
+class TeeModel(FittingModel):
+    """
+    Тройник, крестовина или врезка. Расходы и тип берутся из характеристики, рассчитанной для текущих размеров,
+    площади со стороны участка заменяются площадью нового сечения. КМС всех размеров участка считается одним
+    пакетом по формулам CrossTeeFormulas.
+
+    Attributes:
+        characteristic (MulticonElementCharacteristic): Характеристика при текущих размерах.
+        resized (tuple): Площади характеристики, которые меняются с размером участка ('fc', 'fp', 'fo').
+    """
+
+    def __init__(self, element_id, coefficient, characteristic, resized):
+        is_pass = characteristic.name in PASS_NAMES
+        FittingModel.__init__(self, element_id, coefficient, characteristic.Lp if is_pass else characteristic.Lo)
+        self.characteristic = characteristic
+        self.resized = resized
+        self.reference = 'fp' if is_pass else 'fo'
+
+    def __get_areas(self, size):
+        areas = {}
+        for name in ('fc', 'fp', 'fo'):
+            areas[name] = size.area if name in self.resized else getattr(self.characteristic, name)
+        return areas
+
+    def get_coefficients(self, sizes):
+        characteristic = self.characteristic
+        areas = [self.__get_areas(size) for size in sizes]
+        count = len(sizes)
+        return CrossTeeFormulas.calculate_coefficients([characteristic.name] * count,
+                                                       [characteristic.Lo] * count,
+                                                       [characteristic.Lp] * count,
+                                                       [characteristic.Lc] * count,
+                                                       [item['fo'] for item in areas],
+                                                       [item['fp'] for item in areas],
+                                                       [item['fc'] for item in areas])
+
+    def get_current_coefficient(self):
+        characteristic = self.characteristic
+        return CrossTeeFormulas.calculate_coefficient(characteristic.name, characteristic.Lo, characteristic.Lp,
+                                                      characteristic.Lc, characteristic.fo, characteristic.fp,
+                                                      characteristic.fc)
+
+    def get_reference_areas(self, sizes):
+        return [self.__get_areas(size)[self.reference] for size in sizes]
+
+
+class ElbowModel(FittingModel):
+    """
+    Прямоугольный отвод. КМС пересчитывается по get_rect_elbow_coefficient от сторон нового сечения,
+    поправка на угол берется из КМС при текущем сечении отвода.
+
+    Attributes:
+        rounding (float): Закругление, мм.
+        angle_factor (float): Отношение КМС отвода к КМС отвода 90° того же сечения.
+    """
+
+    def __init__(self, element_id, coefficient, flow, rounding, connector):
+        FittingModel.__init__(self, element_id, coefficient, flow)
+        self.rounding = rounding
+        self.angle_factor = coefficient / self.__calculate(connector)
+
+    def __calculate(self, size):
+        return get_rect_elbow_coefficient(float(size.width) / size.height, float(self.rounding) / size.width)
+
+    def get_coefficients(self, sizes):
+        return [self.angle_factor * self.__calculate(size) for size in sizes]
+
+
+class TransitionModel(FittingModel):
+    """
+    Переход. КМС пересчитывается по таблицам калькулятора, сторона перехода, подключенная к воздуховоду
+    участка, получает новое сечение.
+
+    Attributes:
+        calculator (TransitionElbowCoefficientCalculator): Калькулятор с таблицами КМС.
+        input_size: Входное сечение при текущем размере.
+        output_size: Выходное сечение при текущем размере.
+        length (float): Длина перехода, мм.
+        resize_input (bool): Вход меняется с размером участка.
+        resize_output (bool): Выход меняется с размером участка.
+    """
+
+    def __init__(self, element_id, coefficient, flow, calculator, input_size, output_size, length,
+                 resize_input, resize_output):
+        FittingModel.__init__(self, element_id, coefficient, flow)
+        self.calculator = calculator
+        self.input_size = input_size
+        self.output_size = output_size
+        self.length = length
+        self.resize_input = resize_input
+        self.resize_output = resize_output
+
+    def __get_sizes(self, size):
+        return (size if self.resize_input else self.input_size,
+                size if self.resize_output else self.output_size)
+
+    def get_coefficients(self, sizes):
+        coefficients = []
+        for size in sizes:
+            input_size, output_size = self.__get_sizes(size)
+            try:
+                coefficients.append(self.calculator.calculate_transition_coefficient(input_size, output_size,
+                                                                                      self.length))
+            except ZeroDivisionError:
+                coefficients.append(None)
+        return coefficients
+
+    def get_current_coefficient(self):
+        return self.calculator.calculate_transition_coefficient(self.input_size, self.output_size, self.length)
+
+    def get_reference_areas(self, sizes):
+        return [min(sizes_pair[0].area, sizes_pair[1].area) for sizes_pair in map(self.__get_sizes, sizes)]
+
+
+class SectionModel:
+    """
+    Модель участка критического пути для перебора размеров: воздуховоды участка и фитинги, подключенные к ним.
+    От размера зависят потери на трение, КМС фитингов и скорость, по которой считаются их потери.
+
+    Attributes:
+        number (int): Номер секции.
+        flow (float): Расход, м3/ч.
+        segments (list): Воздуховоды участка, DuctSegment.
+        fittings (list): Фитинги участка, FittingModel.
+        current_size (SizeOption): Текущий размер участка.
+    """
+
+    def __init__(self, number, flow, segments, fittings):
+        self.number = number
+        self.flow = flow
+        self.segments = segments
+        self.fittings = fittings
+        self.current_size = SizeOption.from_segment(segments[0])
+
+    @property
+    def length(self):
+        return sum(segment.length for segment in self.segments)
+
+    def evaluate_sizes(self, sizes, density, kinematic_viscosity, method=FrictionLoss.METHOD_ALTSHUL):
+        """
+        Считает потери и площадь металла участка при заданных размерах.
+
+        Args:
+            sizes (list): Размеры сечения, SizeOption.
+            density (float): Плотность воздуха, кг/м3.
+            kinematic_viscosity (float): Кинематическая вязкость воздуха, м2/с.
+            method (str): Формула коэффициента трения.
+
+        Returns:
+            list: (потери давления, Па; площадь металла воздуховодов, м2) для каждого размера или None, если
+            КМС одного из фитингов при этом размере не определен.
+        """
+        pressure_drops = []
+        for size in sizes:
+            pressure_drop = 0.0
+            for segment in self.segments:
+                resized = FrictionLoss.DuctSegment(segment.element_id, segment.category, size.shape, segment.length,
+                                                   segment.flow, segment.roughness,
+                                                   diameter=size.diameter, width=size.width, height=size.height)
+                pressure_drop += FrictionLoss.get_segment_pressure_drop(resized, density, kinematic_viscosity,
+                                                                        method)
+            pressure_drops.append(pressure_drop)
+
+        for fitting in self.fittings:
+            coefficients = fitting.get_coefficients(sizes)
+            areas = fitting.get_reference_areas(sizes)
+            for index, (coefficient, area) in enumerate(zip(coefficients, areas)):
+                if pressure_drops[index] is None:
+                    continue
+                if coefficient is None:
+                    pressure_drops[index] = None
+                    continue
+                velocity = fitting.flow / 3600.0 / area
+                pressure_drops[index] += coefficient * density * velocity ** 2 / 2
+
+        return [None if pressure_drop is None else (pressure_drop, size.perimeter * self.length)
+                for size, pressure_drop in zip(sizes, pressure_drops)]
+
+    def evaluate(self, size, density, kinematic_viscosity, method=FrictionLoss.METHOD_ALTSHUL):
+        """
+        Считает потери и площадь металла участка при заданном размере.
+
+        Args:
+            size (SizeOption): Размер сечения.
+            density (float): Плотность воздуха, кг/м3.
+            kinematic_viscosity (float): Кинематическая вязкость воздуха, м2/с.
+            method (str): Формула коэффициента трения.
+
+        Returns:
+            tuple: (потери давления, Па; площадь металла воздуховодов, м2) или None.
+        """
+        return self.evaluate_sizes([size], density, kinematic_viscosity, method)[0]
+
+
+class ResizeVariant:
+    """
+    Вариант размеров выбранных участков.
+
+    Attributes:
+        pressure_drop (float): Суммарные потери критического пути, Па.
+        metal_area (float): Площадь металла воздуховодов выбранных участков, м2.
+        sizes (tuple): SizeOption по участкам в порядке выбора.
+    """
+
+    def __init__(self, pressure_drop, metal_area, sizes):
+        self.pressure_drop = pressure_drop
+        self.metal_area = metal_area
+        self.sizes = sizes
+
+
+def get_tee_resized_areas(network, element, connector, characteristic):
+    """
+    Определяет, какие площади характеристики тройника относятся к стороне, подключенной к воздуховоду участка.
+    Сторона ищется по расходу и площади коннектора, у врезки сторона воздуховода - это ствол и проход.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+        element (ElementSnapshot): Тройник, крестовина или врезка.
+        connector (ConnectorSnapshot): Коннектор фитинга, подключенный к воздуховоду участка.
+        characteristic (MulticonElementCharacteristic): Характеристика фитинга.
+
+    Returns:
+        tuple: Имена площадей ('fc', 'fp', 'fo').
+    """
+    if element.part_type == PART_TYPE_TAP:
+        duct = network.get_element(connector.connected_id)
+        for duct_connector in duct.connectors:
+            if duct_connector.connector_type == CONNECTOR_TYPE_CURVE and duct_connector.connected_id == element.id:
+                return 'fc', 'fp'
+        return 'fo',
+
+    sides = [('fc', characteristic.Lc, characteristic.fc),
+             ('fp', characteristic.Lp, characteristic.fp),
+             ('fo', characteristic.Lo, characteristic.fo)]
+    name, _, _ = min(sides, key=lambda side: (abs(side[1] - connector.flow), abs(side[2] - connector.area)))
+    return name,
+
+
+def is_connected_to(connector_data, element_ids):
+    connected_element = connector_data.connected_element
+    return connected_element is not None and connected_element.id in element_ids
+
+
+def create_fitting_model(network, element, flow, segment_ids, current_size, coefficient, characteristic,
+                         calculator):
+    """
+    Собирает модель фитинга для перебора размеров участка. Исходные величины фитинга снимаются один раз, при
+    переборе меняются только сечения со стороны участка.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+        element (ElementSnapshot): Фитинг.
+        flow (float): Расход участка, м3/ч.
+        segment_ids (set): Id воздуховодов участка.
+        current_size (SizeOption): Текущий размер участка.
+        coefficient (float): КМС фитинга при текущих размерах.
+        characteristic (MulticonElementCharacteristic): Характеристика тройника или None.
+        calculator (TransitionElbowCoefficientCalculator): Калькулятор переходов или None.
+
+    Returns:
+        FittingModel или None, если фитинг не подключен к воздуховодам участка.
+    """
+    connectors = [connector for connector in element.get_connectors() if connector.connected_id in segment_ids]
+    if not connectors:
+        return None
+
+    model = None
+    if characteristic is not None and characteristic.name in CrossTeeFormulas.FORMULAS:
+        model = TeeModel(element.id, coefficient, characteristic,
+                         get_tee_resized_areas(network, element, connectors[0], characteristic))
+    elif element.part_type == PART_TYPE_ELBOW and connectors[0].shape == SHAPE_RECTANGULAR \
+            and current_size.shape == SHAPE_RECTANGULAR and coefficient:
+        model = ElbowModel(element.id, coefficient, flow, element.rounding, connectors[0])
+    elif element.part_type == PART_TYPE_TRANSITION and calculator is not None:
+        input_conn, output_conn, length = calculator.get_transition_variables(element)
+        model = TransitionModel(element.id, coefficient, flow, calculator, input_conn, output_conn, length,
+                                is_connected_to(input_conn, segment_ids),
+                                is_connected_to(output_conn, segment_ids))
+
+    # Если КМС по исходным величинам не повторяется, фитинг посчитан особым случаем калькулятора и остается постоянным
+    if model is not None:
+        current = model.get_current_coefficient()
+        if current is None or abs(current - coefficient) > COEFFICIENT_TOLERANCE * max(1.0, abs(coefficient)):
+            model = None
+    if model is None:
+        model = FittingModel(element.id, coefficient, flow)
+    return model
+
+
+def build_section_model(network, section, coefficients, characteristics=None, calculator=None):
+    """
+    Собирает модель участка по снимку сети. В модель входят фитинги, подключенные к воздуховодам участка.
+    Фитинг на стыке двух участков входит в оба, и изменение его потерь от размера каждого участка считается
+    при текущем размере другого.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+        section (SectionData): Секция критического пути.
+        coefficients (dict): {Id фитинга: КМС}.
+        characteristics (dict): {Id фитинга: MulticonElementCharacteristic}. Если не задано, КМС тройников
+            не пересчитываются.
+        calculator (TransitionElbowCoefficientCalculator): Калькулятор с таблицами КМС переходов, заданный на сеть.
+            Если не задан, КМС переходов не пересчитываются.
+
+    Returns:
+        SectionModel или None, если в участке нет воздуховодов.
+    """
+    segments = FrictionLoss.get_section_segments(network, section)
+    if not segments:
+        return None
+
+    characteristics = characteristics or {}
+    segment_ids = set(segment.element_id for segment in segments)
+    current_size = SizeOption.from_segment(segments[0])
+    fittings = []
+    for element_id in section.element_ids:
+        element = network.get_element(element_id)
+        if element is None or element.category != CATEGORY_FITTING:
+            continue
+        fitting = create_fitting_model(network, element, section.flow, segment_ids, current_size,
+                                       coefficients.get(element_id, 0.0), characteristics.get(element_id),
+                                       calculator)
+        if fitting is not None:
+            fittings.append(fitting)
+
+    return SectionModel(section.number, section.flow, segments, fittings)
+
+
+def build_section_models(network, section_numbers, coefficients, characteristics=None, calculator=None):
+    """
+    Собирает модели выбранных участков критического пути.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+        section_numbers (list): Номера выбранных секций.
+        coefficients (dict): {Id фитинга: КМС}.
+        characteristics (dict): {Id фитинга: MulticonElementCharacteristic}.
+        calculator (TransitionElbowCoefficientCalculator): Калькулятор переходов, заданный на сеть.
+
+    Returns:
+        list: Список SectionModel. Участки без воздуховодов пропускаются.
+    """
+    selected = set(section_numbers)
+    models = []
+    for number in network.critical_path_numbers:
+        if number not in selected:
+            continue
+        model = build_section_model(network, network.sections.get_section(number), coefficients, characteristics,
+                                    calculator)
+        if model is not None:
+            models.append(model)
+    return models
+
+
+def get_candidate_sizes(model, round_sizes, rectangular_sizes,
+                        min_velocity=MIN_VELOCITY, max_velocity=MAX_VELOCITY,
+                        max_aspect_ratio=MAX_ASPECT_RATIO, max_candidates=MAX_CANDIDATES):
+    """
+    Подбирает размеры той же формы из таблицы размеров, при которых скорость в участке остается в диапазоне.
+    Остаются max_candidates размеров, ближайших по площади к текущему.
+
+    Args:
+        model (SectionModel): Участок.
+        round_sizes (list): Диаметры круглых воздуховодов, мм.
+        rectangular_sizes (list): Размеры сторон прямоугольных воздуховодов, мм.
+        min_velocity (float): Минимальная скорость, м/с.
+        max_velocity (float): Максимальная скорость, м/с.
+        max_aspect_ratio (float): Максимальное отношение сторон.
+        max_candidates (int): Максимальное количество размеров.
+
+    Returns:
+        list: Список SizeOption.
+    """
+    current = model.current_size
+    if current.shape == SHAPE_ROUND:
+        sizes = [SizeOption(SHAPE_ROUND, diameter=diameter) for diameter in round_sizes]
+    else:
+        sizes = [SizeOption(SHAPE_RECTANGULAR, width=width, height=height)
+                 for width in rectangular_sizes
+                 for height in rectangular_sizes
+                 if height <= width <= height * max_aspect_ratio]
+
+    candidates = []
+    for size in sizes:
+        velocity = model.flow / 3600.0 / size.area
+        if min_velocity <= velocity <= max_velocity:
+            candidates.append(size)
+
+    candidates.sort(key=lambda size: abs(math.log(size.area / current.area)))
+    return candidates[:max_candidates]
+
+
+def get_pareto_front(variants):
+    """
+    Оставляет варианты, которые нельзя улучшить по потерям, не увеличив площадь металла, и наоборот.
+
+    Args:
+        variants (list): Список ResizeVariant.
+
+    Returns:
+        list: Варианты по возрастанию потерь.
+    """
+    front = []
+    for variant in sorted(variants, key=lambda item: (item.pressure_drop, item.metal_area)):
+        if not front or variant.metal_area < front[-1].metal_area:
+            front.append(variant)
+    return front
+
+
+def optimize(models, candidates, base_pressure_drop, density,
+             kinematic_viscosity=FrictionLoss.DEFAULT_KINEMATIC_VISCOSITY, method=FrictionLoss.METHOD_ALTSHUL):
+    """
+    Перебирает размеры выбранных участков и возвращает Парето-множество по потерям и площади металла.
+
+    Потери критического пути складываются из потерь участков, поэтому перебор идет по участкам: к фронту
+    вариантов уже рассмотренных участков добавляются размеры следующего, и доминируемые варианты сразу
+    отбрасываются. Так перебор растет с суммой, а не с произведением количества размеров.
+
+    Args:
+        models (list): Список SectionModel.
+        candidates (list): Списки SizeOption для каждого участка из models.
+        base_pressure_drop (float): Текущие суммарные потери критического пути, Па.
+        density (float): Плотность воздуха, кг/м3.
+        kinematic_viscosity (float): Кинематическая вязкость воздуха, м2/с.
+        method (str): Формула коэффициента трения.
+
+    Returns:
+        tuple: (Парето-фронт ResizeVariant по возрастанию потерь, количество оцененных вариантов).
+    """
+    # Изменение считается от текущих размеров по той же модели, остальная часть пути остается как в отчете
+    current_results = [model.evaluate(model.current_size, density, kinematic_viscosity, method) for model in models]
+    current_pressure_drop = sum(result[0] for result in current_results)
+
+    front = [ResizeVariant(base_pressure_drop - current_pressure_drop, 0.0, ())]
+    evaluated = 0
+    for model, sizes, current_result in zip(models, candidates, current_results):
+        # Размеры, при которых КМС фитинга не определен, пропускаются
+        options = [(size,) + result
+                   for size, result in zip(sizes, model.evaluate_sizes(sizes, density, kinematic_viscosity, method))
+                   if result is not None]
+        if not options:
+            options = [(model.current_size,) + current_result]
+        variants = []
+        for variant in front:
+            for size, pressure_drop, metal_area in options:
+                variants.append(ResizeVariant(variant.pressure_drop + pressure_drop,
+                                              variant.metal_area + metal_area,
+                                              variant.sizes + (size,)))
+        evaluated += len(variants)
+        front = get_pareto_front(variants)
+
+    return front, evaluated
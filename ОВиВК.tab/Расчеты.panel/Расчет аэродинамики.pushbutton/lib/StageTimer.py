@@ -0,0 +1,150 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import codecs
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Сколько отдельных замеров хранится для файла трассировки. Сводка по этапам считается по всем замерам
+MAX_TRACE_EVENTS = 10000
+
+
+class StageStats:
+    """Накопленные замеры одного этапа."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+        self.elements = 0
+
+    def to_dict(self):
+        return {'name': self.name, 'seconds': self.seconds, 'calls': self.calls, 'elements': self.elements}
+
+
+class Span:
+    """
+    Замер одного выполнения этапа. Используется как контекстный менеджер, количество элементов можно задать
+    при создании или изменить внутри блока.
+    """
+
+    def __init__(self, timer, name, elements):
+        self.timer = timer
+        self.name = name
+        self.elements = elements
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.add(self.name, self.start, time.time() - self.start, self.elements)
+        return False
+
+
+class StageTimer:
+    """
+    Замеры времени по именованным этапам: суммарное время, количество вызовов и обработанных элементов.
+    Замер стоит два вызова time.time(), поэтому его можно не отключать.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = OrderedDict()
+        self.events = []
+        self.lock = threading.Lock()
+
+    def span(self, name, elements=0):
+        """
+        Возвращает замер этапа для использования в with.
+
+        Args:
+            name (str): Название этапа.
+            elements (int): Количество обрабатываемых элементов.
+        Returns:
+            Span
+        """
+        return Span(self, name, elements)
+
+    def add(self, name, start, seconds, elements=0):
+        """
+        Добавляет замер этапа.
+
+        Args:
+            name (str): Название этапа.
+            start (float): Время начала, time.time().
+            seconds (float): Длительность, с.
+            elements (int): Количество обработанных элементов.
+        """
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = StageStats(name)
+                self.stages[name] = stats
+            stats.seconds += seconds
+            stats.calls += 1
+            stats.elements += elements
+
+            if len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append((name, start, seconds, elements, threading.current_thread().ident))
+
+    def get_report_lines(self):
+        """
+        Возвращает сводку по этапам в порядке их первого вызова.
+
+        Returns:
+            list: Строки сводки.
+        """
+        lines = []
+        for stats in self.stages.values():
+            line = '{0}: {1:.3f} с, вызовов: {2}'.format(stats.name, stats.seconds, stats.calls)
+            if stats.elements:
+                line += ', элементов: {0}'.format(stats.elements)
+                if stats.seconds > 0:
+                    line += ' ({0:.0f} эл/с)'.format(stats.elements / stats.seconds)
+            lines.append(line)
+        lines.append('Всего: {0:.3f} с'.format(time.time() - self.started))
+        return lines
+
+    def log(self, logger):
+        """
+        Пишет сводку по этапам в лог плагина.
+
+        Args:
+            logger: Логгер плагина. Поддерживаются логгеры с методом Information и логгеры Python с методом info.
+        """
+        write = getattr(logger, 'Information', None) or getattr(logger, 'info', None)
+        if write is None:
+            return
+        for line in self.get_report_lines():
+            write(line)
+
+    def save_trace(self, file_path):
+        """
+        Сохраняет замеры в JSON в формате Trace Event (открывается в chrome://tracing и Perfetto)
+        вместе со сводкой по этапам.
+
+        Args:
+            file_path (str): Путь к файлу.
+        """
+        trace_events = []
+        for name, start, seconds, elements, thread_id in self.events:
+            trace_events.append({
+                'name': name,
+                'ph': 'X',
+                'ts': int((start - self.started) * 1000000),
+                'dur': int(seconds * 1000000),
+                'pid': 1,
+                'tid': thread_id,
+                'args': {'elements': elements}
+            })
+
+        data = {
+            'traceEvents': trace_events,
+            'stages': [stats.to_dict() for stats in self.stages.values()]
+        }
+        with codecs.open(file_path, 'w', encoding='utf-8') as trace_file:
+            json.dump(data, trace_file)
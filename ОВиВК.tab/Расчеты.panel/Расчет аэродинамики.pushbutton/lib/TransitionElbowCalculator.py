@@ -1,46 +1,32 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import clr
-
-clr.AddReference("RevitAPI")
-clr.AddReference("RevitAPIUI")
-clr.AddReference("dosymep.Revit.dll")
-clr.AddReference("dosymep.Bim4Everyone.dll")
-import dosymep
+import math
 import CalculatorClassLib
+from DuctNetworkSnapshot import *
 
-clr.ImportExtensions(dosymep.Revit)
-clr.ImportExtensions(dosymep.Bim4Everyone)
+def get_rect_elbow_coefficient(aspect_ratio, relative_rounding):
+    """
+    КМС прямоугольного отвода 90°.
 
-import sys
-import System
-import math
-from pyrevit import forms
-from Autodesk.Revit.DB import *
-from Autodesk.Revit.UI import TaskDialog
-from Autodesk.Revit.UI.Selection import ObjectType
-from Autodesk.Revit.DB.ExternalService import *
-from Autodesk.Revit.DB.ExtensibleStorage import *
-from Autodesk.Revit.UI.Selection import ObjectType, ISelectionFilter, Selection
-from System.Collections.Generic import List
-from System import Guid
-from pyrevit import revit
-from collections import namedtuple
-from Autodesk.Revit.DB.ExternalService import *
-from Autodesk.Revit.DB.ExtensibleStorage import *
-from Autodesk.Revit.DB.Mechanical import *
-from dosymep.Bim4Everyone.Templates import ProjectParameters
-from dosymep.Bim4Everyone.SharedParams import SharedParamsConfig
+    Args:
+        aspect_ratio (float): Отношение ширины к высоте, b / h.
+        relative_rounding (float): Отношение закругления к ширине.
+
+    Returns:
+        float: КМС
+    """
+    return (0.25 * aspect_ratio ** 0.25) * (1.07 * math.exp(2 / (2 * (relative_rounding + 0.5) + 1)) - 1) ** 2
 
 class TransitionElbowCoefficientCalculator(CalculatorClassLib.AerodinamicCoefficientCalculator):
-    def __calculate_elbow_coefficient(self, connector, rounding = 150):
+    def __calculate_elbow_coefficient(self, connector, rounding = 150, angle = None):
         """
         Расчет КМС отводов для врезок и собственно отводов
 
         Args:
             connector: Диктующий коннектор отвода
             rounding: Закругление. По умолчанию принято 150, по ГОСТ.
+            angle: Угол отвода. Если не указан - берется угол коннектора.
 
         Returns:
             coefficient: КМС отвода
@@ -48,15 +34,18 @@ class TransitionElbowCoefficientCalculator(CalculatorClassLib.AerodinamicCoeffic
 
         """
 
-        if connector.shape == ConnectorProfileType.Rectangular:
+        if angle is None:
+            angle = connector.angle
+
+        if connector.shape == SHAPE_RECTANGULAR:
             h, b = connector.height, connector.width
-            coefficient = (0.25 * (b / h) ** 0.25) * (1.07 * math.exp(2 / (2 * (rounding + b / 2) / b + 1)) - 1) ** 2
-            if connector.angle <= 60:
+            coefficient = get_rect_elbow_coefficient(float(b) / h, float(rounding) / b)
+            if angle <= 60:
                 coefficient *= 0.708
             base_name = 'Отвод прямоугольный'
 
-        elif connector.shape == ConnectorProfileType.Round:
-            coefficient = 0.33 if connector.angle > 85 else 0.18
+        elif connector.shape == SHAPE_ROUND:
+            coefficient = 0.33 if angle > 85 else 0.18
             base_name = 'Отвод круглый'
 
         else:
@@ -65,35 +54,22 @@ class TransitionElbowCoefficientCalculator(CalculatorClassLib.AerodinamicCoeffic
 
         return coefficient, base_name
 
-    def get_transition_coefficient(self, element):
+    def calculate_transition_coefficient(self, input_conn, output_conn, length):
         """
-        Вычисляет коэффициент для диффузора или конфузора.
+        Вычисляет коэффициент для диффузора или конфузора по сечениям входа и выхода.
 
         Args:
-            element: Переход
+            input_conn: Входной коннектор или любое сечение с атрибутами radius, width, height и area.
+            output_conn: Выходной коннектор или сечение.
+            length (float): Длина перехода, мм.
         Returns:
             float: КМС
         """
-        def get_transition_variables():
-            input_conn, output_conn = self.find_input_output_connector(element)
-            input_origin = input_conn.connector_element.Origin
-            output_origin = output_conn.connector_element.Origin
-
-            in_width = input_conn.radius * 2 if input_conn.radius else input_conn.width
-            out_width = output_conn.radius * 2 if output_conn.radius else output_conn.width
-
-            length = input_origin.DistanceTo(output_origin)
-            length = UnitUtils.ConvertFromInternalUnits(length, UnitTypeId.Millimeters)
-
-            angle_rad = math.atan(abs(in_width - out_width) / float(length))
-            angle_deg = math.degrees(angle_rad)
+        in_width = input_conn.radius * 2 if input_conn.radius else input_conn.width
+        out_width = output_conn.radius * 2 if output_conn.radius else output_conn.width
 
-            return input_conn, output_conn, length, angle_deg
-
-        input_conn, output_conn, length, angle = get_transition_variables()
-
-        base_name = 'Заужение' if input_conn.area > output_conn.area else 'Расширение'
-        self.remember_element_name(element, base_name, [input_conn, output_conn])
+        angle_rad = math.atan(abs(in_width - out_width) / float(length))
+        angle = math.degrees(angle_rad)
 
         is_confuser = input_conn.area > output_conn.area
         is_circular = bool(output_conn.radius if is_confuser else input_conn.radius)
@@ -103,46 +79,46 @@ class TransitionElbowCoefficientCalculator(CalculatorClassLib.AerodinamicCoeffic
                 2 * (output_conn.width + output_conn.height)) # Для прямоугольных сечений берем эквивалентный D
             l_d = length / float(d)
 
-            thresholds = [(0.1, [(10, 0.41), (20, 0.34), (30, 0.27), (180, 0.24)]),
-                          (0.15, [(10, 0.39), (20, 0.29), (30, 0.22), (180, 0.18)]),
-                          (float('inf'), [(10, 0.29), (20, 0.20), (30, 0.15), (180, 0.13)])]
-
-            for limit, table in thresholds:
-                if l_d <= limit:
-                    for angle_limit, coeff in table:
-                        if angle <= angle_limit:
-                            return coeff
-
+            coefficient = self.lookup_coefficient('confuser', l_d, angle)
 
         else:
             F = input_conn.area / float(output_conn.area)
-            angle_limits = (
-                [16, 24, 30, 180] if is_circular else [20, 24, 32, 180]
-            )
-
-            values_by_F = {
-                True: [  # Circular
-                    (0.2, [0.19, 0.32, 0.43, 0.61]),
-                    (0.25, [0.17, 0.28, 0.37, 0.49]),
-                    (0.4, [0.12, 0.19, 0.25, 0.35]),
-                    (float('inf'), [0.07, 0.1, 0.12, 0.17])
-                ],
-                False: [  # Rectangular
-                    (0.2, [0.31, 0.4, 0.59, 0.69]),
-                    (0.25, [0.27, 0.35, 0.52, 0.61]),
-                    (0.4, [0.18, 0.23, 0.34, 0.4]),
-                    (float('inf'), [0.09, 0.11, 0.16, 0.19])
-                ]
-            }
-
-            for f_limit, coeffs in values_by_F[is_circular]:
-                if F <= f_limit:
-                    for a_limit, coeff in zip(angle_limits, coeffs):
-                        if angle <= a_limit:
-                            return coeff
+            coefficient = self.lookup_coefficient('diffuser_round' if is_circular else 'diffuser_rect', F, angle)
+
+        if coefficient is not None:
+            return coefficient
 
         return 0  # В случае равных сечений
 
+    def get_transition_variables(self, element):
+        """
+        Находит вход, выход и длину перехода.
+
+        Args:
+            element: Переход
+        Returns:
+            tuple: Входной коннектор, выходной коннектор, длина в мм
+        """
+        input_conn, output_conn = self.find_input_output_connector(element)
+        length = distance_between(input_conn.origin, output_conn.origin)
+        return input_conn, output_conn, length
+
+    def get_transition_coefficient(self, element):
+        """
+        Вычисляет коэффициент для диффузора или конфузора.
+
+        Args:
+            element: Переход
+        Returns:
+            float: КМС
+        """
+        input_conn, output_conn, length = self.get_transition_variables(element)
+
+        base_name = 'Заужение' if input_conn.area > output_conn.area else 'Расширение'
+        self.remember_element_name(element, base_name, [input_conn, output_conn])
+
+        return self.calculate_transition_coefficient(input_conn, output_conn, length)
+
     def get_tap_elbow_coefficient(self, element):
         """
         Вычисляет коэффициент для колена исполненного через врезку.
@@ -159,7 +135,7 @@ class TransitionElbowCoefficientCalculator(CalculatorClassLib.AerodinamicCoeffic
         input_element = input_connector.connected_element
         output_element = output_connector.connected_element
 
-        main_element = input_element if self.system.SystemType == DuctSystemType.SupplyAir else output_element
+        main_element = input_element if self.system_is_supply else output_element
         second_element = output_element if main_element == input_element else input_element
 
         f = self.get_element_area(second_element)
@@ -174,14 +150,15 @@ class TransitionElbowCoefficientCalculator(CalculatorClassLib.AerodinamicCoeffic
             self.remember_element_name(element, base_name, [duct_output, duct_input])
             return coefficient
 
-        # Если площади равны — работаем как с обычным отводом
-        connector.angle = 90
+        # Если площади равны — работаем как с обычным отводом под 90°. Коннектор общий для всего расчета, поэтому
+        # угол передаем отдельно, а не меняем у коннектора
+        angle = 90
 
-        coefficient, base_name = self.__calculate_elbow_coefficient(connector)
+        coefficient, base_name = self.__calculate_elbow_coefficient(connector, angle=angle)
 
         self.remember_element_name(element, base_name,
                                    [connector, connector],
-                                   angle=connector.angle)
+                                   angle=angle)
 
         return coefficient
 
@@ -197,11 +174,8 @@ class TransitionElbowCoefficientCalculator(CalculatorClassLib.AerodinamicCoeffic
         connector_data = self.get_connector_data_instances(element)
         connector = connector_data[0]
 
-        element_type = element.GetElementType()
-        # В стандартных семействах шаблона этот параметр есть. Для других вычислить почти невозможно, принимаем по ГОСТ
-        rounding = element_type.GetParamValueOrDefault('Закругление', 150.0)
-        if rounding != 150:
-            rounding = UnitUtils.ConvertFromInternalUnits(rounding, UnitTypeId.Millimeters)
+        # Закругление берется из параметра типа при снятии снимка, если его нет - принято 150 по ГОСТ
+        rounding = element.rounding
 
         coefficient, base_name = self.__calculate_elbow_coefficient(connector, rounding)
 
@@ -0,0 +1,144 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import clr
+
+clr.AddReference("RevitAPI")
+clr.AddReference("dosymep.Revit.dll")
+clr.AddReference("dosymep.Bim4Everyone.dll")
+import dosymep
+
+clr.ImportExtensions(dosymep.Revit)
+clr.ImportExtensions(dosymep.Bim4Everyone)
+
+from Autodesk.Revit.DB import *
+
+
+class MethodChange:
+    """Замена метода расчета потерь элемента."""
+
+    def __init__(self, element, server_id):
+        """
+        Инициализация объекта MethodChange.
+
+        Args:
+            element (Element): Фитинг, аксессуар или воздухораспределитель.
+            server_id (str): Идентификатор сервера метода расчета.
+        """
+        self.element = element
+        self.server_id = server_id
+
+    def apply(self):
+        param = self.element.get_Parameter(BuiltInParameter.RBS_DUCT_FITTING_LOSS_METHOD_SERVER_PARAM)
+        param.Set(self.server_id)
+
+
+class CoefficientChange:
+    """Запись КМС в данные метода расчета элемента."""
+
+    def __init__(self, element, entity, field, value):
+        """
+        Инициализация объекта CoefficientChange.
+
+        Args:
+            element (Element): Фитинг или аксессуар.
+            entity (Entity): Прочитанные данные метода расчета элемента.
+            field (Field): Поле коэффициента в схеме данных.
+            value (str): Новое значение КМС.
+        """
+        self.element = element
+        self.entity = entity
+        self.field = field
+        self.value = value
+
+    def apply(self):
+        self.entity.Set(self.field, self.value)
+        self.element.SetEntity(self.entity)
+
+
+class WritePlan:
+    """
+    Список изменений, которые нужно внести в модель. Значения элементов читаются при планировании,
+    изменения, которые ничего не меняют, в план не попадают.
+    """
+
+    def __init__(self):
+        self.changes = []
+
+    def __len__(self):
+        return len(self.changes)
+
+    def add(self, change):
+        self.changes.append(change)
+
+    def extend(self, plan):
+        self.changes.extend(plan.changes)
+
+    def apply(self):
+        """Вносит изменения. Вызывается внутри транзакции."""
+        for change in self.changes:
+            change.apply()
+
+
+def _get_method_guid(element):
+    param = element.get_Parameter(BuiltInParameter.RBS_DUCT_FITTING_LOSS_METHOD_SERVER_PARAM)
+    guid = param.AsString()
+    if guid is None:
+        return ''
+    return guid.lower()
+
+
+def plan_method_changes(elements, server_id, keep_guid):
+    """
+    Планирует установку метода расчета элементам, у которых он еще не установлен.
+
+    Args:
+        elements (list): Фитинги, аксессуары и воздухораспределители.
+        server_id (Guid): Идентификатор сервера устанавливаемого метода.
+        keep_guid (str): Идентификатор метода, который не перезаписывается.
+
+    Returns:
+        WritePlan
+    """
+    plan = WritePlan()
+    server_guid = server_id.ToString().lower()
+    keep_guid = keep_guid.lower()
+    for element in elements:
+        current_guid = _get_method_guid(element)
+        if current_guid != keep_guid and current_guid != server_guid:
+            plan.add(MethodChange(element, server_id.ToString()))
+    return plan
+
+
+def plan_coefficient_changes(doc, elements, schema, field, coefficients, keep_guid):
+    """
+    Планирует запись КМС. Элементы перечитываются из документа, чтобы видеть данные метода, установленного
+    в этой же транзакции. Нулевые КМС и элементы с методом keep_guid пропускаются, как и совпадающие значения:
+    перезапись того же значения все равно помечает элемент измененным и забирает его при совместной работе.
+
+    Args:
+        doc (Document): Документ.
+        elements (list): Фитинги и аксессуары.
+        schema (Schema): Схема данных метода расчета.
+        field (Field): Поле коэффициента в схеме данных.
+        coefficients (dict): {Id элемента: КМС}.
+        keep_guid (str): Идентификатор метода, который не перезаписывается.
+
+    Returns:
+        WritePlan
+    """
+    plan = WritePlan()
+    keep_guid = keep_guid.lower()
+    for element in elements:
+        coefficient = coefficients.get(element.Id.IntegerValue, 0)
+        if coefficient == 0:
+            continue
+        element = doc.GetElement(element.Id)
+        if _get_method_guid(element) == keep_guid:
+            continue
+        entity = element.GetEntity(schema)
+        value = str(coefficient)
+        if entity.IsValid() and entity.Get[str](field) == value:
+            continue
+        plan.add(CoefficientChange(element, entity, field, value))
+    return plan
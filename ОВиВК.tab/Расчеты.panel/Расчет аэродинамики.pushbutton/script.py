@@ -13,9 +13,23 @@ clr.ImportExtensions(dosymep.Revit)
 clr.ImportExtensions(dosymep.Bim4Everyone)
 
 import math
+import os
+import re
+import sys
+import BranchAnalysis
 import CalculatorClassLib
+import CoefficientRunner
 import CrossTeeCalculator
+import FrictionLoss
+import LossMethodCache
 import TransitionElbowCalculator
+import NetworkSnapshotBuilder
+import ReportBuilder
+import ReportWriters
+import ResizeOptimizer
+import StageTimer
+import WritePlanner
+from DuctNetworkSnapshot import *
 from pyrevit import forms
 from pyrevit import script
 from pyrevit import EXEC_PARAMS
@@ -25,7 +39,9 @@ from Autodesk.Revit.DB.ExternalService import *
 from Autodesk.Revit.DB.ExtensibleStorage import *
 from Autodesk.Revit.DB.Mechanical import *
 from pyrevit import revit
-from collections import defaultdict, OrderedDict
+from collections import OrderedDict
+from datetime import datetime
+from System import Environment
 
 from dosymep.Bim4Everyone.Templates import ProjectParameters
 from dosymep.Bim4Everyone.SharedParams import SharedParamsConfig
@@ -43,7 +59,7 @@ class CalculationMethod:
         coefficient_field (Field): Поле коэффициента в схеме данных.
     """
 
-    def __init__(self, name, server, server_id):
+    def __init__(self, name, server, server_id, schema=None, coefficient_field=None):
         """
         Инициализация объекта CalculationMethod.
 
@@ -51,12 +67,15 @@ class CalculationMethod:
             name (str): Название метода расчета.
             server (ExternalService): Объект сервера.
             server_id (Guid): Идентификатор сервера.
+            schema (Schema): Схема данных сервера. Если не задана, запрашивается у сервера.
+            coefficient_field (Field): Поле коэффициента. Если не задано, ищется в схеме.
         """
         self.name = name
         self.server = server
         self.server_id = server_id
-        self.schema = server.GetDataSchema()
-        self.coefficient_field = self.schema.GetField("Coefficient")
+        self.schema = schema if schema is not None else server.GetDataSchema()
+        self.coefficient_field = coefficient_field if coefficient_field is not None \
+            else self.schema.GetField("Coefficient")
 
 class EditorReport:
     """
@@ -145,17 +164,76 @@ class SelectedSystem:
         self.system = system
         self.elements = elements
 
+class BatchSystemResult:
+    """
+    Класс для хранения результата пакетного расчета одной системы.
+
+    Attributes:
+        selected_system (SelectedSystem): Рассчитываемая система.
+        network_elements (list): Фитинги, аксессуары и воздухораспределители системы.
+        network (DuctNetworkSnapshot): Снимок сети, по которому считались КМС.
+        records (OrderedDict): Результаты расчета КМС по элементам.
+        report (SystemReport): Отчет по системе.
+        status (str): Описание ошибки или пустая строка, если система рассчитана.
+    """
+
+    def __init__(self, selected_system):
+        """
+        Инициализация объекта BatchSystemResult.
+
+        Args:
+            selected_system (SelectedSystem): Рассчитываемая система.
+        """
+        self.selected_system = selected_system
+        self.network_elements = []
+        self.network = None
+        self.records = None
+        self.report = None
+        self.status = ''
+
+    def is_calculated(self):
+        return self.records is not None
+
+def has_oval_connectors(duct_elements):
+    """
+    Проверяет, есть ли среди элементов сети овальные коннекторы.
+
+    Args:
+        duct_elements (list): Элементы сети.
+
+    Returns:
+        bool: True, если есть овальные коннекторы.
+    """
+    return any(connector.Shape == ConnectorProfileType.Oval
+               for element in duct_elements
+               for connector in NetworkSnapshotBuilder.get_connectors(element))
+
+def create_selected_system(system):
+    """
+    Собирает объект системы с ее элементами.
+
+    Args:
+        system (Element): Система воздуховодов.
+
+    Returns:
+        SelectedSystem: Объект системы.
+    """
+    system_name = system.GetParamValue(BuiltInParameter.RBS_SYSTEM_NAME_PARAM)
+    return SelectedSystem(system_name, system.DuctNetwork, system)
+
 def get_system_elements():
     """
     Получает элементы выбранной системы воздуховодов.
 
     Returns:
-        SelectedSystem: Объект выбранной системы.
+        SelectedSystem: Объект выбранной системы или None, если ничего не выделено и нужен пакетный расчет.
     """
     selected_ids = uidoc.Selection.GetElementIds()
+    if selected_ids.Count == 0:
+        return None
     if selected_ids.Count != 1:
         forms.alert(
-            "Должна быть выделена одна система воздуховодов.",
+            "Должна быть выделена одна система воздуховодов. Для расчета нескольких систем снимите выделение.",
             "Ошибка",
             exitscript=True
         )
@@ -166,21 +244,51 @@ def get_system_elements():
             "Ошибка",
             exitscript=True
         )
-    duct_elements = system.DuctNetwork
 
-    if any(connector.Shape == ConnectorProfileType.Oval
-           for element in duct_elements
-           for connector in calc_lib.get_connectors(element)):
+    selected_system = create_selected_system(system)
+    if has_oval_connectors(selected_system.elements):
         forms.alert(
             "Не предусмотрена обработка овальных коннекторов.",
             title="Ошибка",
             exitscript=True
         )
 
-    system_name = system.GetParamValue(BuiltInParameter.RBS_SYSTEM_NAME_PARAM)
-    selected_system = SelectedSystem(system_name, duct_elements, system)
     return selected_system
 
+def get_batch_systems():
+    """
+    Предлагает выбрать системы воздуховодов документа для пакетного расчета.
+
+    Returns:
+        list: Список SelectedSystem.
+    """
+    systems = FilteredElementCollector(doc) \
+        .OfCategory(BuiltInCategory.OST_DuctSystem) \
+        .WhereElementIsNotElementType() \
+        .ToElements()
+
+    systems_by_name = {}
+    for system in systems:
+        systems_by_name[system.GetParamValue(BuiltInParameter.RBS_SYSTEM_NAME_PARAM)] = system
+
+    if len(systems_by_name) == 0:
+        forms.alert(
+            "В документе нет систем воздуховодов.",
+            "Ошибка",
+            exitscript=True
+        )
+
+    selected_names = forms.SelectFromList.show(
+        sorted(systems_by_name.keys()),
+        title="Выберите системы для расчета",
+        multiselect=True,
+        button_name="Рассчитать"
+    )
+    if not selected_names:
+        sys.exit()
+
+    return [create_selected_system(systems_by_name[name]) for name in selected_names]
+
 def setup_params():
     """Настраивает параметры проекта."""
     revit_params = [cross_section_param, coefficient_param, pressure_loss_param]
@@ -189,12 +297,18 @@ def setup_params():
 
 def get_loss_methods():
     """
-    Получает метод расчета потерь для фитингов и аксессуаров.
+    Получает метод расчета потерь для фитингов и аксессуаров. Найденный сервер, его схема и поле коэффициента
+    сохраняются на всю сессию Revit, поэтому поиск по реестру сервисов выполняется только при первом запуске.
 
     Returns:
         CalculationMethod: Объект метода расчета.
     """
     service_id = ExternalServices.BuiltInExternalServices.DuctFittingAndAccessoryPressureDropService
+    cached = LossMethodCache.get(service_id, calc_lib.COEFF_GUID_CONST)
+    if cached is not None:
+        name, server_id, server, schema, coefficient_field = cached
+        return CalculationMethod(name, server, server_id, schema, coefficient_field)
+
     service = ExternalServiceRegistry.GetService(service_id)
     server_ids = service.GetRegisteredServerIds()
     for server_id in server_ids:
@@ -202,6 +316,12 @@ def get_loss_methods():
         name = server.GetName()
         if str(server_id) == calc_lib.COEFF_GUID_CONST:
             calculation_method = CalculationMethod(name, server, server_id)
+            LossMethodCache.put(service_id,
+                                name,
+                                server_id,
+                                server,
+                                calculation_method.schema,
+                                calculation_method.coefficient_field)
             return calculation_method
     return None
 
@@ -223,40 +343,77 @@ def get_server_by_id(server_guid, service_id):
             return server
     return None
 
-def set_calculation_method(element, method):
+def plan_calculation_method(network_elements, method):
     """
-    Устанавливает метод расчета для элемента.
+    Планирует установку метода расчета элементам, у которых он еще не установлен.
 
     Args:
-        element (Element): Элемент для установки метода расчета.
+        network_elements (list): Фитинги, аксессуары и воздухораспределители.
         method (CalculationMethod): Объект метода расчета.
+
+    Returns:
+        WritePlan: План изменений.
     """
-    param = element.get_Parameter(BuiltInParameter.RBS_DUCT_FITTING_LOSS_METHOD_SERVER_PARAM)
-    current_guid = param.AsString()
-    if current_guid != calc_lib.LOSS_GUID_CONST:
-        param.Set(method.server_id.ToString())
+    return WritePlanner.plan_method_changes(network_elements, method.server_id, calc_lib.LOSS_GUID_CONST)
 
-def set_coefficient_value(element, method, element_coefficients):
+def plan_coefficient_values(network_elements, method, records):
     """
-    Устанавливает значение коэффициента для элемента.
+    Планирует запись КМС фитингов и аксессуаров. Фитингам пишется рассчитанный КМС,
+    аксессуарам - значение их параметра КМС.
 
     Args:
-        element (Element): Элемент для установки коэффициента.
+        network_elements (list): Фитинги, аксессуары и воздухораспределители системы.
         method (CalculationMethod): Объект метода расчета.
-        element_coefficients (dict): Словарь коэффициентов элементов.
+        records (OrderedDict): Результаты расчета КМС по элементам.
+
+    Returns:
+        WritePlan: План изменений.
     """
-    local_section_coefficient = 0
-    if element.Category.IsId(BuiltInCategory.OST_DuctFitting):
-        local_section_coefficient = element_coefficients[element.Id]
-    if element.Category.IsId(BuiltInCategory.OST_DuctAccessory):
-        local_section_coefficient = element.GetParamValueOrDefault(coefficient_param, 0.0)
-    param = element.get_Parameter(BuiltInParameter.RBS_DUCT_FITTING_LOSS_METHOD_SERVER_PARAM)
-    current_guid = param.AsString()
-    if local_section_coefficient != 0 and current_guid != calc_lib.LOSS_GUID_CONST:
-        element = doc.GetElement(element.Id)
-        entity = element.GetEntity(method.schema)
-        entity.Set(method.coefficient_field, str(local_section_coefficient))
-        element.SetEntity(entity)
+    elements = []
+    element_coefficients = {}
+    for element in network_elements:
+        if element.Category.IsId(BuiltInCategory.OST_DuctFitting):
+            element_coefficients[element.Id.IntegerValue] = records[element.Id.IntegerValue].coefficient
+        elif element.Category.IsId(BuiltInCategory.OST_DuctAccessory):
+            element_coefficients[element.Id.IntegerValue] = element.GetParamValueOrDefault(coefficient_param, 0.0)
+        else:
+            continue
+        elements.append(element)
+
+    return WritePlanner.plan_coefficient_changes(doc,
+                                                 elements,
+                                                 method.schema,
+                                                 method.coefficient_field,
+                                                 element_coefficients,
+                                                 calc_lib.LOSS_GUID_CONST)
+
+def write_plans(method_plan, plan_coefficients):
+    """
+    Вносит метод расчета и КМС одной транзакцией. Если метод расчета менять не нужно, КМС считаются до
+    транзакции, и она открывается только при наличии изменений - повторный расчет неизменной системы
+    ничего не записывает.
+
+    Args:
+        method_plan (WritePlan): План установки метода расчета.
+        plan_coefficients: Функция без аргументов, которая считает КМС по сети после установки метода
+            и возвращает план их записи.
+    """
+    if not method_plan:
+        coefficient_plan = plan_coefficients()
+        if coefficient_plan:
+            with stage_timer.span("Транзакция записи", len(coefficient_plan)):
+                with revit.Transaction("BIM: Расчет аэродинамики"):
+                    coefficient_plan.apply()
+        return
+
+    with revit.Transaction("BIM: Расчет аэродинамики"):
+        with stage_timer.span("Запись метода расчета", len(method_plan)):
+            method_plan.apply()
+            # Диктующий путь и потери в снимке сети должны учитывать новый метод расчета
+            doc.Regenerate()
+        coefficient_plan = plan_coefficients()
+        with stage_timer.span("Транзакция записи", len(coefficient_plan)):
+            coefficient_plan.apply()
 
 def get_fittings_and_accessory(system_elements):
     """
@@ -277,54 +434,61 @@ def get_fittings_and_accessory(system_elements):
             elements.append(element)
     return elements
 
-def calculate_local_coefficient(element):
+def get_plugin_data_path(filename):
     """
-    Высчитывает локальный коэффициент для фитинга.
+    Возвращает путь к файлу плагина в папке документов пользователя. Создает папку при необходимости.
 
     Args:
-        element (Element): Фитинг для получения коэффициента.
-        system (Element): Система, к которой принадлежит фитинг.
+        filename (str): Имя файла.
 
     Returns:
-        float: Локальный коэффициент.
+        str: Полный путь к файлу.
     """
-
-    if element.Category.IsId(BuiltInCategory.OST_DuctTerminal):
-        local_section_coefficient = cross_tee_calculator.get_side_hole_coefficient(element)
-        fitting_and_terminal_coefficient_cash[element.Id] = local_section_coefficient
-
-        return local_section_coefficient
-
-    part_type = element.MEPModel.PartType
-    if part_type == element.MEPModel.PartType.Elbow:
-        local_section_coefficient = transition_elbow_calculator.get_elbow_coefficient(element)
-    elif part_type == element.MEPModel.PartType.Transition:
-        local_section_coefficient = transition_elbow_calculator.get_transition_coefficient(element)
-    elif part_type == element.MEPModel.PartType.Tee:
-        local_section_coefficient = cross_tee_calculator.get_tee_coefficient(element)
-    elif part_type == element.MEPModel.PartType.TapAdjustable:
-        has_partner = cross_tee_calculator.get_tap_partner_if_exists(element)
-
-        if has_partner:
-            fitting_2, duct_element = has_partner
-
-            if transition_elbow_calculator.is_tap_elbow(element) or transition_elbow_calculator.is_tap_elbow(fitting_2):
-                local_section_coefficient = cross_tee_calculator.get_double_tap_tee_coefficient(element, fitting_2,
-                                                                                                duct_element)
-            else:
-                local_section_coefficient = cross_tee_calculator.get_tap_cross_coefficient(element, fitting_2,
-                                                                                           duct_element)
-        elif transition_elbow_calculator.is_tap_elbow(element):
-            local_section_coefficient = transition_elbow_calculator.get_tap_elbow_coefficient(element)
-        else:
-            local_section_coefficient = cross_tee_calculator.get_tap_tee_coefficient(element)
-    elif part_type == element.MEPModel.PartType.Cross:
-        local_section_coefficient = cross_tee_calculator.get_cross_coefficient(element)
+    plugin_name = 'Расчет аэродинамики'
+    username_upper = __revit__.Application.Username.upper()
+    title = doc.Title
+    if username_upper in title.upper():
+        project_name = title.upper().replace('_' + username_upper, '').strip()
     else:
-        local_section_coefficient = 0
-    fitting_and_terminal_coefficient_cash[element.Id] = local_section_coefficient
+        project_name = title
+
+    my_documents_path = Environment.GetFolderPath(Environment.SpecialFolder.MyDocuments)
+    full_dir_path = os.path.join(my_documents_path,
+                                 'dosymep',
+                                 __revit__.Application.VersionNumber,
+                                 plugin_name,
+                                 project_name)
+    if not os.path.exists(full_dir_path):
+        os.makedirs(full_dir_path)
+
+    return os.path.join(full_dir_path, filename)
 
-    return local_section_coefficient
+def apply_coefficient_record(element, record):
+    """
+    Переносит в калькуляторы результат расчета элемента так, как будто он посчитан в них самих.
+
+    Args:
+        element (ElementSnapshot): Фитинг или воздухораспределитель из снимка сети.
+        record (CoefficientRecord): Результат расчета элемента.
+
+    Returns:
+        float: КМС.
+    """
+    if record.transition_elbow_name is not None:
+        transition_elbow_calculator.element_names[element.id] = record.transition_elbow_name
+    if record.cross_tee_name is not None:
+        cross_tee_calculator.element_names[element.id] = record.cross_tee_name
+    if record.characteristic is not None:
+        cross_tee_calculator.cross_tee_params[element.id] = record.characteristic
+    if record.terminal_flow is not None:
+        cross_tee_calculator.duct_terminals_flows[element.id] = record.terminal_flow
+    if record.terminal_size is not None:
+        cross_tee_calculator.duct_terminals_sizes[element.id] = record.terminal_size
+    if record.tap_partner_id is not None:
+        cross_tee_calculator.filter_tap_pair(element.id, record.tap_partner_id)
+
+    fitting_and_terminal_coefficient_cash[element.id] = record.coefficient
+    return record.coefficient
 
 def get_network_element_name(element):
     """
@@ -349,11 +513,11 @@ def get_network_element_name(element):
         return short_name or mark or ""
 
     element_type = element.GetElementType()
-    element_name = transition_elbow_calculator.element_names.get(element.Id)
+    element_name = transition_elbow_calculator.element_names.get(element.Id.IntegerValue)
     name_addon = get_name_addon()
     if element_name is None:
 
-        element_name = cross_tee_calculator.element_names.get(element.Id)
+        element_name = cross_tee_calculator.element_names.get(element.Id.IntegerValue)
 
     if name_addon == "":
         name_addon = element_type.GetParamValueOrDefault("ADSK_Марка", "")
@@ -378,7 +542,8 @@ def get_network_element_name(element):
         if element.MEPModel.PartType == PartType.Tee:
             return 'Тройник'
         if element.MEPModel.PartType == PartType.TapAdjustable:
-            if transition_elbow_calculator.is_tap_elbow(element):
+            if transition_elbow_calculator.is_tap_elbow(
+                    transition_elbow_calculator.get_element(element.Id.IntegerValue)):
                 return 'Отвод'
             return "Боковое ответвление"
 
@@ -389,24 +554,23 @@ def get_network_element_length(section, element_id):
     Получает длину элемента сети.
 
     Args:
-        section (Section): Секция системы.
-        element_id (ElementId): Идентификатор элемента.
+        section (SectionData): Секция системы.
+        element_id (int): Идентификатор элемента.
 
     Returns:
         float: Длина элемента в метрах.
     """
-    try:
-        length = section.GetSegmentLength(element_id) * 304.8 / 1000
-        return float('{:.2f}'.format(length))
-    except Exception:
+    length = section.get_segment_length(element_id)
+    if length is None:
         return '-'
+    return float('{:.2f}'.format(length))
 
 def get_network_element_coefficient(section, element):
     """
     Получает коэффициент элемента сети.
 
     Args:
-        section (Section): Секция системы.
+        section (SectionData): Секция системы.
         element (Element): Элемент сети.
 
     Returns:
@@ -424,12 +588,27 @@ def get_network_element_coefficient(section, element):
     if (coefficient is None or coefficient == 0) and element.InAnyCategory([
         BuiltInCategory.OST_DuctFitting,
         BuiltInCategory.OST_DuctTerminal]):
-        coefficient = fitting_and_terminal_coefficient_cash.get(element.Id, 0)
+        coefficient = fitting_and_terminal_coefficient_cash.get(element.Id.IntegerValue, 0)
 
     if isinstance(coefficient, (int, float)):
         return str(int(coefficient)) if coefficient == int(coefficient) else str(round(coefficient, 2))
     return str(coefficient)
 
+def get_snapshot_element_area(element):
+    """
+    Получает площадь элемента по снимку сети, с которым строится отчет.
+
+    Args:
+        element (Element): Элемент сети.
+
+    Returns:
+        float: Площадь в квадратных метрах.
+    """
+    try:
+        return calc_lib.get_element_area(calc_lib.get_element(element.Id.IntegerValue))
+    except CalculatorClassLib.CalculationError as error:
+        forms.alert(str(error), "Ошибка", exitscript=True)
+
 def get_network_element_real_size(element, element_type):
     """
     Получает реальный размер элемента сети.
@@ -443,11 +622,11 @@ def get_network_element_real_size(element, element_type):
     """
 
     if element.Category.IsId(BuiltInCategory.OST_DuctTerminal):
-        size = cross_tee_calculator.duct_terminals_sizes.get(element.Id, calc_lib.get_element_area(element))
+        size = cross_tee_calculator.duct_terminals_sizes.get(element.Id.IntegerValue, get_snapshot_element_area(element))
         return size
     if element.Category.IsId(BuiltInCategory.OST_DuctFitting):
         if element.MEPModel.PartType in [PartType.TapAdjustable, PartType.Tee]:
-            tee_params = cross_tee_calculator.cross_tee_params.get(element.Id)
+            tee_params = cross_tee_calculator.cross_tee_params.get(element.Id.IntegerValue)
 
             if tee_params is not None:
                 if tee_params.name in [cross_tee_calculator.TEE_SUPPLY_PASS_NAME,
@@ -459,26 +638,28 @@ def get_network_element_real_size(element, element_type):
                                        cross_tee_calculator.CROSS_EXHAUST_PASS_ROUND_NAME]:
                     return tee_params.fp
                 return tee_params.fo
-        size = calc_lib.get_element_area(element)
+        size = get_snapshot_element_area(element)
         return size
     size = element.GetParamValueOrDefault(cross_section_param)
     if not size:
         size = element_type.GetParamValueOrDefault(cross_section_param)
     if not size:
-        size = calc_lib.get_element_area(element)
+        size = get_snapshot_element_area(element)
 
     return size
 
-def get_network_element_pressure_drop(section, element, density, velocity, coefficient):
+def get_network_element_pressure_drop(section, element, density, velocity, coefficient, friction_pressure_drops=None):
     """
     Получает потери напора элемента сети.
 
     Args:
-        section (Section): Секция системы.
+        section (SectionData): Секция системы.
         element (Element): Элемент сети.
         density (float): Плотность воздушной среды.
         velocity (float): Скорость воздуха.
         coefficient (str): Коэффициент элемента.
+        friction_pressure_drops (dict): Потери на трение воздуховодов секции по своему расчету.
+            Если не заданы, берутся потери, посчитанные Revit.
 
     Returns:
         float: Потери напора элемента в паскалях.
@@ -487,8 +668,9 @@ def get_network_element_pressure_drop(section, element, density, velocity, coeff
         return float(coefficient) * (density * math.pow(velocity, 2)) / 2
 
     if element.InAnyCategory([BuiltInCategory.OST_DuctCurves, BuiltInCategory.OST_FlexDuctCurves]):
-        pressure_drop = section.GetPressureDrop(element.Id)
-        return UnitUtils.ConvertFromInternalUnits(pressure_drop, UnitTypeId.Pascals)
+        if friction_pressure_drops is not None and element.Id.IntegerValue in friction_pressure_drops:
+            return friction_pressure_drops[element.Id.IntegerValue]
+        return section.get_pressure_drop(element.Id.IntegerValue) or 0
     pressure_drop = element.GetParamValueOrDefault(pressure_loss_param)
     if pressure_drop is not None:
         return pressure_drop
@@ -502,12 +684,70 @@ def get_network_element_pressure_drop(section, element, density, velocity, coeff
         return calculate_pressure_drop()
     return 0
 
+def get_kinematic_viscosity(density):
+    """
+    Получает кинематическую вязкость воздуха из настроек воздуховодов документа.
+
+    Args:
+        density (float): Плотность воздушной среды.
+
+    Returns:
+        float: Кинематическая вязкость в м2/с.
+    """
+    settings = DuctSettings.GetDuctSettings(doc)
+    viscosity = UnitUtils.ConvertFromInternalUnits(settings.AirViscosity, UnitTypeId.PascalSeconds)
+    if not viscosity or not density:
+        return FrictionLoss.DEFAULT_KINEMATIC_VISCOSITY
+    return viscosity / density
+
+def show_friction_check(network, density, output):
+    """
+    Выводит воздуховоды критического пути, потери на трение которых по своему расчету расходятся с Revit.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети системы.
+        density (float): Плотность воздушной среды.
+        output (Output): Объект для вывода отчета.
+    """
+    deviations = FrictionLoss.compare_with_revit(network,
+                                                 density,
+                                                 get_kinematic_viscosity(density),
+                                                 FRICTION_METHOD,
+                                                 FRICTION_CHECK_TOLERANCE)
+    if not deviations:
+        return
+    output.print_table(
+        table_data=[[number, output.linkify(ElementId(element_id)), round(revit_drop, 3), round(drop, 3)]
+                    for number, element_id, revit_drop, drop in deviations],
+        title="Расхождения потерь на трение с Revit",
+        columns=["Номер участка", "Id элемента", "Потери Revit, Па", "Потери расчета, Па"]
+    )
+
+def save_network_snapshot(network, density):
+    """
+    Сохраняет снимок сети вместе с потерями Revit и параметрами воздуха. По снимку AerodynamicsBenchmark
+    сверяет расчет потерь на трение с Revit без запуска Revit.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети системы.
+        density (float): Плотность воздушной среды.
+    """
+    file_path = forms.save_file(file_ext='json',
+                                default_name=re.sub(r'[\\/:*?"<>|]', '_', network.system_name))
+    if not file_path:
+        return
+
+    network.density = density
+    network.kinematic_viscosity = get_kinematic_viscosity(density)
+    network.save(file_path)
+    print('Снимок сети сохранен: ' + file_path)
+
 def get_network_element_flow(section, element):
     """
     Получает расход воздуха для элемента сети.
 
     Args:
-        section (Section): Секция системы.
+        section (SectionData): Секция системы.
         element (Element): Элемент сети.
 
     Returns:
@@ -515,7 +755,7 @@ def get_network_element_flow(section, element):
     """
     if element.Category.IsId(BuiltInCategory.OST_DuctFitting):
         if element.MEPModel.PartType in [PartType.TapAdjustable, PartType.Tee]:
-            tee_params = cross_tee_calculator.cross_tee_params.get(element.Id)
+            tee_params = cross_tee_calculator.cross_tee_params.get(element.Id.IntegerValue)
             if tee_params is not None:
                 if tee_params.name in [cross_tee_calculator.TEE_SUPPLY_PASS_NAME,
                                        cross_tee_calculator.TEE_EXHAUST_PASS_ROUND_NAME,
@@ -527,15 +767,13 @@ def get_network_element_flow(section, element):
                     return int(tee_params.Lp)
                 return int(tee_params.Lo)
     if element.Category.IsId(BuiltInCategory.OST_DuctTerminal):
-        terminal_flow = cross_tee_calculator.duct_terminals_flows.get(element.Id)
+        terminal_flow = cross_tee_calculator.duct_terminals_flows.get(element.Id.IntegerValue)
         if terminal_flow is not None:
             return int(terminal_flow) # Возвращаем сразу, он уже в метрах кубических
-        else:
-            flow = element.GetParamValue(BuiltInParameter.RBS_DUCT_FLOW_PARAM)
-    else:
-        flow = section.Flow
-    flow = UnitUtils.ConvertFromInternalUnits(flow, UnitTypeId.CubicMetersPerHour)
-    return int(flow)
+        flow = element.GetParamValue(BuiltInParameter.RBS_DUCT_FLOW_PARAM)
+        flow = UnitUtils.ConvertFromInternalUnits(flow, UnitTypeId.CubicMetersPerHour)
+        return int(flow)
+    return int(section.flow)
 
 def get_network_element_velocity(element, flow, real_size):
     """
@@ -551,145 +789,71 @@ def get_network_element_velocity(element, flow, real_size):
     """
     return (float(flow) * 1000000) / (3600 * real_size * 1000000)
 
-def show_network_report(data, selected_system, output, density):
+def show_network_report(report, selected_system, output, density):
     """
-    Отображает отчет о расчете аэродинамики системы.
+    Отображает отчет о расчете аэродинамики системы. Большие отчеты выводятся сводкой и сворачиваемыми участками,
+    таблица на тысячи строк в окне вывода pyRevit отрисовывается слишком долго.
 
     Args:
-        data (list): Данные для отчета.
+        report (SystemReport): Отчет по системе.
         selected_system (SelectedSystem): Выбранная система.
         output (Output): Объект для вывода отчета.
         density (float): Плотность воздушной среды.
     """
-    print('Плотность воздушной среды: ' + str(density) + ' кг/м3')
-    output.print_table(
-        table_data=data,
-        title=("Отчет о расчете аэродинамики системы " + selected_system.name),
-        columns=[
-            "Номер участка",
-            "Наименование элемента",
-            "Длина, м.п.",
-            "Размер, м2",
-            "Расход, м3/ч",
-            "Скорость, м/с",
-            "КМС",
-            "Потери напора элемента, Па",
-            "Суммарные потери напора, Па",
-            "Id элемента"
-        ],
-        formats=['', '', '']
-    )
+    title = "Отчет о расчете аэродинамики системы " + selected_system.name
+    if report.row_count <= REPORT_TABLE_ROW_LIMIT:
+        print('Плотность воздушной среды: ' + str(density) + ' кг/м3')
+        output.print_table(
+            table_data=report.to_table(),
+            title=title,
+            columns=ReportWriters.REPORT_COLUMNS,
+            formats=['', '', '']
+        )
+    else:
+        output.print_md('### ' + title)
+        output.print_html(ReportWriters.get_summary_html(report, selected_system.name, density))
+        for section in report.sections:
+            output.print_html(ReportWriters.get_section_html(section))
+        output.print_html(ReportWriters.get_total_html(report))
 
-def prepare_data_to_demonstration(data):
+def export_network_reports(reports, density):
     """
-    Оптимизирует данные для демонстрации.
+    Предлагает сохранить отчеты в файлы, чтобы сравнивать результаты разных расчетов без повторного расчета.
+    Формат выбирается по расширению файла. По умолчанию файлы предлагается сохранить в папку документов
+    пользователя с временем расчета в имени, чтобы отчеты разных запусков лежали рядом.
 
     Args:
-        data (list): Данные для оптимизации.
-
-    Returns:
-        list: Оптимизированные данные.
+        reports (list): Пары (SystemReport, SelectedSystem).
+        density (float): Плотность воздушной среды.
     """
+    if not reports:
+        return
+    message = "Хотите сохранить отчет в файл?" if len(reports) == 1 else "Хотите сохранить отчеты систем в файлы?"
+    if not forms.alert(message, title="Сохранение отчета", ok=False, yes=True, no=True):
+        return
+
+    for report, selected_system in reports:
+        system_name = re.sub(r'[\\/:*?"<>|]', '_', selected_system.name)
+        default_name = '{0}_{1}'.format(system_name, datetime.now().strftime('%Y%m%d_%H%M%S'))
+        file_path = forms.save_file(files_filter=REPORT_FILES_FILTER,
+                                    init_dir=os.path.dirname(get_plugin_data_path(default_name)),
+                                    default_name=default_name)
+        if not file_path:
+            continue
 
-    data.sort(key=lambda row: float(row[4]) if isinstance(row, list) and len(row) > 4 else float('inf'))
-
-    flow_ordered = OrderedDict()
-
-    def find_similar_flow_key(flow):
-        for key in flow_ordered:
-            if abs(key - flow) <= 5:
-                return key
-        return None
-
-
-    for row in data:
-        if isinstance(row, list) and len(row) > 4:
-            flow = float(row[4])
-            similar_key = find_similar_flow_key(flow)
-            if similar_key is not None:
-                flow_ordered[similar_key].append(row)
-            else:
-                flow_ordered[flow] = [row]
-
-    count = 1
-    new_data = []
-    for rows in flow_ordered.values():
-        for row in rows:
-            row[0] = count
-            new_data.append(row)
-        count += 1
-
-    data[:] = new_data
-    grouped = defaultdict(list)
-
-    cumulative_loss = 0.0
-    for row in data:
-        element_loss = float(row[7])
-        cumulative_loss += element_loss
-        row[8] = str(cumulative_loss)
-
-    i = 0
-    old_count = None
-    while i < len(data):
-        row = data[i]
-        if isinstance(row, list) and len(row) > 1:
-            count = row[0]
-            if old_count is not None and count != old_count:
-                data.insert(i, ['Участок №' + str(count)])
-                i += 1
-            old_count = count
-        i += 1
-
-    for row in data:
-        if isinstance(row, list) and len(row) > 1:
-            count, name, length, size, flow, velocity, coefficient, element_loss, summ_loss, id = row
-            if "Воздуховод" in name:
-                grouped[(count, size)].append(row)
-
-    for (count, size), group_rows in grouped.items():
-        if len(group_rows) > 1:
-            total_length = sum(float(row[2]) for row in group_rows)
-            total_element_loss = sum(float(row[7]) for row in group_rows)
-            max_summ_loss = max(float(row[8]) for row in group_rows)
-            combined_ids = ",".join(str(row[9]) for row in group_rows)
-
-            base_row = group_rows[0]
-            base_row[2] = str(total_length)
-            base_row[7] = str(total_element_loss)
-            base_row[8] = str(max_summ_loss)
-            base_row[9] = combined_ids
-
-            for row in group_rows[1:]:
-                data.remove(row)
-
-    data.insert(0, ['Участок №1'])
-
-    last_summ_loss = 0.0
-    for row in reversed(data):
-        if isinstance(row, list) and len(row) > 8:
-            try:
-                last_summ_loss = float(row[8])
-                break
-            except ValueError:
-                continue
-
-    # Создаём строку "Итого"
-    total_row = [""]+["Итого, Па"] + [""] * 6 + [str(round(last_summ_loss, 2))] + [""]
-
-    # Создаём строку "Итого + 15%"
-    total_row_15 = [""]+ ["Итого, Па + 15%"] + [""] * 6 + [str(round(last_summ_loss * 1.15, 2))] + [""]
-
-    data.append(total_row)
-    data.append(total_row_15)
-
-    return data
+        export_format = os.path.splitext(file_path)[1].lstrip('.').lower()
+        if export_format not in ReportWriters.WRITERS:
+            export_format = 'csv'
+            file_path += '.csv'
+        ReportWriters.WRITERS[export_format](report, file_path, selected_system.name, density)
+        print('Отчет сохранен: ' + file_path)
 
 def prepare_section_elements(section):
     """
     Подготавливает элементы секции системы, сортируя их по категориям.
 
     Args:
-        section (Section): Секция системы.
+        section (SectionData): Секция системы.
 
     Returns:
         list: Список элементов секции.
@@ -715,29 +879,127 @@ def prepare_section_elements(section):
             return 3
         return 4
 
-    elements_ids = section.GetElementIds()
     segment_elements = []
-    for element_id in elements_ids:
+    for element_id in section.element_ids:
         if element_id in passed_elements:
             continue
-        element = doc.GetElement(element_id)
+        element = doc.GetElement(ElementId(element_id))
         if not element.Category.IsId(BuiltInCategory.OST_DuctCurves):
             passed_elements.append(element_id)
         segment_elements.append(element)
     segment_elements.sort(key=sort_key)
     return segment_elements
 
-def form_raw_data_list(system, density, output):
+def get_friction_pressure_drops(network, section, density, kinematic_viscosity):
+    """
+    Считает потери на трение воздуховодов секции, если включен свой расчет трения.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети системы.
+        section (SectionData): Секция системы.
+        density (float): Плотность воздушной среды.
+        kinematic_viscosity (float): Кинематическая вязкость воздуха.
+
+    Returns:
+        dict: {Id воздуховода: потери, Па} или None, если используются потери Revit.
+    """
+    if not CALCULATE_FRICTION_LOSS:
+        return None
+    return FrictionLoss.calculate_section_pressure_drops(network, section, density, kinematic_viscosity,
+                                                         FRICTION_METHOD)
+
+def get_network_element_data(section, element, density, friction_pressure_drops=None):
+    """
+    Считает расчетные величины элемента сети в секции.
+
+    Args:
+        section (SectionData): Секция системы.
+        element (Element): Элемент сети.
+        density (float): Плотность воздушной среды.
+        friction_pressure_drops (dict): Потери на трение воздуховодов секции по своему расчету или None.
+
+    Returns:
+        tuple: (КМС, реальный размер, расход, скорость, потери напора).
+    """
+    coefficient = get_network_element_coefficient(section, element)
+    real_size = get_network_element_real_size(element, element.GetElementType())
+    flow = get_network_element_flow(section, element)
+    velocity = get_network_element_velocity(element, flow, real_size)
+    pressure_drop = get_network_element_pressure_drop(section,
+                                                      element,
+                                                      density,
+                                                      velocity,
+                                                      coefficient,
+                                                      friction_pressure_drops)
+    return coefficient, real_size, flow, velocity, pressure_drop
+
+def show_branch_analysis(network, density, output):
+    """
+    Выводит потери от вентилятора до каждого воздухораспределителя и их невязку с критическим путем.
+    Потери элементов считаются так же, как в отчете, по одному разу на секцию.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети системы, по которому построен отчет.
+        density (float): Плотность воздушной среды.
+        output (Output): Объект для вывода отчета.
+    """
+    kinematic_viscosity = get_kinematic_viscosity(density)
+    friction_by_section = {}
+
+    def get_element_pressure_drop(section, element_id):
+        element = doc.GetElement(ElementId(element_id))
+        if element is None or not pass_data_filter(element, section):
+            return 0.0
+        if section.number not in friction_by_section:
+            friction_by_section[section.number] = get_friction_pressure_drops(network,
+                                                                              section,
+                                                                              density,
+                                                                              kinematic_viscosity)
+        return get_network_element_data(section, element, density, friction_by_section[section.number])[4]
+
+    with stage_timer.span("Потери по ветвям") as span:
+        analysis = BranchAnalysis.BranchAnalysis(network, get_element_pressure_drop)
+        results = analysis.get_terminal_results()
+        critical_pressure_drop = analysis.get_critical_pressure_drop()
+        span.elements = len(results)
+
+    table = []
+    for result in results:
+        imbalance, imbalance_percent = result.get_imbalance(critical_pressure_drop)
+        table.append([output.linkify(ElementId(result.terminal_id)),
+                      result.section_number,
+                      int(result.flow),
+                      round(result.pressure_drop, 2),
+                      round(imbalance, 2),
+                      round(imbalance_percent, 1),
+                      "Да" if result.is_critical else ""])
+
+    output.print_table(
+        table_data=table,
+        title="Невязка ветвей системы {0}, потери критического пути {1} Па".format(
+            network.system_name, round(critical_pressure_drop, 2)),
+        columns=[
+            "Воздухораспределитель",
+            "Номер участка",
+            "Расход, м3/ч",
+            "Потери до вентилятора, Па",
+            "Невязка, Па",
+            "Невязка, %",
+            "Критический путь"
+        ]
+    )
+
+def form_raw_data_list(network, density, output):
     """
     Формирует список данных для отчета.
 
     Args:
-        system (Element): Система для формирования данных.
+        network (DuctNetworkSnapshot): Снимок сети системы.
         density (float): Плотность воздушной среды.
         output (Output): Объект для вывода отчета.
 
     Returns:
-        list: Список данных для отчета.
+        list: Список ReportRow.
     """
 
     def round_floats(float_value):
@@ -746,37 +1008,27 @@ def form_raw_data_list(system, density, output):
         return float_value
 
     def get_data_by_element():
-        element_type = element.GetElementType()
-        length = get_network_element_length(section, element.Id)
-        coefficient = get_network_element_coefficient(section, element)
-        real_size = get_network_element_real_size(element, element_type)
-        flow = get_network_element_flow(section, element)
-        velocity = get_network_element_velocity(element, flow, real_size)
+        length = get_network_element_length(section, element.Id.IntegerValue)
+        coefficient, real_size, flow, velocity, pressure_drop = get_network_element_data(section,
+                                                                                         element,
+                                                                                         density,
+                                                                                         friction_pressure_drops)
         name = get_network_element_name(element)
-        pressure_drop = get_network_element_pressure_drop(section, element, density, velocity, coefficient)
-        value = [
-            0,
-            name,
-            length,
-            real_size,
-            flow,
-            velocity,
-            coefficient,
-            pressure_drop,
-            0,
-            output.linkify(element.Id)
-        ]
-        rounded_value = [round_floats(item) for item in value]
-        return rounded_value
-
-    path_numbers = system.GetCriticalPathSectionNumbers()
-    critical_path_numbers = list(path_numbers)
-    if system.SystemType == DuctSystemType.SupplyAir:
-        critical_path_numbers.reverse()
-
+        return ReportBuilder.ReportRow(name,
+                                       round_floats(length),
+                                       round_floats(real_size),
+                                       round_floats(flow),
+                                       round_floats(velocity),
+                                       round_floats(coefficient),
+                                       round_floats(pressure_drop),
+                                       output.linkify(element.Id),
+                                       element.Id.IntegerValue)
+
+    kinematic_viscosity = get_kinematic_viscosity(density)
     data = []
-    for number in critical_path_numbers:
-        section = system.GetSectionByNumber(number)
+    for number in network.critical_path_numbers:
+        section = network.sections.get_section(number)
+        friction_pressure_drops = get_friction_pressure_drops(network, section, density, kinematic_viscosity)
         segment_elements = prepare_section_elements(section)
         for element in segment_elements:
             if not pass_data_filter(element, section):
@@ -793,7 +1045,7 @@ def pass_data_filter(element, section):
 
     Args:
         element (Element): Элемент для проверки.
-        section (Section): Секция системы.
+        section (SectionData): Секция системы.
 
     Returns:
         bool: True, если элемент проходит фильтр, иначе False.
@@ -804,11 +1056,62 @@ def pass_data_filter(element, section):
         return False
     if element.Category.IsId(BuiltInCategory.OST_DuctCurves) and get_network_element_flow(section, element) == 0:
         return False
-    if element.Id in cross_tee_calculator.tap_crosses_filtered:
+    if element.Id.IntegerValue in cross_tee_calculator.tap_crosses_filtered:
         return False
 
     return True
 
+def calculate_system_coefficients(network, network_elements):
+    """
+    Рассчитывает КМС фитингов и воздухораспределителей сети.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети.
+        network_elements (list): Фитинги, аксессуары и воздухораспределители системы.
+
+    Returns:
+        OrderedDict: {Id элемента: CoefficientRecord} в порядке расчета.
+    """
+    cross_tee_calculator.set_network(network)
+    transition_elbow_calculator.set_network(network)
+
+    element_snapshots = [network.get_element(element.Id.IntegerValue) for element in network_elements
+                         if element.InAnyCategory([BuiltInCategory.OST_DuctFitting,
+                                                   BuiltInCategory.OST_DuctTerminal])]
+
+    workers = 1 if SEQUENTIAL_MODE else COEFFICIENT_WORKERS
+    with stage_timer.span("Расчет КМС", len(element_snapshots)):
+        calculated_records = CoefficientRunner.calculate_records(network,
+                                                                 element_snapshots,
+                                                                 connector_cache,
+                                                                 template=main_runner,
+                                                                 workers=workers)
+    records = OrderedDict((element_snapshot.id, record)
+                          for element_snapshot, record in zip(element_snapshots, calculated_records))
+
+    # Состояние калькуляторов для отчета собирается на основном потоке в порядке сети
+    with stage_timer.span("Применение результатов КМС", len(records)):
+        for element_id, record in records.items():
+            apply_coefficient_record(network.get_element(element_id), record)
+
+    return records
+
+def restore_system_state(network, records):
+    """
+    Восстанавливает в калькуляторах результаты расчета системы, чтобы по ним можно было построить отчет.
+    Нужно в пакетном режиме, где системы сначала все рассчитываются, а отчеты строятся после записи КМС.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети, по которому считались КМС.
+        records (OrderedDict): Результаты расчета КМС по элементам.
+    """
+    cross_tee_calculator.set_network(network)
+    transition_elbow_calculator.set_network(network)
+    fitting_and_terminal_coefficient_cash.clear()
+    del passed_elements[:]
+    for element_id, record in records.items():
+        apply_coefficient_record(network.get_element(element_id), record)
+
 def process_method_setup(selected_system):
     """
     Обрабатывает настройку метода расчета для выбранной системы.
@@ -823,34 +1126,299 @@ def process_method_setup(selected_system):
             exitscript=True
         )
 
-    network_elements = get_fittings_and_accessory(selected_system.elements)
+    with stage_timer.span("Проверка занятости элементов") as span:
+        network_elements = get_fittings_and_accessory(selected_system.elements)
+        span.elements = len(network_elements)
     editor_report.show_report()
-    specific_coefficient_method = get_loss_methods()
-    with revit.Transaction("BIM: Установка метода расчета"):
-        for element in network_elements:
-            set_calculation_method(element, specific_coefficient_method)
+    with stage_timer.span("Поиск метода расчета"):
+        specific_coefficient_method = get_loss_methods()
+    with stage_timer.span("Планирование записи", len(network_elements)):
+        method_plan = plan_calculation_method(network_elements, specific_coefficient_method)
+
+    def plan_coefficients():
+        system = doc.GetElement(selected_system.system.Id)
+        network = build_network_snapshot(system)
+
+        if len(network.critical_path_numbers) == 0:
+            forms.alert(
+                "Не найден диктующий путь, проверьте расчетность системы.",
+                "Ошибка",
+                exitscript=True
+            )
 
-    system = doc.GetElement(selected_system.system.Id)
-    calc_lib.get_critical_path(system)
-    cross_tee_calculator.get_critical_path(system)
-    transition_elbow_calculator.get_critical_path(system)
+        try:
+            records = calculate_system_coefficients(network, network_elements)
+        except CalculatorClassLib.CalculationError as error:
+            forms.alert(str(error), "Ошибка", exitscript=True)
 
-    if len(calc_lib.critical_path_numbers) == 0:
-        forms.alert(
-            "Не найден диктующий путь, проверьте расчетность системы.",
-            "Ошибка",
-            exitscript=True
-        )
+        with stage_timer.span("Планирование записи", len(network_elements)):
+            return plan_coefficient_values(network_elements, specific_coefficient_method, records)
 
-    elements_coefficients = {}
-    for element in network_elements:
-        if element.InAnyCategory([BuiltInCategory.OST_DuctFitting, BuiltInCategory.OST_DuctTerminal]):
-            elements_coefficients[element.Id] = calculate_local_coefficient(element)
+    write_plans(method_plan, plan_coefficients)
+
+def get_system_report(network, density, output):
+    """
+    Собирает отчет по снимку сети, снятому после записи КМС.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети системы.
+        density (float): Плотность воздушной среды.
+        output (Output): Объект для вывода отчета.
+
+    Returns:
+        SystemReport: Отчет по системе.
+    """
+    calc_lib.set_network(network)
+    if CHECK_FRICTION_LOSS:
+        show_friction_check(network, density, output)
+    with stage_timer.span("Данные отчета") as span:
+        raw_data = form_raw_data_list(network, density, output)
+        span.elements = len(raw_data)
+    with stage_timer.span("Сборка отчета", len(raw_data)):
+        return ReportBuilder.build_report(raw_data)
+
+def build_network_snapshot(system):
+    """
+    Снимает сеть системы с замером времени.
+
+    Args:
+        system (Element): Система воздуховодов.
+
+    Returns:
+        DuctNetworkSnapshot: Снимок сети.
+    """
+    with stage_timer.span("Снимок сети") as span:
+        network = NetworkSnapshotBuilder.build_network_snapshot(system)
+        span.elements = len(network.elements)
+    return network
 
-    with revit.Transaction("BIM: Установка коэффициентов"):
-        for element in network_elements:
-            if element.InAnyCategory([BuiltInCategory.OST_DuctFitting, BuiltInCategory.OST_DuctAccessory]):
-                set_coefficient_value(element, specific_coefficient_method, elements_coefficients)
+def get_duct_size_table():
+    """
+    Получает таблицу размеров воздуховодов документа.
+
+    Returns:
+        tuple: (диаметры круглых воздуховодов, мм; размеры сторон прямоугольных воздуховодов, мм).
+    """
+    size_settings = DuctSizeSettings.GetDuctSizeSettings(doc)
+
+    def get_sizes(shape):
+        sizes = set()
+        for size in size_settings[shape]:
+            if size.UsedInSizeLists:
+                sizes.add(round(UnitUtils.ConvertFromInternalUnits(size.NominalDiameter, UnitTypeId.Millimeters)))
+        return sorted(sizes)
+
+    return get_sizes(DuctShape.Round), get_sizes(DuctShape.Rectangular)
+
+def get_report_section_numbers(report):
+    """
+    Возвращает номера участков отчета по элементам. Отчет нумерует участки по возрастанию расхода,
+    поэтому номера не совпадают с номерами секций Revit.
+
+    Args:
+        report (SystemReport): Отчет по системе.
+
+    Returns:
+        dict: {Id элемента: номер участка отчета}.
+    """
+    numbers = {}
+    for section in report.sections:
+        for row in section.rows:
+            for element_id in row.element_ids:
+                numbers[element_id] = section.number
+    return numbers
+
+def get_resize_model_title(model, report_numbers):
+    """
+    Возвращает подпись секции для выбора участков подбора: номер участка отчета, номер секции Revit и размер.
+
+    Args:
+        model (SectionModel): Модель секции критического пути.
+        report_numbers (dict): {Id элемента: номер участка отчета}.
+
+    Returns:
+        str: Подпись секции.
+    """
+    report_number = None
+    for segment in model.segments:
+        report_number = report_numbers.get(segment.element_id)
+        if report_number is not None:
+            break
+
+    if report_number is None:
+        return 'Секция Revit №{0} ({1})'.format(model.number, model.current_size.name)
+    return '{0}, секция Revit №{1} ({2})'.format(ReportBuilder.ReportSection(report_number, model.flow).title,
+                                                 model.number,
+                                                 model.current_size.name)
+
+def show_resize_options(network, report, density, output):
+    """
+    Предлагает выбрать участки критического пути и выводит Парето-варианты их размеров
+    по суммарным потерям и площади металла. Модель не меняется.
+
+    Args:
+        network (DuctNetworkSnapshot): Снимок сети системы, по которому построен отчет.
+        report (SystemReport): Отчет по системе с текущими потерями.
+        density (float): Плотность воздушной среды.
+        output (Output): Объект для вывода отчета.
+    """
+    models = ResizeOptimizer.build_section_models(network,
+                                                  network.critical_path_numbers,
+                                                  fitting_and_terminal_coefficient_cash,
+                                                  cross_tee_calculator.cross_tee_params,
+                                                  transition_elbow_calculator)
+    report_numbers = get_report_section_numbers(report)
+    models_by_title = OrderedDict((get_resize_model_title(model, report_numbers), model) for model in models)
+    selected_titles = forms.SelectFromList.show(
+        list(models_by_title.keys()),
+        title="Выберите участки для подбора размеров",
+        multiselect=True,
+        button_name="Подобрать"
+    )
+    if not selected_titles:
+        return
+
+    selected_models = [models_by_title[title] for title in selected_titles]
+    round_sizes, rectangular_sizes = get_duct_size_table()
+    with stage_timer.span("Подбор размеров") as span:
+        candidates = [ResizeOptimizer.get_candidate_sizes(model, round_sizes, rectangular_sizes)
+                      for model in selected_models]
+        front, span.elements = ResizeOptimizer.optimize(selected_models,
+                                                        candidates,
+                                                        report.total_pressure_drop,
+                                                        density,
+                                                        get_kinematic_viscosity(density),
+                                                        FRICTION_METHOD)
+
+    output.print_table(
+        table_data=[[round(variant.pressure_drop, 2), round(variant.metal_area, 2)] +
+                    [size.name for size in variant.sizes] for variant in front],
+        title="Варианты размеров участков системы " + network.system_name,
+        columns=["Итого, Па", "Площадь металла, м2"] + selected_titles
+    )
+
+def show_batch_summary(results, output):
+    """
+    Отображает сводку пакетного расчета по системам.
+
+    Args:
+        results (list): Список BatchSystemResult.
+        output (Output): Объект для вывода отчета.
+    """
+    summary = []
+    for result in results:
+        if result.report is not None:
+            total_loss = result.report.total_pressure_drop
+            summary.append([result.selected_system.name,
+                            str(round(total_loss, 2)),
+                            str(round(total_loss * ReportBuilder.TOTAL_RESERVE_FACTOR, 2)),
+                            "Рассчитана"])
+        else:
+            summary.append([result.selected_system.name, "", "", result.status])
+
+    output.print_table(
+        table_data=summary,
+        title="Сводка расчета аэродинамики систем",
+        columns=[
+            "Система",
+            "Итого, Па",
+            "Итого, Па + 15%",
+            "Статус"
+        ]
+    )
+
+def process_batch(selected_systems, output, density):
+    """
+    Пакетный расчет нескольких систем. Настройка параметров и поиск метода расчета выполняются один раз,
+    запись метода расчета и КМС всех систем - одной транзакцией. Системы с ошибками пропускаются и попадают в сводку.
+
+    Args:
+        selected_systems (list): Список SelectedSystem.
+        output (Output): Объект для вывода отчета.
+        density (float): Плотность воздушной среды.
+    """
+    with stage_timer.span("Поиск метода расчета"):
+        specific_coefficient_method = get_loss_methods()
+
+    results = []
+    with stage_timer.span("Проверка занятости элементов") as span:
+        for selected_system in selected_systems:
+            result = BatchSystemResult(selected_system)
+            results.append(result)
+            if has_oval_connectors(selected_system.elements):
+                result.status = "Не предусмотрена обработка овальных коннекторов"
+                continue
+            result.network_elements = get_fittings_and_accessory(selected_system.elements)
+            span.elements += len(result.network_elements)
+    editor_report.show_report()
+
+    network_elements = [element for result in results for element in result.network_elements]
+    with stage_timer.span("Планирование записи", len(network_elements)):
+        method_plan = plan_calculation_method(network_elements, specific_coefficient_method)
+
+    def plan_coefficients():
+        coefficient_plan = WritePlanner.WritePlan()
+        for result in results:
+            if result.status:
+                continue
+            system = doc.GetElement(result.selected_system.system.Id)
+            network = build_network_snapshot(system)
+            if len(network.critical_path_numbers) == 0:
+                result.status = "Не найден диктующий путь, проверьте расчетность системы"
+                continue
+            try:
+                result.records = calculate_system_coefficients(network, result.network_elements)
+            except CalculatorClassLib.CalculationError as error:
+                result.status = str(error)
+                continue
+            result.network = network
+
+            with stage_timer.span("Планирование записи", len(result.network_elements)):
+                coefficient_plan.extend(plan_coefficient_values(result.network_elements,
+                                                                specific_coefficient_method,
+                                                                result.records))
+        return coefficient_plan
+
+    write_plans(method_plan, plan_coefficients)
+
+    # Отчеты строятся по сети после записи КМС всех систем
+    for result in results:
+        if result.is_calculated():
+            restore_system_state(result.network, result.records)
+            system = doc.GetElement(result.selected_system.system.Id)
+            result.report = get_system_report(build_network_snapshot(system), density, output)
+
+    with stage_timer.span("Вывод отчета"):
+        show_batch_summary(results, output)
+        for result in results:
+            if result.report is not None:
+                show_network_report(result.report, result.selected_system, output, density)
+    export_network_reports([(result.report, result.selected_system) for result in results
+                            if result.report is not None], density)
+
+# Количество потоков для расчета КМС
+COEFFICIENT_WORKERS = 4
+# Считать КМС в одном потоке, для отладки
+SEQUENTIAL_MODE = False
+# Отчеты длиннее этого количества строк выводятся сворачиваемыми участками вместо одной таблицы
+REPORT_TABLE_ROW_LIMIT = 300
+# Форматы, в которых после расчета можно сохранить отчет. Формат выбирается по расширению файла
+REPORT_FILES_FILTER = "CSV (*.csv)|*.csv|HTML (*.html)|*.html"
+# Считать потери на трение воздуховодов по снимку сети вместо потерь, посчитанных Revit
+CALCULATE_FRICTION_LOSS = False
+# Формула коэффициента трения: FrictionLoss.METHOD_ALTSHUL или FrictionLoss.METHOD_COLEBROOK
+FRICTION_METHOD = FrictionLoss.METHOD_ALTSHUL
+# Выводить воздуховоды, потери на трение которых отличаются от Revit больше допуска
+CHECK_FRICTION_LOSS = False
+FRICTION_CHECK_TOLERANCE = 0.05
+# Дополнительные режимы, которые можно выбрать при запуске команды с зажатым Shift. Выводятся после отчета
+# по выделенной системе, в пакетном расчете не используются
+MODE_BRANCH_ANALYSIS = "Потери до каждого воздухораспределителя"
+MODE_RESIZE_OPTIONS = "Подбор размеров участков критического пути"
+MODE_SAVE_SNAPSHOT = "Сохранить снимок сети для проверки потерь на трение вне Revit"
+RUN_MODES = [MODE_BRANCH_ANALYSIS, MODE_RESIZE_OPTIONS, MODE_SAVE_SNAPSHOT]
+# Сохранять замеры этапов в файл трассировки (открывается в chrome://tracing)
+SAVE_TIMING_TRACE = False
 
 doc = __revit__.ActiveUIDocument.Document
 uidoc = __revit__.ActiveUIDocument
@@ -860,31 +1428,77 @@ coefficient_param = SharedParamsConfig.Instance.VISLocalResistanceCoef
 cross_section_param = SharedParamsConfig.Instance.VISCrossSection
 pressure_loss_param = SharedParamsConfig.Instance.VISPressureLoss
 
-calc_lib = CalculatorClassLib.AerodinamicCoefficientCalculator(doc, uidoc, view)
-cross_tee_calculator = CrossTeeCalculator.CrossTeeCoefficientCalculator(doc, uidoc, view)
-transition_elbow_calculator = TransitionElbowCalculator.TransitionElbowCoefficientCalculator(doc, uidoc, view)
+connector_cache = CalculatorClassLib.ConnectorDataCache()
+calc_lib = CalculatorClassLib.AerodinamicCoefficientCalculator()
+cross_tee_calculator = CrossTeeCalculator.CrossTeeCoefficientCalculator(connector_cache)
+transition_elbow_calculator = TransitionElbowCalculator.TransitionElbowCoefficientCalculator(connector_cache)
+main_runner = CoefficientRunner.CoefficientRunner(cross_tee_calculator, transition_elbow_calculator)
 editor_report = EditorReport()
+stage_timer = StageTimer.StageTimer()
 fitting_and_terminal_coefficient_cash = {}
 passed_elements = []
 
 @notification()
 @log_plugin(EXEC_PARAMS.command_name)
 def script_execute(plugin_logger):
-    setup_params()
-    selected_system = get_system_elements()
-    process_method_setup(selected_system) # Ставим метод расчета Определенный коэффициент и заполняем его для фитингов
+    try:
+        calculate_aerodynamics()
+    finally:
+        # Замеры пишутся и при выходе по ошибке, чтобы было видно, до какого этапа дошел расчет
+        stage_timer.log(plugin_logger)
+        if SAVE_TIMING_TRACE:
+            stage_timer.save_trace(get_plugin_data_path(
+                'trace_{0}.json'.format(datetime.now().strftime('%Y%m%d_%H%M%S'))))
+
+def select_run_modes():
+    """
+    Предлагает выбрать дополнительные режимы расчета, если команда запущена с зажатым Shift.
 
-    # заново забираем систему  через ID, мы в прошлой транзакции обновили потери напора на элементах, поэтому данные
-    # на системе могли измениться
-    selected_system = get_system_elements()
-    system = doc.GetElement(selected_system.system.Id)
+    Returns:
+        list: Выбранные режимы из RUN_MODES. При обычном запуске - пустой список.
+    """
+    if not EXEC_PARAMS.config_mode:
+        return []
+    selected_modes = forms.SelectFromList.show(
+        RUN_MODES,
+        title="Дополнительные режимы расчета",
+        multiselect=True,
+        button_name="Рассчитать"
+    )
+    return selected_modes or []
+
+def calculate_aerodynamics():
+    run_modes = select_run_modes()
+    with stage_timer.span("Настройка параметров"):
+        setup_params()
     output = script.get_output()
     settings = DuctSettings.GetDuctSettings(doc)
     density = UnitUtils.ConvertFromInternalUnits(settings.AirDensity, UnitTypeId.KilogramsPerCubicMeter)
-    raw_data = form_raw_data_list(system, density, output)
-    data = prepare_data_to_demonstration(raw_data)
 
-    show_network_report(data, selected_system, output, density)
+    selected_system = get_system_elements()
+    if selected_system is None:
+        # Ничего не выделено - считаем выбранные из списка системы документа
+        process_batch(get_batch_systems(), output, density)
+    else:
+        process_method_setup(selected_system) # Ставим метод расчета Определенный коэффициент и заполняем его для фитингов
+
+        # заново забираем систему  через ID, мы в прошлой транзакции обновили потери напора на элементах, поэтому данные
+        # на системе могли измениться
+        selected_system = get_system_elements()
+        system = doc.GetElement(selected_system.system.Id)
+        network = build_network_snapshot(system)
+        report = get_system_report(network, density, output)
+
+        with stage_timer.span("Вывод отчета", report.row_count):
+            show_network_report(report, selected_system, output, density)
+        export_network_reports([(report, selected_system)], density)
+
+        if MODE_BRANCH_ANALYSIS in run_modes:
+            show_branch_analysis(network, density, output)
+        if MODE_RESIZE_OPTIONS in run_modes:
+            show_resize_options(network, report, density, output)
+        if MODE_SAVE_SNAPSHOT in run_modes:
+            save_network_snapshot(network, density)
 
     output.print_md('**<span style="color:red; text-decoration:underline;">'
                     'РАСЧЕТ НАХОДИТСЯ НА СТАДИИ ТЕСТИРОВАНИЯ. '